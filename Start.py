@@ -1,27 +1,39 @@
 import streamlit as st
-import pandas as pd
 from utils.data_manager import DataManager
 from utils.login_manager import LoginManager
+from utils.schema import get_schema
 
 # Seitenkonfiguration
 st.set_page_config(page_title="Blutzucker Tracker", layout="wide")
 
-# Initialisiere DataManager
-data_manager = DataManager(fs_protocol='webdav', fs_root_folder="BMLD_CPBLSF_App")
+# Initialisiere DataManager. Zusätzlich zu den Standardwerten sind nur eingeschaltet:
+# - der lokale Dateicache, da jeder Rerun dieselben Dateien vom WebDAV-Server liest
+# - das Write-Ahead-Log, damit ein Eintrag nicht auf den Server wartet und einen Ausfall übersteht
+# Die übrigen Funktionen (append_mode, write_behind, fs_compression, shared_cache_max_bytes,
+# metrics, storage_engine) werden erst eingeschaltet, wenn eine Messung ihren Nutzen zeigt.
+data_manager = DataManager(fs_protocol='webdav', fs_root_folder="BMLD_CPBLSF_App",
+                           fs_cache_dir='.fs_cache', wal_dir='.wal')
 login_manager = LoginManager(data_manager)
 login_manager.login_register()
 
-# Daten laden mit Fehlerbehandlung
+user_data_args = dict(
+    session_state_key='data_df',
+    file_name='data',
+    initial_value=get_schema('glucose').empty_frame(),
+    time_window='90D',
+    schema='glucose'
+)
+
+# Daten im Hintergrund laden, während die Startseite aufgebaut wird
 try:
-    data_manager.load_user_data(
-        session_state_key='data_df', 
-        file_name='data.csv', 
-        initial_value=pd.DataFrame(columns=["datum_zeit", "blutzuckerwert", "zeitpunkt"]), 
-        parse_dates=['datum_zeit']
-    )
-except FileNotFoundError:
-    st.warning("Die Datei 'data.csv' wurde nicht gefunden. Ein neues leeres DataFrame wird erstellt.")
-    st.session_state['data_df'] = pd.DataFrame(columns=["timesdatum_zeit", "blutzuckerwert", "zeitpunkt"])
+    # Bestehende Daten einmalig ins typisierte, nach Monaten partitionierte Format übernehmen;
+    # pro Session und Benutzer nur einmal prüfen, damit nicht jeder Rerun Abfragen kostet
+    username = st.session_state.get('username')
+    if username is not None and st.session_state.get('migriert_fuer') != username:
+        data_manager.migrate_user_file('data.csv', 'data.parquet', parse_dates=['datum_zeit'], schema='glucose')
+        data_manager.migrate_user_file('data.parquet', 'data', schema='glucose')
+        st.session_state['migriert_fuer'] = username
+    data_manager.prefetch_user_data(**user_data_args)
 except ValueError as e:
     st.error(f"Fehler beim Laden der Daten: {e}")
     st.stop()
@@ -60,4 +72,14 @@ Diese App wurde im Rahmen des Moduls BMLD Informatik 2 an der ZHAW entwickelt vo
 
 - Cristiana Bastos (pereicri@students.zhaw.ch)  
 - Lou-Salomé Frehner (frehnlou@students.zhaw.ch)
-""")
\ No newline at end of file
+""")
+
+# Auf die vorab geladenen Daten warten
+try:
+    data_manager.load_user_data(**user_data_args)
+except FileNotFoundError:
+    st.warning("Die Blutzucker-Daten wurden nicht gefunden. Ein neues leeres DataFrame wird erstellt.")
+    st.session_state['data_df'] = get_schema('glucose').empty_frame()
+except ValueError as e:
+    st.error(f"Fehler beim Laden der Daten: {e}")
+    st.stop()
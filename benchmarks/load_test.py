@@ -0,0 +1,449 @@
+"""
+Lasttest der Streamlit-Seiten mit vielen gleichzeitigen Sessions.
+
+Startet die App mit ``streamlit run Start.py`` als eigenen Serverprozess und simuliert
+Browser-Sessions über Streamlits Websocket-Protokoll. Jede Session meldet sich in
+``Start.py`` an (inkl. ``load_user_data``), erfasst einen Eintrag (``append_record``) und
+öffnet Tabelle und Grafik auf ``pages/1 Blutzucker_Tracker.py``. Als WebDAV-Server dient
+ein lokaler Ersatz mit einstellbarer Latenz pro Anfrage.
+
+Pro Schritt werden die Latenz-Perzentile erfasst, dazu Durchsatz, Arbeitsspeicher (RSS)
+des Serverprozesses, solange alle Sessions offen sind, und die Zeit, bis das
+Write-Ahead-Log nach dem letzten Eintrag abgearbeitet ist:
+
+    python -m benchmarks.load_test --sessions 200 --concurrency 50 --latency 0.05
+    python -m benchmarks.load_test --baseline benchmarks/results/load-baseline.json
+
+Benötigt die Pakete aus ``benchmarks/requirements.txt``.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import fsspec
+import numpy as np
+import pandas as pd
+
+from benchmarks.storage import RESULTS_DIR, compare
+from benchmarks.synthetic import credentials, glucose_history
+from benchmarks.webdav_server import free_port, local_webdav_server
+from utils.credential_store import ShardedCredentialStore
+from utils.data_handler import DataHandler
+from utils.partitioned_store import PartitionedStore
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+START_PAGE = os.path.join(REPO_DIR, "Start.py")
+TRACKER_PAGE = "Blutzucker Tracker"
+ROOT_FOLDER = "BMLD_CPBLSF_App"  # wie in Start.py
+PASSWORD = "Lasttest1!"
+STEPS = ["start", "login", "tracker", "append_record", "table", "chart"]
+
+
+def prepare_data(root_dir, users, history_rows):
+    """
+    Legt Anmeldedaten und Messwertverläufe direkt im Verzeichnis des WebDAV-Servers an.
+
+    Alle Benutzer erhalten dasselbe Passwort ``PASSWORD`` mit einem echten bcrypt-Hash, damit
+    die Anmeldung die gleiche Rechenzeit kostet wie im Betrieb.
+
+    Returns:
+        list: Die Benutzernamen.
+    """
+    dh = DataHandler(fsspec.filesystem("file"), os.path.join(root_dir, ROOT_FOLDER))
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode()
+    ShardedCredentialStore(dh, "credentials").import_credentials(credentials(users, password_hash))
+    usernames = [f"user{i:06d}" for i in range(users)]
+    if history_rows:
+        history = glucose_history(history_rows, end=pd.Timestamp.now().floor("min"))
+        for username in usernames:
+            PartitionedStore(dh, f"user_data_{username}/data").write(history)
+    return usernames
+
+
+def rss_bytes(pid):
+    """
+    Returns:
+        int: Der aktuelle Arbeitsspeicher (RSS) eines Prozesses in Bytes (nur Linux).
+    """
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class StreamlitServer:
+    """
+    Die App als eigener ``streamlit run``-Prozess im Arbeitsverzeichnis ``work_dir``.
+
+    Dateicache und Write-Ahead-Log von ``Start.py`` landen ebenfalls dort; die Zugangsdaten
+    des WebDAV-Servers werden als ``.streamlit/secrets.toml`` hinterlegt.
+    """
+
+    def __init__(self, work_dir, webdav_url, startup_timeout=60.0):
+        self.work_dir = work_dir
+        self.webdav_url = webdav_url
+        self.startup_timeout = startup_timeout
+        self.port = free_port()
+        self.process = None
+
+    def __enter__(self):
+        os.makedirs(os.path.join(self.work_dir, ".streamlit"), exist_ok=True)
+        with open(os.path.join(self.work_dir, ".streamlit", "secrets.toml"), "w") as f:
+            f.write(f'[webdav]\nbase_url = "{self.webdav_url}"\nusername = ""\npassword = ""\n')
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", START_PAGE,
+             "--server.headless", "true", "--server.port", str(self.port),
+             "--server.enableXsrfProtection", "false", "--server.fileWatcherType", "none",
+             "--browser.gatherUsageStats", "false", "--logger.level", "error"],
+            cwd=self.work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{self.port}/_stcore/health", timeout=1)
+                return self
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.__exit__()
+                    raise RuntimeError("Streamlit-Server konnte nicht gestartet werden")
+                time.sleep(0.1)
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    @property
+    def stream_url(self):
+        return f"ws://127.0.0.1:{self.port}/_stcore/stream"
+
+    def wal_pending(self):
+        """
+        Returns:
+            int: Anzahl noch nicht eingespielter Einträge im Write-Ahead-Log.
+        """
+        wal_dir = os.path.join(self.work_dir, ".wal")
+        if not os.path.isdir(wal_dir):
+            return 0
+        return sum(name.endswith(".json") for name in os.listdir(wal_dir))
+
+
+class BrowserSession:
+    """
+    Eine simulierte Browser-Session über Streamlits Websocket-Protokoll.
+
+    Wie das Frontend sendet sie pro Lauf ``rerun_script`` mit den Zuständen der bedienten
+    Widgets und wartet, bis der Server den Lauf abgeschlossen hat. Die Widgets des letzten
+    Laufs werden über ihre Beschriftung gefunden.
+    """
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.connection = None
+        self.pages = {}
+        self.page_script_hash = ""
+        self.widgets = []
+
+    def connect(self):
+        from websockets.sync.client import connect
+
+        self.connection = connect(self.url, subprotocols=["streamlit"], max_size=None,
+                                  open_timeout=self.timeout)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    def widget(self, kind, label):
+        """
+        Returns:
+            Das erste Widget des letzten Laufs mit Typ und Beschriftung.
+        """
+        for widget_kind, widget in self.widgets:
+            if widget_kind == kind and widget.label == label:
+                return widget
+        raise LookupError(f"Widget nicht gefunden: {kind} '{label}'")
+
+    def run(self, widget_states=(), page=None):
+        """
+        Führt einen Lauf aus und sammelt die Widgets der Seite.
+
+        Args:
+            widget_states: ``WidgetState``-Nachrichten der bedienten Widgets.
+            page: Name einer anderen Seite, auf die gewechselt wird.
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        if page is not None:
+            if page not in self.pages:
+                raise LookupError(f"Seite nicht gefunden: {page} (vorhanden: {sorted(self.pages)})")
+            self.page_script_hash = self.pages[page]
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = self.page_script_hash
+        message.rerun_script.widget_states.widgets.extend(widget_states)
+        self.connection.send(message.SerializeToString())
+
+        widgets, errors = [], []
+        deadline = time.monotonic() + self.timeout
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.connection.recv(timeout=max(deadline - time.monotonic(), 0.01)))
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                self.pages = {page.page_name: page.page_script_hash
+                              for page in forward.new_session.app_pages}
+                self.page_script_hash = forward.new_session.page_script_hash
+                widgets, errors = [], []
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_kind = element.WhichOneof("type")
+                if element_kind == "exception":
+                    errors.append(element.exception.message)
+                elif element_kind in ("button", "text_input", "number_input"):
+                    widgets.append((element_kind, getattr(element, element_kind)))
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("Kompilierfehler im Skript")
+                if forward.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    break
+        self.widgets = widgets
+        if errors:
+            raise RuntimeError(errors[0])
+
+    def click(self, label, **values):
+        """
+        Klickt einen Button; ``values`` setzt zuvor Eingabefelder (Beschriftung -> Wert), z. B.
+        die Felder des Formulars eines Submit-Buttons.
+        """
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        states = []
+        for field_label, value in values.items():
+            state = WidgetState()
+            if isinstance(value, str):
+                state.id = self.widget("text_input", field_label).id
+                state.string_value = value
+            else:
+                state.id = self.widget("number_input", field_label).id
+                state.int_value = value
+            states.append(state)
+        states.append(WidgetState(id=self.widget("button", label).id, trigger_value=True))
+        self.run(states)
+
+
+class Session:
+    """
+    Ablauf eines Benutzers: Anmeldung, Eintrag erfassen, Tabelle und Grafik.
+    """
+
+    def __init__(self, username, url, timeout):
+        self.username = username
+        self.browser = BrowserSession(url, timeout)
+        self.timings = {}
+
+    def _step(self, name, action):
+        start = time.perf_counter()
+        try:
+            action()
+        except Exception as e:
+            raise RuntimeError(f"{name}: {e!r}") from e
+        self.timings[name] = (time.perf_counter() - start) * 1000
+
+    def _start(self):
+        self.browser.connect()
+        self.browser.run()
+
+    def _login(self):
+        # Das Anmeldeformular steht vor dem Registrierungsformular mit gleich benannten Feldern
+        self.browser.click("Login", Username=self.username, Password=PASSWORD)
+        # Im Browser löst die Cookie-Komponente nach der Anmeldung einen weiteren Lauf aus, der
+        # die Daten lädt und die Startseite zeigt
+        self.browser.run()
+
+    def _tracker(self):
+        self.browser.run(page=TRACKER_PAGE)
+        self.browser.click("🩸 Blutzucker-Tracker")
+
+    def run(self):
+        """
+        Durchläuft alle Schritte; bricht beim ersten Fehler ab. Die Verbindung bleibt offen.
+
+        Returns:
+            dict: Dauer pro Schritt in ms.
+        """
+        self._step("start", self._start)
+        self._step("login", self._login)
+        self._step("tracker", self._tracker)
+        self._step("append_record", lambda: self.browser.click(
+            "Eintrag hinzufügen", **{"Blutzuckerwert (mg/dL)": 123}))
+        self._step("table", lambda: self.browser.click("📋 Blutzucker-Werte"))
+        self._step("chart", lambda: self.browser.click("📊 Blutzucker-Grafik"))
+        return self.timings
+
+
+class RssSampler:
+    """
+    Erfasst in einem Hintergrund-Thread den höchsten RSS-Wert eines Prozesses.
+    """
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = rss_bytes(pid)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes(self.pid))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def summarize(durations):
+    p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+    return {"count": len(durations), "p50_ms": p50, "p90_ms": p90, "p99_ms": p99,
+            "mean_ms": float(np.mean(durations)), "max_ms": float(np.max(durations))}
+
+
+def run(server, usernames, sessions, concurrency, timeout):
+    """
+    Startet ``sessions`` Sessions mit höchstens ``concurrency`` gleichzeitig aktiven. Alle
+    Verbindungen bleiben bis zum Ende offen, damit der Speicherbedarf offener Sessions
+    sichtbar wird.
+
+    Returns:
+        dict: Perzentile pro Schritt, Fehler, Durchsatz, Speicherbedarf und Sync-Dauer.
+    """
+    pid = server.process.pid
+    rss_start = rss_bytes(pid)
+    open_sessions = [Session(usernames[i % len(usernames)], server.stream_url, timeout)
+                     for i in range(sessions)]
+    errors = []
+    start = time.perf_counter()
+    try:
+        with RssSampler(pid) as sampler, ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(session.run) for session in open_sessions]
+            for session, future in zip(open_sessions, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(f"{session.username}: {e}")
+        wall = time.perf_counter() - start
+        rss_end = rss_bytes(pid)
+
+        # Warten, bis alle Einträge auf dem WebDAV-Server liegen
+        drain_start = time.perf_counter()
+        while server.wal_pending() and time.perf_counter() - drain_start < timeout:
+            time.sleep(0.05)
+        drain = time.perf_counter() - drain_start
+    finally:
+        for session in open_sessions:
+            session.browser.close()
+
+    completed = sum(len(session.timings) == len(STEPS) for session in open_sessions)
+    steps = {step: summarize(durations) for step in STEPS
+             if (durations := [s.timings[step] for s in open_sessions if step in s.timings])}
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "completed": completed,
+        "errors": errors,
+        "wall_s": wall,
+        "sessions_per_s": completed / wall,
+        "appends_per_s": steps.get("append_record", {}).get("count", 0) / wall,
+        "wal_drain_s": drain,
+        "wal_pending": server.wal_pending(),
+        "rss_start_bytes": rss_start,
+        "rss_end_bytes": rss_end,
+        "rss_peak_bytes": sampler.peak,
+        "rss_growth_per_session_bytes": (rss_end - rss_start) / max(sessions, 1),
+        "steps": steps,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="Maximale Anzahl gleichzeitig aktiver Sessions")
+    parser.add_argument("--users", type=int, help="Anzahl Benutzerkonten (Standard: eines pro Session)")
+    parser.add_argument("--history-rows", type=int, default=5_000,
+                        help="Bestehende Messwerte pro Benutzer")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Künstliche Latenz des WebDAV-Servers pro Anfrage in Sekunden")
+    parser.add_argument("--webdav-threads", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Zeitlimit pro Lauf in Sekunden")
+    parser.add_argument("--output", help="JSON-Datei für die Ergebnisse (Standard: benchmarks/results/load-<Zeit>.json)")
+    parser.add_argument("--baseline", help="JSON-Datei eines früheren Laufs zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Erlaubte Verlangsamung gegenüber der Baseline (Anteil)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as webdav_dir, tempfile.TemporaryDirectory() as work_dir:
+        usernames = prepare_data(webdav_dir, args.users or args.sessions, args.history_rows)
+        with local_webdav_server(webdav_dir, latency=args.latency, threads=args.webdav_threads) as webdav_url:
+            startup = time.perf_counter()
+            with StreamlitServer(work_dir, webdav_url) as server:
+                startup = time.perf_counter() - startup
+                report = {"server_startup_s": startup,
+                          **run(server, usernames, args.sessions, args.concurrency, args.timeout)}
+
+    for step, result in report["steps"].items():
+        print(f"{step:14} n={result['count']:<5} p50 {result['p50_ms']:9.1f} ms  p90 {result['p90_ms']:9.1f} ms  "
+              f"p99 {result['p99_ms']:9.1f} ms")
+    print(f"{report['completed']}/{report['sessions']} Sessions in {report['wall_s']:.1f} s "
+          f"({report['sessions_per_s']:.2f} Sessions/s, {report['appends_per_s']:.2f} Einträge/s), "
+          f"Write-Ahead-Log nach {report['wal_drain_s']:.1f} s abgearbeitet")
+    print(f"Server-RSS {report['rss_start_bytes'] / 1e6:.0f} -> {report['rss_end_bytes'] / 1e6:.0f} MB "
+          f"(Spitze {report['rss_peak_bytes'] / 1e6:.0f} MB, "
+          f"{report['rss_growth_per_session_bytes'] / 1e6:.2f} MB pro offene Session)")
+    for error in report["errors"][:10]:
+        print(f"Fehler: {error}")
+
+    # Im Format von benchmarks.storage, damit ``compare`` die Schritte vergleichen kann
+    results = [{"backend": "webdav", "operation": step, "size": args.sessions, "unit": "sessions", **result}
+               for step, result in report["steps"].items()]
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("load-%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                     "pandas": pd.__version__, "platform": platform.platform(), "args": vars(args)},
+            "report": report,
+            "results": results,
+        }, f, indent=2, default=str)
+    print(f"Ergebnisse gespeichert: {output}")
+
+    if report["errors"]:
+        return 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} Regression(en) gegenüber {args.baseline}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
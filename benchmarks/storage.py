@@ -0,0 +1,294 @@
+"""
+Benchmarks der Speicherschicht (DataHandler, Stores, DataManager, Anmeldedaten).
+
+Jede Operation wird gegen fsspecs Memory- und lokales Dateisystem sowie gegen einen
+lokal gestarteten WebDAV-Server gemessen. Pro Operation werden die Latenz-Perzentile,
+die übertragenen Bytes und der Spitzenverbrauch an Speicher (tracemalloc) erfasst und
+als JSON gespeichert, sodass Läufe miteinander verglichen werden können. Da die Zeiten
+von der Maschine abhängen, wird die Baseline lokal erstellt und nicht eingecheckt:
+
+    python -m benchmarks.storage --rows 100,10000,1000000 --users 10,100000 \
+        --output benchmarks/results/baseline.json
+    python -m benchmarks.storage --rows 100,10000,1000000 --users 10,100000 \
+        --baseline benchmarks/results/baseline.json
+
+Für den WebDAV-Server werden die Pakete aus ``benchmarks/requirements.txt`` benötigt;
+fehlen sie, wird das Backend übersprungen.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+from types import SimpleNamespace
+
+import fsspec
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import credentials, glucose_history
+from benchmarks.webdav_server import local_webdav_server
+from utils.credential_store import ShardedCredentialStore
+from utils.data_handler import DataHandler
+from utils.metrics import InstrumentedFileSystem, Metrics
+from utils.partitioned_store import PartitionedStore
+from utils.segment_store import SegmentStore
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def open_backends(names, stack):
+    """
+    Erstellt die Dateisysteme der gewünschten Backends.
+
+    Returns:
+        dict: Backend-Name -> (Dateisystem, Root-Pfad).
+    """
+    backends = {}
+    for name in names:
+        if name == "memory":
+            backends[name] = (fsspec.filesystem("memory"), f"/bench-{uuid.uuid4().hex[:8]}")
+        elif name == "local":
+            backends[name] = (fsspec.filesystem("file"), stack.enter_context(tempfile.TemporaryDirectory()))
+        elif name == "webdav":
+            try:
+                base_url = stack.enter_context(local_webdav_server(stack.enter_context(tempfile.TemporaryDirectory())))
+            except ImportError as e:
+                print(f"WebDAV-Backend übersprungen ({e}); siehe benchmarks/requirements.txt")
+                continue
+            backends[name] = (fsspec.filesystem("webdav", base_url=base_url, skip_instance_cache=True), "bench")
+        else:
+            raise ValueError(f"Unbekanntes Backend: {name}")
+    return backends
+
+
+def measure(fs, operation, repeat, setup=None):
+    """
+    Misst eine Operation ``repeat`` Mal und einmal zusätzlich unter tracemalloc.
+
+    Args:
+        fs: Das gemessene Dateisystem (``InstrumentedFileSystem``).
+        operation: Aufruf ohne Argumente.
+        repeat: Anzahl gemessener Wiederholungen.
+        setup: Optionaler Aufruf vor jeder Wiederholung (nicht gemessen).
+
+    Returns:
+        dict: Latenz-Perzentile in ms, Bytes und Dateisystemaufrufe pro Durchlauf,
+        Spitzenverbrauch an Speicher in Bytes.
+    """
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        fs.metrics.reset()
+        start = time.perf_counter()
+        operation()
+        durations.append((time.perf_counter() - start) * 1000)
+    transferred = {"bytes_read": fs.metrics.counter("fs_bytes_read"),
+                   "bytes_written": fs.metrics.counter("fs_bytes_written"),
+                   "fs_calls": sum(timer["count"] for timer in fs.metrics.snapshot()["timers"])}
+
+    # Speicher separat messen, da tracemalloc die Laufzeit verfälscht
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+    return {"repeat": repeat, "p50_ms": p50, "p90_ms": p90, "p99_ms": p99,
+            "mean_ms": float(np.mean(durations)), **transferred, "peak_memory_bytes": peak}
+
+
+def glucose_operations(fs, root, rows):
+    """
+    Returns:
+        list: (Name, Operation, Setup) der Operationen auf Blutzuckerverläufen.
+    """
+    history = glucose_history(rows)
+    record = {"datum_zeit": history["datum_zeit"].iloc[-1] + pd.Timedelta("5min"),
+              "blutzuckerwert": 120, "zeitpunkt": "Sensor"}
+    folder = f"rows_{rows}"
+    dh = DataHandler(fs, root)
+    dh_gzip = DataHandler(fs, root, compression="gzip")
+    dh.save(f"{folder}/load.csv", history)
+    dh_gzip.save(f"{folder}/load_gz.csv", history)
+    dh.save(f"{folder}/load.parquet", history)
+    partitions = PartitionedStore(dh, f"{folder}/partitions")
+    partitions.write(history)
+    window_start = history["datum_zeit"].iloc[-1] - pd.Timedelta("90D")
+    segments = SegmentStore(dh, f"{folder}/segments.parquet")
+    segments.replace(history)
+    record_df = pd.DataFrame([record])
+
+    operations = [
+        ("DataHandler.save csv", lambda: dh.save(f"{folder}/save.csv", history), None),
+        ("DataHandler.load csv", lambda: dh.load(f"{folder}/load.csv", schema="glucose"), None),
+        ("DataHandler.save csv.gz", lambda: dh_gzip.save(f"{folder}/save_gz.csv", history), None),
+        ("DataHandler.load csv.gz", lambda: dh_gzip.load(f"{folder}/load_gz.csv", schema="glucose"), None),
+        ("DataHandler.save parquet", lambda: dh.save(f"{folder}/save.parquet", history), None),
+        ("DataHandler.load parquet", lambda: dh.load(f"{folder}/load.parquet", schema="glucose"), None),
+        ("PartitionedStore.load 90D", lambda: partitions.load(window_start, schema="glucose"), None),
+        ("SegmentStore.append", lambda: segments.append(record_df), None),
+    ]
+    operations.append(_append_record_operation(fs, root, folder, history, record))
+    return operations
+
+
+def _append_record_operation(fs, root, folder, history, record):
+    """
+    ``DataManager.append_record`` auf einem partitionierten Verlauf im Zeitfenster von 90 Tagen.
+    """
+    import streamlit as st
+    from utils.data_manager import DataManager
+    from utils.schema import get_schema
+
+    username = f"bench_{folder}"
+    PartitionedStore(DataHandler(fs, root), f"user_data_{username}/data").write(history)
+    end = history["datum_zeit"].iloc[-1]
+    state = SimpleNamespace(data_manager=None)
+
+    def setup():
+        st.session_state.clear()
+        st.session_state["username"] = username
+        data_manager = DataManager(fs_root_folder=root)
+        data_manager.fs = fs
+        data_manager.load_user_data("data_df", "data", initial_value=get_schema("glucose").empty_frame(),
+                                    time_window=(end - pd.Timedelta("90D"), None), schema="glucose")
+        state.data_manager = data_manager
+
+    return ("DataManager.append_record", lambda: state.data_manager.append_record("data_df", record), setup)
+
+
+def credential_operations(fs, root, users):
+    """
+    Returns:
+        list: (Name, Operation, Setup) der Operationen auf Anmeldedaten.
+    """
+    from utils.login_manager import LoginManager
+
+    content = credentials(users)
+    folder = f"users_{users}"
+    dh = DataHandler(fs, root)
+    dh.save(f"{folder}/credentials.yaml", content)
+    store = ShardedCredentialStore(dh, f"{folder}/credentials")
+    store.import_credentials(content)
+    username = next(reversed(content["usernames"]))
+
+    # Derselbe Ladepfad wie beim Start der App, ohne Streamlit-Authenticator
+    login_manager = object.__new__(LoginManager)
+    login_manager.data_manager = SimpleNamespace(_get_data_handler=lambda: dh)
+    login_manager.auth_credentials_file = f"{folder}/credentials.yaml"
+    login_manager.auth_credentials_folder = f"{folder}/credentials"
+
+    def login_lookup():
+        return login_manager._load_auth_credentials()[username]
+
+    def registration_check():
+        return any(record.get("email") == "neu@example.org"
+                   for record in login_manager._load_auth_credentials().values())
+
+    return [
+        ("credentials.yaml load", lambda: dh.load(f"{folder}/credentials.yaml"), None),
+        ("LoginManager login lookup", login_lookup, None),
+        ("LoginManager registration check", registration_check, None),
+    ]
+
+
+def run(backends, rows_sizes, user_sizes, repeat):
+    """
+    Führt alle Operationen für alle Backends und Grössen aus.
+
+    Returns:
+        list: Ein Ergebnis-Dictionary pro (Backend, Operation, Grösse).
+    """
+    results = []
+    for backend, (filesystem, root) in backends.items():
+        fs = InstrumentedFileSystem(filesystem, Metrics(enabled=True), backend=backend)
+        groups = [("rows", size, glucose_operations) for size in rows_sizes]
+        groups += [("users", size, credential_operations) for size in user_sizes]
+        for unit, size, operations in groups:
+            for name, operation, setup in operations(fs, root, size):
+                result = {"backend": backend, "operation": name, "size": size, "unit": unit,
+                          **measure(fs, operation, repeat, setup)}
+                results.append(result)
+                print(f"{backend:7} {name:34} {size:>9} {unit:5} p50 {result['p50_ms']:9.2f} ms "
+                      f"p99 {result['p99_ms']:9.2f} ms  {result['bytes_read'] + result['bytes_written']:>11} B "
+                      f"peak {result['peak_memory_bytes'] / 1e6:8.1f} MB")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Vergleicht die Medianlatenzen mit einer Baseline.
+
+    Returns:
+        list: Die Ergebnisse, die um mehr als ``threshold`` (Anteil) langsamer sind.
+    """
+    reference = {(r["backend"], r["operation"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = reference.get((result["backend"], result["operation"], result["size"]))
+        if base is None:
+            continue
+        ratio = result["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float("inf")
+        # Abweichungen unter 1 ms gelten als Messrauschen
+        regressed = ratio > 1 + threshold and result["p50_ms"] - base["p50_ms"] > 1.0
+        print(f"{'REGRESSION' if regressed else 'ok':10} {result['backend']:7} {result['operation']:34} "
+              f"{result['size']:>9}: {base['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} ms ({ratio:5.2f}x)")
+        if regressed:
+            regressions.append(result)
+    return regressions
+
+
+def _sizes(value):
+    return [int(size) for size in value.split(",") if size]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default="memory,local,webdav")
+    parser.add_argument("--rows", type=_sizes, default=[100, 10_000, 100_000],
+                        help="Grössen der Blutzuckerverläufe, z. B. 100,10000,1000000")
+    parser.add_argument("--users", type=_sizes, default=[10, 1_000],
+                        help="Anzahl Benutzer der Anmeldedaten, z. B. 10,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="JSON-Datei für die Ergebnisse (Standard: benchmarks/results/<Zeit>.json)")
+    parser.add_argument("--baseline", help="JSON-Datei eines früheren Laufs zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Erlaubte Verlangsamung gegenüber der Baseline (Anteil)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    with ExitStack() as stack:
+        backends = open_backends(args.backends.split(","), stack)
+        results = run(backends, args.rows, args.users, args.repeat)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                     "pandas": pd.__version__, "platform": platform.platform(), "args": vars(args)},
+            "results": results,
+        }, f, indent=2, default=str)
+    print(f"Ergebnisse gespeichert: {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} Regression(en) gegenüber {args.baseline}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
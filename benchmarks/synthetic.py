@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from utils.schema import GLUCOSE_SCHEMA, ZEITPUNKTE
+
+# Platzhalter im Format eines bcrypt-Hashes; echte Hashes für 100k Benutzer zu berechnen dauert Stunden
+PASSWORD_HASH = "$2b$12$" + "x" * 53
+
+
+def glucose_history(rows, end="2025-01-01", freq="5min", seed=0):
+    """
+    Erzeugt einen synthetischen Sensorverlauf im Schema der App.
+
+    Die Werte folgen einem Tagesrhythmus mit Mahlzeitenspitzen und Rauschen und liegen
+    im Bereich 40-400 mg/dL.
+
+    Args:
+        rows: Anzahl Messwerte.
+        end: Zeitpunkt des letzten Messwerts.
+        freq: Abstand der Messwerte.
+        seed: Startwert des Zufallsgenerators.
+
+    Returns:
+        pd.DataFrame: Die Messwerte in den Typen von ``GLUCOSE_SCHEMA``.
+    """
+    rng = np.random.default_rng(seed)
+    datum_zeit = pd.date_range(end=end, periods=rows, freq=freq)
+    stunde = datum_zeit.hour.to_numpy() + datum_zeit.minute.to_numpy() / 60
+    tagesgang = 25 * np.sin((stunde - 8) / 24 * 2 * np.pi)
+    mahlzeiten = sum(60 * np.exp(-((stunde - h) ** 2) / 0.8) for h in (7.5, 12.5, 19))
+    werte = 120 + tagesgang + mahlzeiten + rng.normal(0, 18, rows)
+    zeitpunkt = rng.choice(ZEITPUNKTE, size=rows, p=[0.05, 0.05, 0.9])
+    return GLUCOSE_SCHEMA.coerce(pd.DataFrame({
+        "datum_zeit": datum_zeit,
+        "blutzuckerwert": np.clip(werte, 40, 400).round(),
+        "zeitpunkt": zeitpunkt,
+    }))
+
+
+def credentials(users, password_hash=PASSWORD_HASH):
+    """
+    Erzeugt Anmeldedaten im Format von ``credentials.yaml``.
+
+    Args:
+        users: Anzahl Benutzer.
+        password_hash: bcrypt-Hash, der für alle Benutzer eingetragen wird.
+
+    Returns:
+        dict: {"usernames": {Benutzername: Datensatz}}.
+    """
+    return {"usernames": {
+        f"user{i:06d}": {
+            "email": f"user{i:06d}@example.org",
+            "first_name": "Test",
+            "last_name": f"Benutzer {i}",
+            "password": password_hash,
+            "failed_login_attempts": 0,
+            "logged_in": False,
+        }
+        for i in range(users)
+    }}
@@ -0,0 +1,57 @@
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def local_webdav_server(root_dir, latency=0.0, threads=8):
+    """
+    Startet einen lokalen WebDAV-Server (WsgiDAV/cheroot) als Ersatz für den Produktivserver.
+
+    Benötigt die optionalen Pakete aus ``benchmarks/requirements.txt``.
+
+    Args:
+        root_dir: Lokales Verzeichnis, das der Server bereitstellt.
+        latency: Künstliche Verzögerung pro Anfrage in Sekunden, um einen entfernten Server
+            nachzubilden.
+        threads: Anzahl Worker-Threads des Servers.
+
+    Yields:
+        str: Die Basis-URL des Servers.
+    """
+    from cheroot import wsgi
+    from wsgidav.wsgidav_app import WsgiDAVApp
+
+    port = free_port()
+    app = WsgiDAVApp({
+        "provider_mapping": {"/": root_dir},
+        "simple_dc": {"user_mapping": {"*": True}},  # anonymer Zugriff
+        "verbose": 0,
+        "logging": {"enable": False},
+    })
+    if latency:
+        dav_app = app
+
+        def app(environ, start_response):
+            time.sleep(latency)
+            return dav_app(environ, start_response)
+
+    server = wsgi.Server(("127.0.0.1", port), app, numthreads=threads)
+    thread = threading.Thread(target=server.safe_start, name="webdav-server", daemon=True)
+    thread.start()
+    for _ in range(100):
+        if server.ready:
+            break
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.stop()
+        thread.join(timeout=5)
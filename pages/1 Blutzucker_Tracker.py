@@ -1,8 +1,10 @@
 import streamlit as st
-from datetime import datetime
-from zoneinfo import ZoneInfo
 import pandas as pd
 from utils.data_manager import DataManager
+from utils.helpers import ch_now
+from utils.downsampling import downsample
+from utils.importer import read_export
+from utils.table_view import SPALTEN, table_projection, sort_order, filter_and_sort, paginate
 from utils.login_manager import LoginManager
 import os
 
@@ -19,6 +21,9 @@ if not username:
     st.error("⚠️ Kein Benutzer eingeloggt! Anmeldung erforderlich.")
     st.stop()
 
+# Neuere Daten aus anderen Sessions (z. B. weiterer Tab) übernehmen
+DataManager().refresh_user_data("data_df")
+
 # ====== Navigation ======
 col1, col2, col3, col4 = st.columns(4)
 
@@ -65,7 +70,7 @@ def blutzucker_tracker():
         submit_button = st.form_submit_button(label='Eintrag hinzufügen')
 
     if submit_button:
-        datum_zeit = datetime.now(ZoneInfo("Europe/Zurich")).strftime("%Y-%m-%d %H:%M:%S")
+        datum_zeit = ch_now()
         new_entry = {
             "datum_zeit": datum_zeit,
             "blutzuckerwert": blutzuckerwert,
@@ -80,6 +85,154 @@ def blutzucker_tracker():
         #st.write(new_entry)
         DataManager().append_record(session_state_key='data_df', record_dict=new_entry)
         #st.write(st.session_state)
+        # Noch nicht geladene Warnregeln prüfen beim Laden die Werte seit dem letzten Stand
+        for warnung in DataManager().load_user_alerts('data_df').last_alerts:
+            st.warning(f"⚠️ {warnung['regel']}: {warnung['meldung']}")
+
+    if DataManager().write_errors:
+        fehler = next(iter(DataManager().write_errors.values()))
+        st.error(f"⚠️ Nicht alle Werte konnten gespeichert werden: {fehler}")
+        if st.button("Erneut speichern"):
+            DataManager().retry_failed_writes()
+            st.rerun()
+    elif DataManager().sync_error is not None:
+        st.caption("📴 Lokal gespeichert – wird synchronisiert, sobald der Server erreichbar ist")
+    elif DataManager().has_pending_writes:
+        st.caption("💾 Speichere…")
+
+    with st.expander("📥 Messgerät-Export importieren"):
+        st.write("Unterstützt werden CSV-Exporte von FreeStyle Libre, Dexcom und dieser App.")
+        datei = st.file_uploader("CSV-Datei", type=["csv", "txt"])
+        if datei is not None and st.button("Importieren"):
+            data_manager = DataManager()
+            fortschritt = st.progress(0.0, text="Importiere…")
+            anzahl = 0
+            try:
+                format_name, bloecke = read_export(
+                    datei,
+                    existing_keys=data_manager.stored_keys('data_df'),
+                    progress_callback=lambda anteil: fortschritt.progress(anteil, text="Importiere…"))
+                # Jeder Block wird gespeichert, bevor der nächste gelesen wird
+                for block in bloecke:
+                    data_manager.append_records('data_df', block)
+                    anzahl += len(block)
+            except ValueError as e:
+                st.error(f"Import fehlgeschlagen nach {anzahl} Werten: {e}")
+            else:
+                fortschritt.progress(1.0, text="Fertig")
+                st.success(f"{anzahl} neue Werte aus {format_name} importiert.")
+                warnungen = data_manager.load_user_alerts('data_df').last_alerts
+                if warnungen:
+                    st.warning(f"⚠️ {len(warnungen)} Warnungen in den importierten Werten.")
+
+
+# ====== Warnungen ======
+def warnungen_anzeigen(warnungen, tage=14):
+    letzte = warnungen.recent(since=ch_now() - pd.Timedelta(days=tage))
+    st.markdown("### Warnungen")
+    if not letzte:
+        st.write(f"Keine Warnungen in den letzten {tage} Tagen.")
+        return
+    st.dataframe(pd.DataFrame([{
+        "Datum/Zeit": pd.Timestamp(warnung["datum_zeit"]).strftime("%d.%m.%Y %H:%M"),
+        "Regel": warnung["regel"],
+        "Meldung": warnung["meldung"],
+    } for warnung in letzte]), hide_index=True, use_container_width=True)
+
+
+# ====== Export ======
+EXPORTFORMATE = {"CSV": "csv", "Excel": "xlsx", "PDF-Bericht (für Ärztin/Arzt)": "pdf"}
+
+
+def export_anzeigen():
+    st.markdown("### Export")
+    data_manager = DataManager()
+    col1, col2 = st.columns(2)
+    with col1:
+        fmt = EXPORTFORMATE[st.selectbox("Format", list(EXPORTFORMATE), key="export_format")]
+    with col2:
+        if st.button("📤 Gesamte Historie exportieren"):
+            data_manager.export_user_data("data_df", fmt, title=f"Blutzuckerwerte von {username}")
+
+    job = data_manager.export_job("data_df", fmt)
+    if job is None:
+        return
+    if job.status == "fertig":
+        st.download_button(f"📥 {job.file_name} herunterladen", export_datei(job.path, job),
+                           file_name=job.file_name, mime=job.mime)
+    elif job.status == "fehler":
+        st.error(f"Export fehlgeschlagen: {job.error}")
+    else:
+        st.info(f"Export läuft im Hintergrund … {job.rows} Werte verarbeitet.")
+        if st.button("🔄 Status aktualisieren"):
+            st.rerun()
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def export_datei(pfad, _job):
+    """
+    Inhalt einer fertigen Exportdatei; der Pfad enthält die Datenversion.
+    """
+    return _job.read()
+
+
+# ====== Statistik ======
+def statistik_anzeigen(statistik):
+    heute = ch_now()
+    iso = heute.isocalendar()
+    gruppen = {
+        "Gesamt": ("gesamt", ""),
+        "Diese Woche": ("woche", f"{iso[0]}-W{iso[1]:02d}"),
+        "Heute": ("tag", heute.strftime("%Y-%m-%d")),
+    }
+    zeilen = []
+    for name, (scope, periode) in gruppen.items():
+        for zeitpunkt in ["alle", "Nüchtern", "Nach dem Essen"]:
+            kennzahlen = statistik.summary(scope, periode, zeitpunkt)
+            if kennzahlen is None:
+                continue
+            zeilen.append({
+                "Zeitraum": name,
+                "Zeitpunkt": zeitpunkt,
+                "Anzahl": kennzahlen["anzahl"],
+                "Mittelwert (mg/dL)": round(kennzahlen["mittelwert"], 1),
+                "Std.-Abw.": round(kennzahlen["standardabweichung"], 1),
+                "Min": kennzahlen["minimum"],
+                "Max": kennzahlen["maximum"],
+                "Im Zielbereich": f"{kennzahlen['zeit_im_zielbereich']:.0%}",
+                "HbA1c (geschätzt)": f"{kennzahlen['hba1c']:.1f} %",
+            })
+    st.markdown("### Statistik")
+    st.dataframe(pd.DataFrame(zeilen), hide_index=True, use_container_width=True)
+
+
+# ====== Tabelle ======
+def werte_tabelle(data_df):
+    tabelle = table_projection(data_df)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        zeitraum = st.date_input("Zeitraum", value=(), key="tabelle_zeitraum")
+    with col2:
+        zeitpunkte = st.multiselect("Zeitpunkt", ["Nüchtern", "Nach dem Essen"], key="tabelle_zeitpunkte")
+    with col3:
+        sortierung = st.selectbox("Sortieren nach", list(SPALTEN.values()), key="tabelle_sortierung")
+        absteigend = st.toggle("Absteigend", value=True, key="tabelle_absteigend")
+
+    start = pd.Timestamp(zeitraum[0]) if zeitraum else None
+    ende = pd.Timestamp(zeitraum[-1]) + pd.Timedelta(days=1) if zeitraum else None
+    reihenfolge = sort_order(tabelle, sortierung, not absteigend, DataManager().data_version("data_df"))
+    gefiltert = filter_and_sort(tabelle, start, ende, zeitpunkte or None, reihenfolge)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        seitengroesse = st.selectbox("Zeilen pro Seite", [25, 50, 100, 250], key="tabelle_seitengroesse")
+    with col2:
+        seite = st.number_input("Seite", min_value=1, value=1, step=1, key="tabelle_seite")
+    zeilen, seiten = paginate(tabelle, gefiltert, seite, seitengroesse)
+
+    st.dataframe(zeilen, hide_index=True, use_container_width=True)
+    st.caption(f"Seite {min(seite, seiten)} von {seiten} · {len(gefiltert)} Einträge")
 
 
 # ====== Blutzucker-Werte ======
@@ -90,15 +243,19 @@ def blutzucker_werte():
         st.warning("Noch keine Werte gespeichert.")
     else:
         st.markdown("### Gespeicherte Blutzuckerwerte")
-        renamed_data = st.session_state["data_df"].rename(columns={
-            "datum_zeit": "Datum & Uhrzeit",
-            "blutzuckerwert": "Blutzuckerwert (mg/dL)",
-            "zeitpunkt": "Zeitpunkt"
-        })
-        st.table(renamed_data[["Datum & Uhrzeit", "Blutzuckerwert (mg/dL)", "Zeitpunkt"]])
+        werte_tabelle(st.session_state["data_df"])
+
+        statistik = DataManager().load_user_statistics('data_df')
+        gesamt = statistik.summary()
+        if gesamt is not None:
+            st.markdown(f"**Durchschnittlicher Blutzuckerwert:** {gesamt['mittelwert']:.2f} mg/dL")
+            statistik_anzeigen(statistik)
+        warnungen_anzeigen(DataManager().load_user_alerts('data_df'))
+        export_anzeigen()
 
-        durchschnitt = st.session_state["data_df"]["blutzuckerwert"].mean()
-        st.markdown(f"**Durchschnittlicher Blutzuckerwert:** {durchschnitt:.2f} mg/dL")
+        if st.session_state.get("weitere_werte", True) and st.button("⏪ Ältere Werte laden"):
+            st.session_state.weitere_werte = DataManager().load_older_user_data('data_df')
+            st.rerun()
 
 # ====== Blutzucker-Grafik ======
 def blutzucker_grafik():
@@ -109,12 +266,30 @@ def blutzucker_grafik():
         st.info("Keine Blutzucker-Daten vorhanden. Bitte fügen Sie Werte auf der Startseite hinzu.")
         st.stop()
 
+    data_df = st.session_state["data_df"]
+    erster, letzter = data_df["datum_zeit"].min().date(), data_df["datum_zeit"].max().date()
+    zeitraum = st.date_input("Zeitraum", value=(max(erster, letzter - pd.Timedelta(days=30)), letzter),
+                             min_value=erster, max_value=letzter)
+    start, ende = (zeitraum[0], zeitraum[-1]) if zeitraum else (erster, letzter)
+    darstellung = st.radio("Darstellung", ["Einzelwerte", "Mittelwert mit Min/Max"], horizontal=True)
+    methode = "lttb" if darstellung == "Einzelwerte" else "buckets"
+
     # Verlauf der Blutzuckerwerte
-    st.line_chart(data=st.session_state["data_df"].set_index("datum_zeit")["blutzuckerwert"],
-                  use_container_width=True)
+    diagramm = diagramm_daten(username, DataManager().data_version("data_df"),
+                              pd.Timestamp(start), pd.Timestamp(ende) + pd.Timedelta(days=1),
+                              methode, data_df)
+    st.line_chart(data=diagramm, use_container_width=True)
     st.caption("Blutzuckerwerte über Zeit (mg/dL)")
 
 
+@st.cache_data(max_entries=64, show_spinner=False)
+def diagramm_daten(username, version, start, ende, methode, _data_df, max_punkte=1000):
+    """
+    Reduzierte Diagrammdaten, zwischengespeichert pro Benutzer, Datenversion, Zeitraum und Auflösung.
+    """
+    return downsample(_data_df, start, ende, max_points=max_punkte, method=methode)
+
+
 # ====== Seitenwechsel ======
 if "seite" not in st.session_state:
     st.session_state.seite = "Startseite"  # Standardseite ist die Startseite
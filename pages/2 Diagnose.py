@@ -0,0 +1,90 @@
+import hashlib
+import streamlit as st
+import pandas as pd
+from utils.data_manager import DataManager
+from utils.login_manager import LoginManager
+from utils.metrics import METRICS
+
+# Seitenkonfiguration
+st.set_page_config(page_title="Diagnose", layout="wide")
+
+# ====== Login-Check ======
+login_manager = LoginManager()
+login_manager.go_to_login('Start.py')
+if not login_manager.is_admin():
+    st.error("⚠️ Die Diagnose ist nur für Administratoren zugänglich.")
+    st.stop()
+
+st.markdown("## 🩺 Diagnose")
+
+if not METRICS.enabled:
+    st.info("Die Messwerte sind deaktiviert. Aktivieren mit `DataManager(metrics=True)`.")
+    st.stop()
+
+data_manager = DataManager()
+snapshot = METRICS.snapshot()
+
+
+def labels_text(labels):
+    return ", ".join(f"{key}={value}" for key, value in labels.items())
+
+
+# ====== Synchronisation ======
+st.markdown("### 🔄 Synchronisation")
+col1, col2 = st.columns(2)
+col1.metric("Ausstehende Schreibvorgänge", "Ja" if data_manager.has_pending_writes else "Nein")
+col2.metric("Sync-Status", "Fehler" if data_manager.sync_error else "OK")
+if data_manager.sync_error:
+    # Nur die Fehlerart anzeigen, die Meldung kann entfernte Pfade enthalten
+    st.warning(f"Letzter Sync-Fehler: {type(data_manager.sync_error).__name__}")
+
+# ====== Zeitmessungen ======
+st.markdown("### ⏱️ Zeitmessungen")
+if snapshot["timers"]:
+    st.dataframe(pd.DataFrame([{
+        "Messpunkt": timer["name"],
+        "Labels": labels_text(timer["labels"]),
+        "Anzahl": timer["count"],
+        "Mittel (ms)": 1000 * timer["sum"] / timer["count"],
+        "p95 (ms, ≤)": 1000 * METRICS.quantile(timer["buckets"], 0.95),
+        "Max (ms)": 1000 * timer["max"],
+    } for timer in snapshot["timers"]]), hide_index=True, use_container_width=True)
+else:
+    st.write("Noch keine Zeitmessungen.")
+
+# ====== Zähler und Gauges ======
+col1, col2 = st.columns(2)
+with col1:
+    st.markdown("### 🔢 Zähler")
+    st.dataframe(pd.DataFrame([{
+        "Zähler": counter["name"], "Labels": labels_text(counter["labels"]), "Wert": counter["value"],
+    } for counter in snapshot["counters"]], columns=["Zähler", "Labels", "Wert"]),
+        hide_index=True, use_container_width=True)
+with col2:
+    st.markdown("### 📦 Caches und Warteschlangen")
+    st.dataframe(pd.DataFrame([{
+        "Gauge": gauge["name"], "Labels": labels_text(gauge["labels"]), "Wert": gauge["value"],
+    } for gauge in snapshot["gauges"]], columns=["Gauge", "Labels", "Wert"]),
+        hide_index=True, use_container_width=True)
+
+# ====== Gemeinsamer Daten-Cache ======
+if data_manager.shared_cache is not None:
+    st.markdown("### 🗂️ Gemeinsamer Daten-Cache")
+    stats = data_manager.shared_cache.stats()
+    st.caption(f"{stats['bytes'] / 1e6:.1f} von {stats['max_bytes'] / 1e6:.0f} MB belegt · "
+               f"{stats['hits']} Treffer · {stats['misses']} Fehlzugriffe")
+    if stats["entries"]:
+        # Dateipfade enthalten Benutzernamen und werden nur als Kurz-Hash angezeigt
+        entries = pd.DataFrame(stats["entries"])
+        entries["file"] = entries["file"].map(lambda key: hashlib.sha1(key.encode("utf-8")).hexdigest()[:10])
+        st.dataframe(entries, hide_index=True, use_container_width=True)
+
+# ====== Export ======
+col1, col2 = st.columns(2)
+with col1:
+    st.download_button("📥 Prometheus-Export", METRICS.to_prometheus(),
+                       file_name="metrics.prom", mime="text/plain")
+with col2:
+    if st.button("🧹 Messwerte zurücksetzen"):
+        METRICS.reset()
+        st.rerun()
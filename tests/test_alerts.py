@@ -0,0 +1,69 @@
+import json
+import numpy as np
+import pandas as pd
+from utils.alerts import AlertEngine, CountRule, RateOfChangeRule, ThresholdRule
+
+
+def record(zeit, wert, zeitpunkt="Nüchtern"):
+    return {"datum_zeit": pd.Timestamp(zeit), "blutzuckerwert": wert, "zeitpunkt": zeitpunkt}
+
+
+def verlauf(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "datum_zeit": pd.Timestamp("2026-01-01") + pd.to_timedelta(np.cumsum(rng.integers(1, 300, n)), unit="min"),
+        "blutzuckerwert": rng.normal(130, 50, n).round(),
+        "zeitpunkt": rng.choice(["Nüchtern", "Nach dem Essen"], n),
+    })
+
+
+def test_threshold_rule_fires_per_value():
+    engine = AlertEngine([ThresholdRule("Hypo", below=70)])
+
+    assert engine.update(record("2026-01-01 08:00", 95)) == []
+    fired = engine.update(record("2026-01-01 12:00", 62))
+    assert [alert["regel"] for alert in fired] == ["Hypo"]
+    assert "62 mg/dL unter 70" in fired[0]["meldung"]
+
+
+def test_count_rule_uses_a_sliding_window():
+    rule = CountRule("Hyper", count=3, window="7D", above=180, zeitpunkt="Nach dem Essen")
+    engine = AlertEngine([rule])
+
+    assert engine.update_many([record("2026-01-01", 200, "Nach dem Essen"),
+                               record("2026-01-02", 210, "Nach dem Essen"),
+                               record("2026-01-03", 250, "Nüchtern")])
+    assert engine.last_alerts == []
+    # Der erste Treffer liegt ausserhalb des Fensters
+    assert engine.update(record("2026-01-08", 190, "Nach dem Essen")) == []
+    assert len(engine.update(record("2026-01-08 12:00", 190, "Nach dem Essen"))) == 1
+
+
+def test_rate_of_change_ignores_gaps():
+    engine = AlertEngine([RateOfChangeRule("Schnell", max_rate=3.0, max_gap="30min")])
+    engine.update(record("2026-01-01 08:00", 100))
+
+    assert len(engine.update(record("2026-01-01 08:10", 140))) == 1
+    assert engine.update(record("2026-01-01 10:00", 300)) == []
+
+
+def test_incremental_evaluation_matches_backfill():
+    data = verlauf(2000)
+    full = AlertEngine.from_frame(data)
+
+    half = AlertEngine.from_dict(json.loads(json.dumps(AlertEngine.from_frame(data.iloc[:1000]).to_dict())))
+    assert half.update_many(data.iloc[1000:].to_dict("records"))
+    assert half.alerts == full.alerts
+    assert half.to_dict() == full.to_dict()
+
+
+def test_older_records_require_a_rebuild():
+    engine = AlertEngine.from_frame(verlauf(10))
+
+    assert engine.update(record("2025-12-31", 50)) is None
+    assert not engine.update_many([record("2025-12-31", 50)])
+
+
+def test_sidecar_with_other_rules_is_discarded():
+    stored = AlertEngine.from_frame(verlauf(10)).to_dict()
+    assert AlertEngine.from_dict(stored, [ThresholdRule("Hypo", below=65)]) is None
@@ -0,0 +1,72 @@
+import uuid
+import pandas as pd
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from utils.data_handler import DataHandler, MISSING
+
+
+class CountingMemoryFileSystem(MemoryFileSystem):
+    """
+    Speicher-Dateisystem, das die Metadaten-Abfragen zählt.
+    """
+
+    info_calls = 0
+
+    def info(self, path, **kwargs):
+        self.info_calls += 1
+        return super().info(path, **kwargs)
+
+
+def records(n):
+    return pd.DataFrame({"datum_zeit": pd.date_range("2026-01-01", periods=n, freq="h").astype(str),
+                         "blutzuckerwert": range(100, 100 + n)})
+
+
+@pytest.fixture
+def filesystem():
+    return CountingMemoryFileSystem()
+
+
+@pytest.fixture
+def root():
+    return f"/test-{uuid.uuid4().hex}"
+
+
+def test_text_files_are_stored_compressed(filesystem, root):
+    handler = DataHandler(filesystem, root, compression="gzip")
+    handler.save("user_data_a/data.csv", records(50))
+
+    assert filesystem.cat_file(f"{root}/user_data_a/data.csv.gz")[:2] == b"\x1f\x8b"
+    assert not filesystem.exists(f"{root}/user_data_a/data.csv")
+    pd.testing.assert_frame_equal(handler.load("user_data_a/data.csv"), records(50))
+    assert pd.concat(handler.iter_chunks("user_data_a/data.csv", chunksize=20)).shape == (50, 2)
+
+
+def test_legacy_uncompressed_files_are_still_read(filesystem, root):
+    DataHandler(filesystem, root).save("user_data_a/data.csv", records(3))
+    handler = DataHandler(filesystem, root, compression="gzip")
+
+    assert handler.exists("user_data_a/data.csv")
+    assert handler.version("user_data_a/data.csv") != MISSING
+    pd.testing.assert_frame_equal(handler.load("user_data_a/data.csv"), records(3))
+
+    # Der nächste Speichervorgang schreibt komprimiert; gelesen wird danach diese Datei
+    handler.save("user_data_a/data.csv", records(5))
+    assert len(handler.load("user_data_a/data.csv")) == 5
+
+
+def test_load_needs_one_metadata_call(filesystem, root):
+    handler = DataHandler(filesystem, root, compression="gzip")
+    handler.save("user_data_a/data.csv", records(3))
+
+    filesystem.info_calls = 0
+    handler.load("user_data_a/data.csv")
+    assert filesystem.info_calls == 1
+
+
+def test_binary_formats_are_not_compressed_again(filesystem, root):
+    handler = DataHandler(filesystem, root, compression="gzip")
+    handler.save("user_data_a/data.parquet", records(3))
+
+    assert filesystem.exists(f"{root}/user_data_a/data.parquet")
+    assert len(handler.load("user_data_a/data.parquet")) == 3
@@ -0,0 +1,65 @@
+import uuid
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from utils.data_handler import DataHandler
+from utils.credential_store import CredentialConflictError, LazyUserRecords, ShardedCredentialStore
+
+
+def record(email):
+    return {"email": email, "name": email.split("@")[0], "password": "$2b$12$hash"}
+
+
+@pytest.fixture
+def store():
+    return ShardedCredentialStore(DataHandler(MemoryFileSystem(), f"/test-{uuid.uuid4().hex}"))
+
+
+def test_one_file_per_user_and_index(store):
+    store.save_user("anna", record("anna@example.ch"), create=True)
+    store.save_user("ben", record("ben@example.ch"), create=True)
+
+    assert store.load_user("anna") == record("anna@example.ch")
+    assert store.load_user("unbekannt") is None
+    assert store.load_index() == {"anna": {"email": "anna@example.ch"}, "ben": {"email": "ben@example.ch"}}
+
+
+def test_create_does_not_overwrite_existing_user(store):
+    store.save_user("anna", record("anna@example.ch"), create=True)
+    with pytest.raises(CredentialConflictError):
+        store.save_user("anna", record("andere@example.ch"), create=True)
+
+    assert store.load_user("anna")["email"] == "anna@example.ch"
+
+
+def test_import_and_rebuild_index(store):
+    store.import_credentials({"usernames": {"anna": record("anna@example.ch"), "ben": record("ben@example.ch")}})
+    assert store.exists()
+    # Bereits übernommen: ein zweiter Aufruf ändert nichts
+    store.import_credentials({"usernames": {"carla": record("carla@example.ch")}})
+
+    store.data_handler.remove(store.index_path)
+    store.rebuild_index()
+    assert sorted(store.load_index()) == ["anna", "ben"]
+
+
+def test_lazy_records_load_single_users(store):
+    store.save_user("anna", record("anna@example.ch"), create=True)
+    records = LazyUserRecords(store)
+
+    assert "anna" in records and "ben" not in records
+    assert records["anna"]["email"] == "anna@example.ch"
+    assert dict.keys(records) == {"anna"}
+
+
+def test_refresh_sees_users_registered_elsewhere(store):
+    records = LazyUserRecords(store)
+    assert [entry["email"] for entry in records.values()] == []
+    assert "ben" not in records
+
+    # Registrierung in einer anderen Session
+    store.save_user("ben", record("ben@example.ch"), create=True)
+    assert "ben" not in records
+
+    records.refresh()
+    assert "ben" in records
+    assert [entry["email"] for entry in records.values()] == ["ben@example.ch"]
@@ -0,0 +1,65 @@
+import os
+import multiprocessing
+import fsspec
+import pytest
+from utils.data_handler import DataHandler, MISSING, WriteConflictError
+
+INCREMENTS = 25
+
+
+def handler(root):
+    return DataHandler(fsspec.filesystem("file"), root)
+
+
+def increment(root, start):
+    start.wait()
+    for _ in range(INCREMENTS):
+        handler(root).update("zaehler.json", lambda stored: {"wert": stored["wert"] + 1},
+                             initial_value={"wert": 0})
+
+
+def save_expected(root, version, start, results):
+    start.wait()
+    try:
+        handler(root).save("zaehler.json", {"von": os.getpid()}, expected_version=version)
+        results.put("gespeichert")
+    except WriteConflictError:
+        results.put("konflikt")
+
+
+@pytest.fixture
+def context():
+    return multiprocessing.get_context("spawn")
+
+
+def run(context, target, *args):
+    processes = [context.Process(target=target, args=args) for _ in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+
+def test_concurrent_updates_are_not_lost(tmp_path, context):
+    root = str(tmp_path)
+    run(context, increment, root, context.Barrier(2))
+
+    assert handler(root).load("zaehler.json") == {"wert": 2 * INCREMENTS}
+    # Weder temporäre Dateien noch Sperrdateien bleiben liegen
+    assert os.listdir(root) == ["zaehler.json"]
+
+
+@pytest.mark.parametrize("existing", [False, True])
+def test_only_one_conditional_save_wins(tmp_path, context, existing):
+    root = str(tmp_path)
+    if existing:
+        handler(root).save("zaehler.json", {"von": None})
+    version = handler(root).version("zaehler.json")
+    assert (version == MISSING) is not existing
+    results = context.Queue()
+    run(context, save_expected, root, version, context.Barrier(2), results)
+
+    assert sorted(results.get(timeout=5) for _ in range(2)) == ["gespeichert", "konflikt"]
+    assert handler(root).load("zaehler.json")["von"] is not None
+    assert os.listdir(root) == ["zaehler.json"]
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from utils.downsampling import choose_resolution, downsample, lttb
+
+
+def werte(n, freq="5min"):
+    zeit = pd.date_range("2026-01-01", periods=n, freq=freq)
+    return pd.DataFrame({"datum_zeit": zeit, "blutzuckerwert": 120 + 40 * np.sin(np.arange(n) / 50)})
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    y = np.zeros(1000)
+    y[437] = 400  # einzelne Spitze
+    selected = lttb(np.arange(1000), y, 50)
+
+    assert len(selected) == 50
+    assert selected[0] == 0 and selected[-1] == 999
+    assert np.all(np.diff(selected) > 0)
+    assert 437 in selected
+
+
+def test_lttb_returns_everything_below_threshold():
+    assert lttb(np.arange(10), np.arange(10), 20).tolist() == list(range(10))
+
+
+def test_downsample_limits_points_in_window():
+    data = werte(20_000)
+    start, end = pd.Timestamp("2026-01-10"), pd.Timestamp("2026-01-20")
+
+    result = downsample(data, start, end, max_points=300)
+    assert len(result) == 300
+    assert result.index.min() >= start and result.index.max() <= end
+    assert set(result["blutzuckerwert"]) <= set(data["blutzuckerwert"])
+
+
+def test_bucket_method_aggregates_per_resolution():
+    data = werte(20_000)
+    result = downsample(data, max_points=500, method="buckets")
+
+    # Knapp 70 Tage: 3h-Buckets ergäben über 500 Punkte
+    assert choose_resolution(data["datum_zeit"].iloc[0], data["datum_zeit"].iloc[-1], 500) == "6h"
+    assert len(result) <= 500
+    assert result.index.to_series().diff().dropna().eq(pd.Timedelta("6h")).all()
+    assert (result["Minimum"] <= result["Mittelwert"]).all()
+    assert (result["Mittelwert"] <= result["Maximum"]).all()
+
+
+def test_short_series_is_returned_unchanged():
+    data = werte(100)
+    result = downsample(data, max_points=1000)
+    assert result["blutzuckerwert"].tolist() == data["blutzuckerwert"].tolist()
@@ -0,0 +1,101 @@
+import io
+import uuid
+import pandas as pd
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from utils.data_handler import DataHandler
+from utils.export import Exporter, FERTIG, FEHLER, export_file_name
+from utils.table_view import SPALTEN
+
+
+def werte(n):
+    return pd.DataFrame({
+        "datum_zeit": pd.date_range("2026-01-01", periods=n, freq="h"),
+        "blutzuckerwert": [100 + i % 80 for i in range(n)],
+        "zeitpunkt": ["Nüchtern", "Nach dem Essen"] * (n // 2) + ["Nüchtern"] * (n % 2),
+    })
+
+
+def stueckweise(data):
+    """
+    Liefert den Aufruf ``chunks(chunksize)`` für den Exporter und zählt die Durchgänge.
+    """
+    def chunks(chunksize):
+        chunks.calls += 1
+        for start in range(0, len(data), chunksize):
+            yield data.iloc[start:start + chunksize]
+    chunks.calls = 0
+    return chunks
+
+
+@pytest.fixture
+def handler():
+    return DataHandler(MemoryFileSystem(), f"/test-{uuid.uuid4().hex}")
+
+
+@pytest.fixture
+def exporter():
+    return Exporter(max_workers=1, chunksize=100)
+
+
+def test_csv_export_is_written_in_chunks(handler, exporter):
+    job = exporter.submit(handler, "user_data_a/exports", "werte", "csv", stueckweise(werte(250)), lambda: 1)
+    job.future.result()
+
+    assert job.status == FERTIG and job.rows == 250
+    result = pd.read_csv(io.BytesIO(job.read()))
+    assert list(result.columns) == list(SPALTEN.values())
+    assert len(result) == 250
+
+
+def test_same_version_reuses_the_existing_file(handler, exporter):
+    chunks = stueckweise(werte(10))
+    erster = exporter.submit(handler, "user_data_a/exports", "werte", "csv", chunks, lambda: 1)
+    erster.future.result()
+    assert exporter.submit(handler, "user_data_a/exports", "werte", "csv", chunks, lambda: 1) is erster
+
+    # Ein neuer Prozess findet die Datei anhand ihres Namens
+    job = Exporter().submit(handler, "user_data_a/exports", "werte", "csv", chunks, lambda: 1)
+    assert job.status == FERTIG and job.future is None
+    assert chunks.calls == 1
+
+
+def test_new_version_replaces_older_exports(handler, exporter):
+    exporter.submit(handler, "user_data_a/exports", "werte", "csv", stueckweise(werte(10)), lambda: 1).future.result()
+    exporter.submit(handler, "user_data_a/exports", "werte", "csv", stueckweise(werte(11)), lambda: 2).future.result()
+
+    assert list(handler.list_files("user_data_a/exports")) == [export_file_name("werte", "csv", 2)]
+
+
+def test_changed_data_restarts_the_export(handler, exporter):
+    versionen = iter([1, 2, 2])
+    job = exporter.submit(handler, "user_data_a/exports", "werte", "csv", stueckweise(werte(10)),
+                          lambda: next(versionen))
+    job.future.result()
+
+    assert job.version == 2
+    assert job.file_name == export_file_name("werte", "csv", 2)
+
+
+@pytest.mark.parametrize("fmt, magic", [("xlsx", b"PK"), ("pdf", b"%PDF")])
+def test_report_formats(handler, exporter, fmt, magic):
+    pytest.importorskip("openpyxl" if fmt == "xlsx" else "matplotlib")
+    job = exporter.submit(handler, "user_data_a/exports", "werte", fmt, stueckweise(werte(250)), lambda: 1,
+                          title="Blutzucker")
+    job.future.result()
+
+    assert job.status == FERTIG, job.error
+    assert job.read()[:len(magic)] == magic
+
+
+def test_failed_export_reports_the_error(handler, exporter):
+    def kaputt(chunksize):
+        raise OSError("Verbindung unterbrochen")
+        yield
+
+    job = exporter.submit(handler, "user_data_a/exports", "werte", "csv", kaputt, lambda: 1)
+    job.future.result()
+
+    assert job.status == FEHLER and "Verbindung unterbrochen" in job.error
+    with pytest.raises(ValueError):
+        exporter.submit(handler, "user_data_a/exports", "werte", "docx", kaputt, lambda: 1)
@@ -0,0 +1,146 @@
+import os
+import uuid
+import hashlib
+import fsspec
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from utils.file_cache import CachedFileSystem, DiskCache
+
+
+class EtagMemoryFileSystem(MemoryFileSystem):
+    """
+    Speicher-Dateisystem, das wie ein WebDAV-Server einen ETag pro Dateistand liefert.
+    """
+
+    def info(self, path, **kwargs):
+        info = dict(super().info(path, **kwargs))
+        if info["type"] == "file":
+            info["etag"] = hashlib.md5(self.cat_file(path)).hexdigest()
+            info.pop("created", None)
+        return info
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def memory_path():
+    return f"/test-{uuid.uuid4().hex}/data.csv"
+
+
+def read(filesystem, path):
+    with filesystem.open(path, "rb") as f:
+        return f.read()
+
+
+def test_hit_after_miss_with_etag(cache, memory_path):
+    remote = EtagMemoryFileSystem()
+    remote.pipe(memory_path, b"a,b\n1,2\n")
+    cached = CachedFileSystem(remote, cache, info_ttl=0)
+
+    assert read(cached, memory_path) == b"a,b\n1,2\n"
+    assert read(cached, memory_path) == b"a,b\n1,2\n"
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_changed_etag_invalidates(cache, memory_path):
+    remote = EtagMemoryFileSystem()
+    remote.pipe(memory_path, b"alt")
+    cached = CachedFileSystem(remote, cache, info_ttl=0)
+    read(cached, memory_path)
+
+    remote.pipe(memory_path, b"neu")  # Änderung durch einen anderen Prozess
+    assert read(cached, memory_path) == b"neu"
+    assert (cache.misses, cache.hits) == (2, 0)
+    assert cache.stats()["entries"] == 1
+
+
+def test_changed_mtime_invalidates_on_local_fs(cache, tmp_path):
+    path = str(tmp_path / "remote" / "data.csv")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(b"alt")
+    os.utime(path, (1_000_000, 1_000_000))
+    cached = CachedFileSystem(fsspec.filesystem("file"), cache, info_ttl=0)
+
+    assert read(cached, path) == b"alt"
+    assert read(cached, path) == b"alt"
+    with open(path, "wb") as f:
+        f.write(b"neu")  # gleiche Grösse, nur die Änderungszeit unterscheidet sich
+    os.utime(path, (2_000_000, 2_000_000))
+
+    assert read(cached, path) == b"neu"
+    assert (cache.misses, cache.hits) == (2, 1)
+
+
+def test_info_ttl_hides_foreign_writes_until_expired(cache, memory_path):
+    remote = EtagMemoryFileSystem()
+    remote.pipe(memory_path, b"alt")
+    cached = CachedFileSystem(remote, cache, info_ttl=60)
+    read(cached, memory_path)
+
+    remote.pipe(memory_path, b"neu")
+    assert read(cached, memory_path) == b"alt"
+    cached.invalidate_info(memory_path)
+    assert read(cached, memory_path) == b"neu"
+
+
+def test_writes_update_cache(cache, memory_path):
+    cached = CachedFileSystem(EtagMemoryFileSystem(), cache, info_ttl=0)
+    with cached.open(memory_path, "wb") as f:
+        f.write(b"geschrieben")
+
+    assert read(cached, memory_path) == b"geschrieben"
+    assert (cache.misses, cache.hits) == (0, 1)
+
+    cached.rm(memory_path)
+    assert not cached.exists(memory_path)
+    assert cache.stats()["entries"] == 0
+
+
+def test_index_survives_restart(tmp_path, memory_path):
+    remote = EtagMemoryFileSystem()
+    remote.pipe(memory_path, b"inhalt")
+    cache = DiskCache(str(tmp_path / "cache"), index_flush_interval=3600)
+    read(CachedFileSystem(remote, cache, info_ttl=0), memory_path)
+    cache.flush()
+
+    restarted = DiskCache(str(tmp_path / "cache"))
+    assert read(CachedFileSystem(remote, restarted, info_ttl=0), memory_path) == b"inhalt"
+    assert (restarted.misses, restarted.hits) == (0, 1)
+
+
+def test_eviction_keeps_size_below_limit(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=10)
+    cache.put("a", "v1", b"123456")
+    cache.put("b", "v1", b"123456")
+
+    assert cache.get("a", "v1") is None
+    assert cache.get("b", "v1") == b"123456"
+    assert cache.size <= 10
+
+
+def test_orphans_of_other_processes_survive_start(tmp_path):
+    cache_dir = tmp_path / "cache"
+    other = DiskCache(str(cache_dir), index_flush_interval=3600)
+    other.put("a", "v1", b"fremd")
+    old = cache_dir / "verwaist"
+    old.write_bytes(b"alt")
+    os.utime(old, (0, 0))
+
+    # Der zweite Prozess kennt den noch nicht geschriebenen Index des ersten nicht
+    DiskCache(str(cache_dir))
+    assert other.get("a", "v1") == b"fremd"
+    assert not old.exists()
+
+
+def test_missing_blob_is_a_miss(cache):
+    cache.put("a", "v1", b"inhalt")
+    for name in os.listdir(cache.cache_dir):
+        if name != DiskCache.INDEX_FILE:
+            os.remove(os.path.join(cache.cache_dir, name))
+
+    assert cache.get("a", "v1") is None
+    assert cache.stats()["entries"] == 0
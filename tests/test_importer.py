@@ -0,0 +1,61 @@
+import io
+import pandas as pd
+import pytest
+from utils.importer import read_export
+
+LIBRE = """Glukosedaten,Erstellt am,15-01-2026 10:00 UTC,Erstellt von,Test
+Gerät,Seriennummer,Gerätezeitstempel,Aufzeichnungstyp,Glukosewert-Verlauf mg/dL,Glukose-Scan mg/dL
+FreeStyle LibreLink,ABC,14-01-2026 08:00,0,110,
+FreeStyle LibreLink,ABC,14-01-2026 08:15,1,,125
+FreeStyle LibreLink,ABC,14-01-2026 08:15,1,,125
+FreeStyle LibreLink,ABC,14-01-2026 08:30,6,,
+FreeStyle LibreLink,ABC,14-01-2026 08:45,0,98,
+"""
+
+DEXCOM_MMOL = """Index,Timestamp (YYYY-MM-DDThh:mm:ss),Event Type,Glucose Value (mmol/L)
+1,2026-01-14T08:00:00,EGV,"5,5"
+2,2026-01-14T08:05:00,EGV,"7,0"
+"""
+
+
+def upload(text):
+    return io.BytesIO(text.encode("utf-8"))
+
+
+def test_libre_export_is_converted_and_deduplicated():
+    name, blocks = read_export(upload(LIBRE), chunksize=2)
+    imported = pd.concat(list(blocks), ignore_index=True)
+
+    assert name == "FreeStyle Libre"
+    assert imported["datum_zeit"].tolist() == list(pd.to_datetime(["2026-01-14 08:00", "2026-01-14 08:15",
+                                                                   "2026-01-14 08:45"]))
+    assert imported["blutzuckerwert"].tolist() == [110, 125, 98]
+    assert (imported["zeitpunkt"] == "Sensor").all()
+    assert str(imported["blutzuckerwert"].dtype) == "int16"
+
+
+def test_existing_records_are_skipped():
+    existing = pd.DataFrame({"datum_zeit": pd.to_datetime(["2026-01-14 08:00"]), "zeitpunkt": ["Sensor"]})
+    _, blocks = read_export(upload(LIBRE), existing_keys=existing)
+
+    assert pd.concat(list(blocks))["blutzuckerwert"].tolist() == [125, 98]
+
+
+def test_mmol_values_are_converted_to_mgdl():
+    name, blocks = read_export(upload(DEXCOM_MMOL))
+
+    assert name == "Dexcom"
+    assert pd.concat(list(blocks))["blutzuckerwert"].tolist() == [99, 126]
+
+
+def test_progress_is_reported_per_block():
+    progress = []
+    _, blocks = read_export(upload(LIBRE), chunksize=2, progress_callback=progress.append)
+    list(blocks)
+
+    assert progress == sorted(progress) and progress[-1] == 1.0
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="Unbekanntes Exportformat"):
+        read_export(upload("a,b,c\n1,2,3\n"))
@@ -0,0 +1,58 @@
+import uuid
+import pandas as pd
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from utils.data_handler import DataHandler
+from utils.partitioned_store import PartitionedStore
+
+
+@pytest.fixture
+def store():
+    handler = DataHandler(MemoryFileSystem(), f"/test-{uuid.uuid4().hex}")
+    return PartitionedStore(handler, "user_data_a/data")
+
+
+def records(*zeitpunkte, wert=100):
+    return pd.DataFrame({"datum_zeit": pd.to_datetime(list(zeitpunkte), format="ISO8601"),
+                         "blutzuckerwert": [wert + i for i in range(len(zeitpunkte))]})
+
+
+def test_append_writes_one_partition_per_month(store):
+    store.append(records("2026-01-05", "2026-01-20", "2026-02-03", "2026-03-31 23:00"))
+
+    index = store.load_index()
+    assert sorted(index) == ["2026-01", "2026-02", "2026-03"]
+    assert [index[key]["rows"] for key in sorted(index)] == [2, 1, 1]
+    assert store.earliest() == pd.Timestamp("2026-01-05")
+
+
+def test_load_reads_whole_months_of_the_window(store):
+    store.append(records("2026-01-05", "2026-02-03", "2026-02-25", "2026-03-10"))
+
+    loaded = store.load(pd.Timestamp("2026-02-20"), pd.Timestamp("2026-02-21"))
+    assert loaded["datum_zeit"].tolist() == list(pd.to_datetime(["2026-02-03", "2026-02-25"]))
+    assert store.partitions(start=pd.Timestamp("2026-03-01")) == ["2026-03"]
+    assert store.load(pd.Timestamp("2027-01-01"), initial_value="leer") == "leer"
+
+
+def test_append_is_idempotent(store):
+    frame = records("2026-01-05", "2026-02-03")
+    store.append(frame, append_id="auftrag-1")
+    store.append(frame, append_id="auftrag-1")
+    # Ohne vermerkte ID verhindert der Schlüssel doppelte Datensätze
+    store.append(frame, append_id="auftrag-2", key=["datum_zeit"])
+
+    assert len(store.load()) == 2
+    assert sum(entry["rows"] for entry in store.load_index().values()) == 2
+
+
+def test_write_replaces_only_the_months_it_covers(store):
+    store.append(records("2026-01-05", "2026-02-03", "2026-02-25"))
+    version = store.version()
+
+    store.write(records("2026-02-10", wert=200))
+
+    assert store.version() != version
+    loaded = store.load()
+    assert loaded["blutzuckerwert"].tolist() == [100, 200]
+    assert store.load_index()["2026-02"]["rows"] == 1
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+from utils.schema import GLUCOSE_SCHEMA, get_schema, schema_for_file
+
+
+def eingabe(**spalten):
+    frame = {"datum_zeit": ["2026-01-14 08:00", "2026-01-14 12:30"],
+             "blutzuckerwert": ["110", "142.6"],
+             "zeitpunkt": ["Nüchtern", "Nach dem Essen"]}
+    frame.update(spalten)
+    return pd.DataFrame(frame)
+
+
+def test_coerce_to_compact_types():
+    result = GLUCOSE_SCHEMA.coerce(eingabe())
+
+    assert GLUCOSE_SCHEMA.matches(result)
+    assert result["blutzuckerwert"].tolist() == [110, 143]
+    assert str(result["zeitpunkt"].dtype) == "category"
+
+
+@pytest.mark.parametrize("spalte, werte", [
+    ("blutzuckerwert", ["110", "abc"]),
+    ("blutzuckerwert", ["110", "1600"]),
+    ("datum_zeit", ["2026-01-14 08:00", "gestern"]),
+    ("zeitpunkt", ["Nüchtern", "Mitternacht"]),
+])
+def test_invalid_values_are_rejected(spalte, werte):
+    with pytest.raises(ValueError, match=spalte):
+        GLUCOSE_SCHEMA.coerce(eingabe(**{spalte: werte}))
+
+
+def test_blank_values_drop_the_row_instead_of_failing(caplog):
+    result = GLUCOSE_SCHEMA.coerce(eingabe(blutzuckerwert=["110", " "]))
+
+    assert result["blutzuckerwert"].tolist() == [110]
+    assert str(result["blutzuckerwert"].dtype) == "int16"
+    assert "1 Zeilen ohne Wert" in caplog.text
+
+
+def test_unknown_categories_are_kept_when_not_strict():
+    result = GLUCOSE_SCHEMA.coerce(eingabe(zeitpunkt=["Nüchtern", "Vor dem Sport"]), strict=False)
+    assert result["zeitpunkt"].tolist() == ["Nüchtern", "Vor dem Sport"]
+
+
+def test_merge_prefers_local_records():
+    remote = GLUCOSE_SCHEMA.coerce(eingabe())
+    local = GLUCOSE_SCHEMA.coerce(eingabe(blutzuckerwert=["120", "150"], datum_zeit=["2026-01-14 08:00",
+                                                                                      "2026-01-15 08:00"]))
+    merged = GLUCOSE_SCHEMA.merge(remote, local)
+
+    assert merged["blutzuckerwert"].tolist() == [120, 150, 143]
+
+
+def test_schema_registry():
+    assert schema_for_file("user_data_a/data.parquet") == "glucose"
+    assert schema_for_file("user_data_a/data/") == "glucose"
+    assert schema_for_file("settings.json") is None
+    assert get_schema("glucose") is GLUCOSE_SCHEMA
+    with pytest.raises(ValueError):
+        get_schema("unbekannt")
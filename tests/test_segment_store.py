@@ -0,0 +1,68 @@
+import uuid
+import pandas as pd
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from utils.data_handler import DataHandler
+from utils.segment_store import SegmentStore
+
+
+@pytest.fixture
+def handler():
+    return DataHandler(MemoryFileSystem(), f"/test-{uuid.uuid4().hex}")
+
+
+def records(start, n):
+    return pd.DataFrame({"datum_zeit": pd.date_range("2026-01-01", periods=n, freq="h") + pd.Timedelta(hours=start),
+                         "blutzuckerwert": range(100 + start, 100 + start + n)})
+
+
+def test_appends_are_segments_merged_on_load(handler):
+    store = SegmentStore(handler, "user_data_a/data.csv")
+    handler.save("user_data_a/data.csv", records(0, 3))
+    versions = {store.version()}
+    for start in (3, 5):
+        store.append(records(start, 2))
+        versions.add(store.version())
+
+    assert len(handler.list_files(store.segment_dir)) == 2
+    assert len(versions) == 3
+    loaded = store.load(parse_dates=["datum_zeit"])
+    assert loaded["blutzuckerwert"].tolist() == list(range(100, 107))
+
+
+def test_compact_folds_segments_into_base(handler):
+    store = SegmentStore(handler, "user_data_a/data.csv", max_segments=2)
+    store.append(records(0, 2))
+    assert not store.needs_compaction()
+    store.append(records(2, 2))
+    assert store.needs_compaction()
+
+    assert store.compact(parse_dates=["datum_zeit"])
+    assert handler.list_files(store.segment_dir) == {}
+    assert handler.load("user_data_a/data.csv")["blutzuckerwert"].tolist() == list(range(100, 104))
+
+
+def test_interrupted_compaction_does_not_duplicate(handler, monkeypatch):
+    store = SegmentStore(handler, "user_data_a/data.csv")
+    store.append(records(0, 2))
+    store.append(records(2, 2))
+
+    # Absturz nach dem Schreiben der Basisdatei, bevor Segmente und Manifest gelöscht sind
+    with monkeypatch.context() as patch:
+        patch.setattr(store, "_remove", lambda paths: None)
+        assert store.compact(parse_dates=["datum_zeit"])
+    assert len(store.load()) == 4
+
+    # Die nächste Kompaktierung räumt die übrig gebliebenen Dateien auf
+    assert not store.compact()
+    assert handler.list_files(store.segment_dir) == {}
+    assert len(store.load()) == 4
+
+
+def test_replace_discards_segments(handler):
+    store = SegmentStore(handler, "user_data_a/data.csv")
+    store.append(records(0, 2))
+    store.replace(records(10, 1))
+
+    assert handler.list_files(store.segment_dir) == {}
+    assert store.load()["blutzuckerwert"].tolist() == [110]
@@ -0,0 +1,59 @@
+import pandas as pd
+from utils.shared_cache import SharedDataCache
+
+DATEI = ("/app", "user_data_a/data.parquet")
+
+
+def werte(n):
+    return pd.DataFrame({"blutzuckerwert": range(n)})
+
+
+def test_sessions_share_the_same_snapshot():
+    cache = SharedDataCache()
+    snapshot = werte(10)
+    cache.put(DATEI, None, snapshot, version=1)
+
+    version, value = cache.get(DATEI)
+    assert version == 1 and value is snapshot
+    assert cache.get(("/app", "user_data_b/data.parquet")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_publish_outdates_other_variants():
+    cache = SharedDataCache()
+    cache.put(DATEI, "30D", werte(3), version=1)
+    cache.put(DATEI, None, werte(10), version=2)
+
+    cache.publish(DATEI, None, werte(11), version=3)
+    assert cache.file_version(DATEI) == 3
+    assert cache.get(DATEI, "30D") is None
+    assert len(cache.get(DATEI)[1]) == 11
+
+
+def test_stale_load_is_not_cached():
+    cache = SharedDataCache()
+    cache.publish(DATEI, None, werte(11), version=5)
+    # Ein vor dem Schreibvorgang begonnener Ladevorgang darf den neuen Stand nicht verdrängen
+    cache.put(DATEI, None, werte(10), version=4)
+
+    assert cache.get(DATEI)[0] == 5
+
+
+def test_eviction_keeps_size_below_limit():
+    gross = werte(10_000)
+    cache = SharedDataCache(max_bytes=int(gross.memory_usage(deep=True).sum() * 1.5))
+    cache.put(("/app", "a"), None, gross, version=1)
+    cache.put(("/app", "b"), None, werte(10_000), version=2)
+
+    assert cache.get(("/app", "a")) is None
+    assert cache.get(("/app", "b")) is not None
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_invalidate_removes_all_variants():
+    cache = SharedDataCache()
+    cache.put(DATEI, None, werte(3), version=1)
+    cache.put(DATEI, "30D", werte(2), version=1)
+    cache.invalidate(DATEI)
+
+    assert cache.stats()["entries"] == []
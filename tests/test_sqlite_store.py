@@ -0,0 +1,93 @@
+import threading
+import uuid
+import pandas as pd
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from utils.data_handler import DataHandler
+from utils.credential_store import CredentialConflictError
+from utils.sqlite_store import SqliteCredentialStore, SqliteDatabase, migrate_to_sqlite
+
+
+def werte(start, n, freq="D"):
+    return pd.DataFrame({"datum_zeit": pd.date_range(start, periods=n, freq=freq),
+                         "blutzuckerwert": range(100, 100 + n),
+                         "zeitpunkt": "Nüchtern"})
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = SqliteDatabase(str(tmp_path / "app.db"))
+    yield database
+    database.close()
+
+
+def test_write_replaces_whole_months(database):
+    store = database.table("data", "anna")
+    store.write(werte("2026-01-01", 59))
+    store.write(werte("2026-01-10", 3))
+
+    result = store.load()
+    assert len(result) == 3 + 28  # Januar neu, Februar unverändert
+    assert store.load_index()["2026-02"]["rows"] == 28
+    assert database.table("data", "ben").load() is None
+
+
+def test_time_window_reads_whole_months(database):
+    store = database.table("data", "anna")
+    store.write(werte("2026-01-01", 90))
+
+    result = store.load(start="2026-02-20", end="2026-02-21")
+    assert result["datum_zeit"].min() == pd.Timestamp("2026-02-01")
+    assert result["datum_zeit"].max() == pd.Timestamp("2026-02-28")
+    assert store.earliest() == pd.Timestamp("2026-01-01")
+
+
+def test_append_is_idempotent_per_append_id(database):
+    store = database.table("data", "anna")
+    store.append(werte("2026-01-01", 2), append_id="auftrag-1")
+    version = store.version()
+    store.append(werte("2026-01-01", 2), append_id="auftrag-1")
+
+    assert len(store.load()) == 2
+    assert store.version() == version
+    assert store.bulk_insert(iter([werte("2026-03-01", 5), None, werte("2026-04-01", 5)])) == 10
+    assert store.version() != version
+
+
+def test_thread_connections_are_closed(database):
+    offen = len(database._connections)
+
+    def lesen():
+        database.table("data", "anna").load()
+
+    thread = threading.Thread(target=lesen)
+    thread.start()
+    thread.join()
+    del thread
+
+    assert len(database._connections) == offen
+    database.close()
+    assert len(database._connections) == 0
+
+
+def test_credentials(database):
+    store = SqliteCredentialStore(database)
+    store.save_user("anna", {"email": "anna@example.ch", "password": "$2b$12$hash"}, create=True)
+
+    with pytest.raises(CredentialConflictError):
+        store.save_user("anna", {"email": "andere@example.ch"}, create=True)
+    assert store.load_index() == {"anna": {"email": "anna@example.ch"}}
+    assert store.load_user("ben") is None
+
+
+def test_migration_from_files(database):
+    handler = DataHandler(MemoryFileSystem(), f"/test-{uuid.uuid4().hex}")
+    handler.save("user_data_anna/data.csv", werte("2026-01-01", 25))
+    handler.save("credentials.yaml",
+                 {"usernames": {"anna": {"email": "anna@example.ch", "password": "$2b$12$hash"}}})
+
+    assert migrate_to_sqlite(handler, database, file_name="data.csv", chunksize=10) == \
+        {"benutzer": 1, "datensaetze": 25, "anmeldedaten": 1}
+    assert database.table("data", "anna").load(schema="glucose")["blutzuckerwert"].tolist() == list(range(100, 125))
+    # Ein zweiter Lauf übernimmt nichts doppelt
+    assert migrate_to_sqlite(handler, database, file_name="data.csv")["benutzer"] == 0
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils.statistics import GlucoseStatistics, ALLE
+
+
+def records(n, seed=0, mittelwert=130.0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "datum_zeit": pd.Timestamp("2026-01-01") + pd.to_timedelta(np.arange(n) * 3, unit="h"),
+        "blutzuckerwert": rng.normal(mittelwert, 30, n).round(),
+        "zeitpunkt": rng.choice(["Nüchtern", "Nach dem Essen"], n),
+    })
+
+
+def assert_same(stats, other):
+    assert stats.groups.keys() == other.groups.keys()
+    for key, acc in stats.groups.items():
+        assert acc == pytest.approx(other.groups[key]), key
+
+
+def test_update_merge_and_from_frame_agree():
+    data = records(500)
+    full = GlucoseStatistics.from_frame(data)
+
+    incremental = GlucoseStatistics()
+    for record in data.to_dict("records"):
+        incremental.update(record)
+    merged = GlucoseStatistics()
+    for start in range(0, len(data), 120):
+        merged.merge(GlucoseStatistics.from_frame(data.iloc[start:start + 120]))
+
+    assert_same(incremental, full)
+    assert_same(merged, full)
+    assert full.rows == merged.rows == 500
+    assert full.watermark == data["datum_zeit"].max()
+
+
+def test_summary_matches_pandas():
+    data = records(200)
+    summary = GlucoseStatistics.from_frame(data).summary()
+    werte = data["blutzuckerwert"]
+
+    assert summary["anzahl"] == 200
+    assert summary["mittelwert"] == pytest.approx(werte.mean())
+    assert summary["standardabweichung"] == pytest.approx(werte.std())
+    assert summary["zeit_im_zielbereich"] == pytest.approx(GlucoseStatistics.in_target_range(werte).mean())
+    assert summary["hba1c"] == pytest.approx((werte.mean() + 46.7) / 28.7)
+
+
+def test_standard_deviation_stays_accurate_for_large_values():
+    # Mit einer Quadratsumme der Rohwerte ginge die Streuung hier in der Rundung unter
+    data = records(1000, mittelwert=1e8)
+    stats = GlucoseStatistics()
+    for record in data.to_dict("records"):
+        stats.update(record)
+
+    assert stats.summary()["standardabweichung"] == pytest.approx(data["blutzuckerwert"].std(), rel=1e-6)
+
+
+def test_retention_keeps_the_newest_periods():
+    data = records(24 * 8)  # 8 Werte pro Tag über 24 Tage
+    stats = GlucoseStatistics(retention={"tag": 5, "woche": 2})
+    for record in data.to_dict("records"):
+        stats.update(record)
+
+    full = GlucoseStatistics.from_frame(data)
+    assert stats.periods("tag") == full.periods("tag")[-5:]
+    assert stats.periods("woche") == full.periods("woche")[-2:]
+    assert stats.summary() == pytest.approx(full.summary())
+
+
+def test_round_trip_and_outdated_format():
+    stats = GlucoseStatistics.from_frame(records(50))
+    restored = GlucoseStatistics.from_dict(stats.to_dict())
+
+    assert restored.summary("gesamt", "", ALLE) == stats.summary("gesamt", "", ALLE)
+    assert restored.watermark == stats.watermark
+    assert GlucoseStatistics.from_dict({"rows": 1, "groups": {}}) is None
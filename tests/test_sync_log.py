@@ -0,0 +1,121 @@
+import os
+import json
+import uuid
+import threading
+import pandas as pd
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from utils.data_handler import DataHandler
+from utils.sync_log import SyncLog, is_retryable
+
+
+class FlakyFileSystem:
+    """
+    Hülle um ein Dateisystem, bei der die ersten ``failures`` Schreibzugriffe mit einem
+    Verbindungsfehler scheitern.
+    """
+
+    def __init__(self, filesystem, failures):
+        self.filesystem = filesystem
+        self.failures = failures
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.filesystem, name)
+
+    def open(self, path, mode="rb", **kwargs):
+        if "w" in mode:
+            with self._lock:
+                self.calls += 1
+                if self.calls <= self.failures:
+                    raise ConnectionError(f"Verbindung abgebrochen: {path}")
+        return self.filesystem.open(path, mode, **kwargs)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def offline(entry, content):
+    raise ConnectionError("Server nicht erreichbar")
+
+
+def records(n):
+    return pd.DataFrame({"datum_zeit": pd.date_range("2026-01-01", periods=n, freq="h"),
+                         "blutzuckerwert": range(100, 100 + n)})
+
+
+def test_replay_after_crash(tmp_path):
+    directory = str(tmp_path / "wal")
+    log = SyncLog(directory, offline, retry_initial=3600)
+    log.append("save", "user_data_a/data.parquet", records(3))
+    log.append("save", "user_data_a/settings.json", {"ziel": 120})
+    # Abgebrochene Aufträge: temporäre Datei und Nutzdaten ohne Eintrag
+    open(os.path.join(directory, "x.json.tmp"), "w").close()
+    open(os.path.join(directory, "00000000000000000001_abc.parquet"), "w").close()
+
+    applied = []
+    # Absturz: das Log wird ohne Synchronisation aufgegeben und neu geöffnet
+    recovered = SyncLog(directory, lambda entry, content: applied.append((entry["target"], content)))
+    assert recovered.flush(timeout=10)
+
+    assert [target for target, _ in applied] == ["user_data_a/data.parquet", "user_data_a/settings.json"]
+    pd.testing.assert_frame_equal(applied[0][1], records(3))
+    assert applied[1][1] == {"ziel": 120}
+    assert os.listdir(directory) == []
+
+
+def test_flaky_filesystem_retries_in_order(tmp_path):
+    flaky = FlakyFileSystem(MemoryFileSystem(), failures=3)
+    handler = DataHandler(flaky, f"/test-{uuid.uuid4().hex}")
+    log = SyncLog(str(tmp_path / "wal"), lambda entry, content: handler.save(entry["target"], content),
+                  retry_initial=0.01, retry_max=0.05)
+
+    for value in (1, 2, 3):
+        log.append("save", "zaehler.json", {"wert": value})
+    log.append("save", "data.parquet", records(5))
+
+    # ``flush`` kehrt nach jedem gescheiterten Versuch zurück
+    assert any(log.flush(timeout=10) for _ in range(flaky.failures + 1))
+    assert flaky.calls > flaky.failures
+    assert log.failures == 0
+    assert handler.load("zaehler.json") == {"wert": 3}
+    pd.testing.assert_frame_equal(handler.load("data.parquet"), records(5))
+
+
+def test_permanent_error_is_dead_lettered(tmp_path):
+    directory = str(tmp_path / "wal")
+    applied = []
+
+    def apply(entry, content):
+        if entry["target"] == "kaputt.parquet":
+            raise ValueError("ungültige Daten")
+        applied.append(entry["target"])
+
+    log = SyncLog(directory, apply, retry_initial=3600)
+    log.append("save", "kaputt.parquet", records(2))
+    log.append("save", "gut.json", {"ok": True})
+    assert log.flush(timeout=10)
+
+    assert applied == ["gut.json"]
+    dead = sorted(os.listdir(os.path.join(directory, SyncLog.DEAD_LETTER_DIR)))
+    assert [os.path.splitext(name)[1] for name in dead] == [".json", ".parquet"]
+    with open(os.path.join(directory, SyncLog.DEAD_LETTER_DIR, dead[0]), encoding="utf-8") as f:
+        assert "ungültige Daten" in json.load(f)["error"]
+    # Ein neu geöffnetes Log nimmt Einträge aus ``dead/`` nicht wieder auf
+    assert SyncLog(directory, apply).pending() == []
+
+
+@pytest.mark.parametrize("error, expected", [
+    (ConnectionError(), True),
+    (TimeoutError(), True),
+    (StatusError(503), True),
+    (StatusError(429), True),
+    (StatusError(404), False),
+    (ValueError(), False),
+])
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
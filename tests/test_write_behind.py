@@ -0,0 +1,62 @@
+import time
+import threading
+from utils import write_behind
+from utils.write_behind import WriteBehindQueue
+
+
+def test_newer_job_replaces_queued_one():
+    queue = WriteBehindQueue(flush_interval=3600)
+    saved = []
+    for value in (1, 2, 3):
+        queue.submit("data.csv", lambda value=value: saved.append(value))
+
+    assert queue.pending == ["data.csv"]
+    assert queue.flush(timeout=10)
+    assert saved == [3]
+    assert not queue.has_pending
+
+
+def test_failed_job_is_kept_and_retried():
+    queue = WriteBehindQueue(flush_interval=3600)
+    saved, offline = [], [True]
+
+    def job():
+        if offline[0]:
+            raise ConnectionError("Server nicht erreichbar")
+        saved.append("segment")
+
+    queue.submit("data.csv#1", job)
+    assert not queue.flush(timeout=10)
+    assert isinstance(queue.errors["data.csv#1"], ConnectionError)
+
+    offline[0] = False
+    assert queue.flush(timeout=10)
+    assert saved == ["segment"]
+    assert queue.errors == {}
+
+
+def test_newer_job_supersedes_failed_one():
+    queue = WriteBehindQueue(flush_interval=3600)
+    saved = []
+    queue.submit("data.csv", lambda: 1 / 0)
+    assert not queue.flush(timeout=10)
+
+    queue.submit("data.csv", lambda: saved.append("neu"))
+    assert queue.errors == {}
+    assert queue.flush(timeout=10)
+    assert queue.retry() == 0
+    assert saved == ["neu"]
+
+
+def test_exit_flush_is_bounded(monkeypatch):
+    monkeypatch.setattr(write_behind, "EXIT_FLUSH_TIMEOUT", 0.2)
+    release = threading.Event()
+    queue = WriteBehindQueue(flush_interval=3600)
+    queue.submit("data.csv", release.wait)
+
+    started = time.monotonic()
+    write_behind._flush_all()
+    assert time.monotonic() - started < 5
+    assert queue.has_pending
+    release.set()
+    assert queue.flush(timeout=10)
@@ -0,0 +1,408 @@
+from collections import deque
+import pandas as pd
+
+MAX_ALERTS = 200  # so viele Warnungen werden im Sidecar aufbewahrt
+
+
+def _matches(rule, value, zeitpunkt):
+    if rule.zeitpunkt is not None and zeitpunkt != rule.zeitpunkt:
+        return False
+    return (rule.below is not None and value < rule.below) or (rule.above is not None and value > rule.above)
+
+
+def _matches_frame(rule, frame):
+    mask = pd.Series(False, index=frame.index)
+    if rule.below is not None:
+        mask |= frame["wert"] < rule.below
+    if rule.above is not None:
+        mask |= frame["wert"] > rule.above
+    if rule.zeitpunkt is not None:
+        mask &= frame["zeitpunkt"] == rule.zeitpunkt
+    return mask
+
+
+def _limits(rule):
+    parts = []
+    if rule.below is not None:
+        parts.append(f"unter {rule.below:g} mg/dL")
+    if rule.above is not None:
+        parts.append(f"über {rule.above:g} mg/dL")
+    text = " oder ".join(parts)
+    return f"{text} ({rule.zeitpunkt})" if rule.zeitpunkt is not None else text
+
+
+class ThresholdRule:
+    """
+    Warnt bei jedem einzelnen Wert unter ``below`` bzw. über ``above`` mg/dL.
+    """
+
+    kind = "threshold"
+
+    def __init__(self, name, below=None, above=None, zeitpunkt=None):
+        """
+        Args:
+            name: Eindeutiger Name der Regel.
+            below: Untere Grenze, None für keine.
+            above: Obere Grenze, None für keine.
+            zeitpunkt: Nur Werte mit diesem Messzeitpunkt prüfen, None für alle.
+        """
+        self.name = name
+        self.below = below
+        self.above = above
+        self.zeitpunkt = zeitpunkt
+
+    def to_dict(self):
+        return {"kind": self.kind, "name": self.name, "below": self.below, "above": self.above,
+                "zeitpunkt": self.zeitpunkt}
+
+    def initial_state(self):
+        return None
+
+    def evaluate(self, state, timestamp, value, zeitpunkt):
+        """
+        Returns:
+            tuple: (neuer Zustand, Meldung oder None).
+        """
+        if _matches(self, value, zeitpunkt):
+            return state, f"Blutzucker {value:g} mg/dL {_limits(self)}"
+        return state, None
+
+    def backfill(self, frame):
+        """
+        Wertet die Regel vektorisiert über eine nach Zeit sortierte Historie aus.
+
+        Returns:
+            tuple: (Zustand nach dem letzten Wert, Series mit der Meldung je auslösender Zeile).
+        """
+        fired = frame[_matches_frame(self, frame)]
+        messages = ("Blutzucker " + fired["wert"].map("{:g}".format).astype(object)
+                    + f" mg/dL {_limits(self)}")
+        return None, messages
+
+
+class CountRule:
+    """
+    Warnt, sobald mindestens ``count`` Werte ausserhalb der Grenzen innerhalb von ``window``
+    liegen, z. B. drei Werte über 180 mg/dL nach dem Essen innerhalb von sieben Tagen.
+
+    Der Zustand enthält nur die Zeitpunkte der letzten ``count`` Treffer; ein neuer Wert
+    wird damit in O(1) geprüft.
+    """
+
+    kind = "count"
+
+    def __init__(self, name, count, window, below=None, above=None, zeitpunkt=None):
+        """
+        Args:
+            name: Eindeutiger Name der Regel.
+            count: Anzahl Treffer, ab der gewarnt wird.
+            window: Länge des gleitenden Fensters, z. B. "7D".
+            below: Untere Grenze, None für keine.
+            above: Obere Grenze, None für keine.
+            zeitpunkt: Nur Werte mit diesem Messzeitpunkt zählen, None für alle.
+        """
+        self.name = name
+        self.count = count
+        self.window = pd.Timedelta(window)
+        self.below = below
+        self.above = above
+        self.zeitpunkt = zeitpunkt
+
+    def to_dict(self):
+        return {"kind": self.kind, "name": self.name, "count": self.count, "window": str(self.window),
+                "below": self.below, "above": self.above, "zeitpunkt": self.zeitpunkt}
+
+    def initial_state(self):
+        return deque(maxlen=self.count)
+
+    def _message(self):
+        return f"{self.count} Werte {_limits(self)} innerhalb von {self.window.days or self.window} Tagen"
+
+    def evaluate(self, state, timestamp, value, zeitpunkt):
+        while state and state[0] <= timestamp - self.window:
+            state.popleft()
+        if not _matches(self, value, zeitpunkt):
+            return state, None
+        state.append(timestamp)
+        return state, self._message() if len(state) >= self.count else None
+
+    def backfill(self, frame):
+        mask = _matches_frame(self, frame)
+        hits = pd.Series(mask.to_numpy(dtype=float), index=frame["datum_zeit"].to_numpy())
+        # Fenster (t - window, t] wie bei der laufenden Auswertung
+        counts = hits.rolling(self.window, closed="right").sum().to_numpy()
+        fired = frame[mask.to_numpy() & (counts >= self.count)]
+        state = self.initial_state()
+        state.extend(frame.loc[mask, "datum_zeit"].iloc[-self.count:])
+        return state, pd.Series(self._message(), index=fired.index, dtype=object)
+
+    def dump_state(self, state):
+        return [timestamp.isoformat() for timestamp in state]
+
+    def load_state(self, data):
+        return deque((pd.Timestamp(timestamp) for timestamp in data or []), maxlen=self.count)
+
+
+class RateOfChangeRule:
+    """
+    Warnt, wenn sich der Wert gegenüber dem vorherigen um mehr als ``max_rate`` mg/dL pro
+    Minute ändert. Werte mit mehr als ``max_gap`` Abstand werden nicht verglichen.
+    """
+
+    kind = "rate"
+
+    def __init__(self, name, max_rate, direction="both", max_gap="30min"):
+        """
+        Args:
+            name: Eindeutiger Name der Regel.
+            max_rate: Erlaubte Änderung in mg/dL pro Minute.
+            direction: "up" (nur Anstieg), "down" (nur Abfall) oder "both".
+            max_gap: Maximaler Abstand zweier verglichener Werte.
+        """
+        if direction not in ("up", "down", "both"):
+            raise ValueError(f"Ungültige Richtung: {direction}")
+        self.name = name
+        self.max_rate = max_rate
+        self.direction = direction
+        self.max_gap = pd.Timedelta(max_gap)
+
+    def to_dict(self):
+        return {"kind": self.kind, "name": self.name, "max_rate": self.max_rate,
+                "direction": self.direction, "max_gap": str(self.max_gap)}
+
+    def initial_state(self):
+        return None
+
+    def _exceeds(self, rate):
+        if self.direction == "up":
+            return rate > self.max_rate
+        if self.direction == "down":
+            return rate < -self.max_rate
+        return abs(rate) > self.max_rate
+
+    def evaluate(self, state, timestamp, value, zeitpunkt):
+        message = None
+        if state is not None:
+            previous_time, previous_value = state
+            gap = timestamp - previous_time
+            if pd.Timedelta(0) < gap <= self.max_gap:
+                rate = (value - previous_value) / (gap / pd.Timedelta(minutes=1))
+                if self._exceeds(rate):
+                    message = f"Änderung um {rate:+.1f} mg/dL pro Minute"
+        return (timestamp, value), message
+
+    def backfill(self, frame):
+        gap = frame["datum_zeit"].diff()
+        rate = frame["wert"].diff() / (gap / pd.Timedelta(minutes=1))
+        valid = (gap > pd.Timedelta(0)) & (gap <= self.max_gap)
+        if self.direction == "up":
+            exceeded = rate > self.max_rate
+        elif self.direction == "down":
+            exceeded = rate < -self.max_rate
+        else:
+            exceeded = rate.abs() > self.max_rate
+        fired = rate[valid & exceeded]
+        messages = "Änderung um " + fired.map("{:+.1f}".format).astype(object) + " mg/dL pro Minute"
+        last = frame.iloc[-1]
+        return (last["datum_zeit"], float(last["wert"])), messages
+
+    def dump_state(self, state):
+        return None if state is None else [state[0].isoformat(), state[1]]
+
+    def load_state(self, data):
+        return None if data is None else (pd.Timestamp(data[0]), data[1])
+
+
+RULE_TYPES = {rule_type.kind: rule_type for rule_type in (ThresholdRule, CountRule, RateOfChangeRule)}
+
+DEFAULT_RULES = [
+    ThresholdRule("Schwere Hypoglykämie", below=54),
+    ThresholdRule("Hypoglykämie", below=70),
+    CountRule("Wiederholte Hyperglykämie nach dem Essen", count=3, window="7D", above=180,
+              zeitpunkt="Nach dem Essen"),
+    RateOfChangeRule("Schnelle Änderung", max_rate=3.0),
+]
+
+
+def rule_from_dict(data):
+    """
+    Stellt eine Regel aus ``to_dict`` wieder her.
+    """
+    params = {key: value for key, value in data.items() if key != "kind"}
+    return RULE_TYPES[data["kind"]](**params)
+
+
+class AlertEngine:
+    """
+    Wertet Warnregeln laufend über neue Blutzuckerwerte aus.
+
+    Pro Regel wird nur der für das gleitende Fenster nötige Zustand gehalten (z. B. die
+    letzten Treffer oder der vorherige Wert), sodass jeder neue Datensatz in amortisiert
+    O(1) geprüft wird. Beim ersten Laden wird die Historie mit ``from_frame`` vektorisiert
+    ausgewertet. Zustand und die letzten Warnungen werden wie die Statistik als Sidecar
+    neben den Daten des Benutzers abgelegt.
+
+    Die laufende Auswertung setzt zeitlich geordnete Werte voraus; ein Wert vor dem zuletzt
+    verarbeiteten wird von ``update`` abgelehnt und erfordert einen Neuaufbau.
+    """
+
+    def __init__(self, rules=None, states=None, rows=0, watermark=None, alerts=None):
+        """
+        Initialisiert die Auswertung.
+
+        Args:
+            rules: Die Warnregeln, standardmässig ``DEFAULT_RULES``.
+            states: Zustand pro Regelname, z. B. aus ``from_dict``.
+            rows: Anzahl der bisher verarbeiteten Datensätze, auch solcher ohne gültigen Wert.
+            watermark: Zeitpunkt des zuletzt verarbeiteten Werts.
+            alerts: Bisherige Warnungen, älteste zuerst.
+        """
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.states = states if states is not None else {rule.name: rule.initial_state() for rule in self.rules}
+        self.rows = rows
+        self.watermark = watermark
+        self.alerts = alerts if alerts is not None else []
+        self.last_alerts = []  # Warnungen des letzten ``update_many``
+
+    @property
+    def rule_config(self):
+        return [rule.to_dict() for rule in self.rules]
+
+    def update(self, record):
+        """
+        Prüft einen neuen Datensatz gegen alle Regeln.
+
+        Args:
+            record: Dictionary mit ``datum_zeit``, ``blutzuckerwert`` und ``zeitpunkt``.
+
+        Returns:
+            list: Die ausgelösten Warnungen, oder None, wenn der Datensatz älter als der
+            zuletzt verarbeitete ist und nicht laufend ausgewertet werden kann.
+        """
+        value = record.get("blutzuckerwert")
+        timestamp = record.get("datum_zeit")
+        if value is None or pd.isna(value) or timestamp is None or pd.isna(timestamp):
+            self.rows += 1
+            return []
+        timestamp = pd.Timestamp(timestamp)
+        if self.watermark is not None and timestamp < self.watermark:
+            return None
+        self.rows += 1
+        self.watermark = timestamp
+        value = float(value)
+        zeitpunkt = record.get("zeitpunkt")
+        fired = []
+        for rule in self.rules:
+            self.states[rule.name], message = rule.evaluate(self.states[rule.name], timestamp, value, zeitpunkt)
+            if message is not None:
+                fired.append({"regel": rule.name, "datum_zeit": timestamp.isoformat(),
+                              "blutzuckerwert": value, "meldung": message})
+        self._keep(fired)
+        return fired
+
+    def update_many(self, records):
+        """
+        Prüft mehrere Datensätze der Reihe nach; die ausgelösten Warnungen stehen danach in
+        ``last_alerts``.
+
+        Returns:
+            bool: False, wenn ein Datensatz nicht laufend ausgewertet werden konnte.
+        """
+        self.last_alerts = []
+        for record in records:
+            fired = self.update(record)
+            if fired is None:
+                return False
+            self.last_alerts += fired
+        return True
+
+    def _keep(self, fired):
+        if fired:
+            self.alerts = (self.alerts + fired)[-MAX_ALERTS:]
+
+    @classmethod
+    def from_frame(cls, data_df, rules=None):
+        """
+        Wertet alle Regeln vektorisiert über eine vollständige Historie aus.
+
+        Args:
+            data_df: DataFrame mit ``datum_zeit``, ``blutzuckerwert`` und ``zeitpunkt``.
+            rules: Die Warnregeln, standardmässig ``DEFAULT_RULES``.
+
+        Returns:
+            AlertEngine: Die Auswertung mit dem Zustand nach dem letzten Wert.
+        """
+        engine = cls(rules)
+        if data_df is None or data_df.empty:
+            return engine
+        engine.rows = len(data_df)
+
+        frame = pd.DataFrame({
+            "datum_zeit": pd.to_datetime(data_df["datum_zeit"]),
+            "wert": pd.to_numeric(data_df["blutzuckerwert"], errors="coerce").astype(float),
+            "zeitpunkt": data_df["zeitpunkt"].astype(object),
+        }).dropna(subset=["wert", "datum_zeit"]).sort_values("datum_zeit", kind="stable")
+        if frame.empty:
+            return engine
+        frame = frame.reset_index(drop=True)
+        engine.watermark = frame["datum_zeit"].iloc[-1]
+
+        fired = []
+        for order, rule in enumerate(engine.rules):
+            engine.states[rule.name], messages = rule.backfill(frame)
+            if len(messages):
+                fired.append(pd.DataFrame({"zeile": messages.index, "reihenfolge": order,
+                                           "regel": rule.name, "meldung": messages.to_numpy()}))
+        if fired:
+            # Wie bei der laufenden Auswertung: nach Zeit, innerhalb eines Werts nach Regel
+            fired = pd.concat(fired).sort_values(["zeile", "reihenfolge"]).tail(MAX_ALERTS)
+            rows = frame.loc[fired["zeile"]]
+            engine.alerts = [
+                {"regel": regel, "datum_zeit": timestamp.isoformat(), "blutzuckerwert": float(value),
+                 "meldung": meldung}
+                for regel, timestamp, value, meldung in zip(
+                    fired["regel"], rows["datum_zeit"], rows["wert"], fired["meldung"])]
+        return engine
+
+    def recent(self, since=None):
+        """
+        Returns:
+            list: Die Warnungen ab ``since`` (alle, wenn None), neueste zuerst.
+        """
+        since = None if since is None else pd.Timestamp(since)
+        return [alert for alert in reversed(self.alerts)
+                if since is None or pd.Timestamp(alert["datum_zeit"]) >= since]
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: Serialisierbare Darstellung für die Ablage als JSON.
+        """
+        states = {}
+        for rule in self.rules:
+            state = self.states[rule.name]
+            states[rule.name] = rule.dump_state(state) if hasattr(rule, "dump_state") else state
+        return {"rules": self.rule_config, "rows": self.rows,
+                "watermark": None if self.watermark is None else self.watermark.isoformat(),
+                "states": states, "alerts": list(self.alerts)}
+
+    @classmethod
+    def from_dict(cls, data, rules=None):
+        """
+        Stellt die Auswertung aus ``to_dict`` wieder her.
+
+        Returns:
+            AlertEngine: Die Auswertung, oder None, wenn sie mit anderen Regeln erstellt wurde.
+        """
+        engine = cls(rules)
+        if data.get("rules") != engine.rule_config:
+            return None
+        for rule in engine.rules:
+            state = data.get("states", {}).get(rule.name)
+            if hasattr(rule, "load_state"):
+                engine.states[rule.name] = rule.load_state(state)
+        engine.rows = data.get("rows", 0)
+        watermark = data.get("watermark")
+        engine.watermark = None if watermark is None else pd.Timestamp(watermark)
+        engine.alerts = data.get("alerts", [])
+        return engine
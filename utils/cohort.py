@@ -0,0 +1,181 @@
+import posixpath
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from utils.file_cache import file_validator
+from utils.partitioned_store import PartitionedStore
+from utils.segment_store import SegmentStore
+from utils.statistics import GlucoseStatistics
+
+logger = logging.getLogger(__name__)
+
+USER_PREFIX = "user_data_"
+
+
+def summarize(data_df):
+    """
+    Berechnet die Kennzahlen eines Benutzers vektorisiert.
+
+    Args:
+        data_df: DataFrame mit den Spalten "datum_zeit" und "blutzuckerwert".
+
+    Returns:
+        dict: Anzahl, Mittelwert, Standardabweichung, Zeit im Zielbereich, Anteil
+        Hypoglykämien, geschätzter HbA1c sowie letzter Messzeitpunkt und letzte
+        Hypoglykämie (ISO-Format oder None).
+    """
+    zeit = pd.to_datetime(data_df["datum_zeit"], errors="coerce")
+    werte = pd.to_numeric(data_df["blutzuckerwert"], errors="coerce").to_numpy(dtype=float)
+    valid = ~np.isnan(werte) & zeit.notna().to_numpy()
+    zeit, werte = zeit[valid], werte[valid]
+    n = len(werte)
+    if n == 0:
+        return {"anzahl": 0}
+
+    hypo = werte < GlucoseStatistics.TARGET_RANGE[0]
+    mean = float(werte.mean())
+    return {
+        "anzahl": n,
+        "mittelwert": mean,
+        "standardabweichung": float(werte.std(ddof=1)) if n > 1 else 0.0,
+        "zeit_im_zielbereich": float(GlucoseStatistics.in_target_range(werte).mean()),
+        "hypo_anteil": float(hypo.mean()),
+        "hba1c": GlucoseStatistics.hba1c(mean),
+        "letzter_wert": zeit.max().isoformat(),
+        "letzte_hypoglykaemie": zeit[hypo].max().isoformat() if hypo.any() else None,
+    }
+
+
+def distribution(report, column="mittelwert", bins=10):
+    """
+    Verteilung einer Kennzahl über alle Benutzer.
+
+    Args:
+        report: Ergebnis von ``CohortAnalytics.run``.
+        column: Die Kennzahl, z. B. "mittelwert" oder "zeit_im_zielbereich".
+        bins: Anzahl Klassen oder Liste der Klassengrenzen.
+
+    Returns:
+        pd.Series: Anzahl Benutzer pro Klasse.
+    """
+    values = report[column].dropna()
+    return pd.cut(values, bins=bins).value_counts(sort=False)
+
+
+def recent_hypoglycemia(report, days=14, now=None):
+    """
+    Benutzer mit mindestens einer Hypoglykämie in den letzten ``days`` Tagen.
+
+    Returns:
+        pd.DataFrame: Die betroffenen Zeilen des Reports, neueste zuerst.
+    """
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    letzte = pd.to_datetime(report["letzte_hypoglykaemie"])
+    recent = report[letzte >= now - pd.Timedelta(days=days)]
+    return recent.sort_values("letzte_hypoglykaemie", ascending=False)
+
+
+class CohortAnalytics:
+    """
+    Auswertungen über die Daten aller Benutzer (``user_data_*``).
+
+    Die Ordner werden mit einem begrenzten Thread-Pool parallel geladen und pro Benutzer
+    vektorisiert zusammengefasst. Die Ergebnisse werden zusammen mit dem Vergleichswert
+    (ETag bzw. Änderungszeit) der Daten in ``cache_path`` abgelegt; ein erneuter Lauf
+    lädt nur die Benutzer, deren Dateien sich seither geändert haben.
+    """
+
+    def __init__(self, data_handler, file_name="data", max_workers=8,
+                 cache_path="cohort/summaries.json"):
+        """
+        Initialisiert die Auswertung.
+
+        Args:
+            data_handler: DataHandler auf dem Root-Verzeichnis der App.
+            file_name: Die Datendatei pro Benutzer; ohne Endung ein partitionierter Ordner.
+                Fehlt sie, werden ``data.parquet`` und ``data.csv`` versucht.
+            max_workers: Maximale Anzahl gleichzeitiger Downloads.
+            cache_path: Relativer Pfad der zwischengespeicherten Ergebnisse.
+        """
+        self.data_handler = data_handler
+        self.file_names = list(dict.fromkeys([file_name, "data.parquet", "data.csv"]))
+        self.max_workers = max_workers
+        self.cache_path = cache_path
+        self.reprocessed = []
+        self.errors = {}
+
+    def user_folders(self):
+        """
+        Returns:
+            list: Die Namen aller ``user_data_*``-Ordner.
+        """
+        return [name for name in self.data_handler.list_dirs("") if name.startswith(USER_PREFIX)]
+
+    def _locate(self, folder):
+        """
+        Returns:
+            tuple: (Store, Vergleichswert) der Datendatei des Benutzers oder (None, None).
+        """
+        for file_name in self.file_names:
+            path = posixpath.join(folder, file_name)
+            if posixpath.splitext(file_name)[-1] == "":
+                store = PartitionedStore(self.data_handler, path)
+                if store.exists():
+                    return store, file_validator(self.data_handler.info(store.index_path))
+            else:
+                store = SegmentStore(self.data_handler, path)
+                segments = sorted(self.data_handler.list_files(store.segment_dir).items())
+                if self.data_handler.exists(path) or segments:
+                    info = self.data_handler.info(path) if self.data_handler.exists(path) else {}
+                    return store, f"{file_validator(info)}|{segments}"
+        return None, None
+
+    def _process(self, folder, cached):
+        store, version = self._locate(folder)
+        if store is None:
+            return None
+        if cached is not None and cached["version"] == version:
+            return cached
+        data_df = store.load(columns=["datum_zeit", "blutzuckerwert"]) \
+            if isinstance(store, PartitionedStore) else store.load()
+        self.reprocessed.append(folder)
+        if data_df is None:
+            data_df = pd.DataFrame(columns=["datum_zeit", "blutzuckerwert"])
+        return {"version": version, "summary": summarize(data_df)}
+
+    def run(self):
+        """
+        Fasst alle Benutzer zusammen; unveränderte Benutzer werden aus dem Cache übernommen.
+
+        Returns:
+            pd.DataFrame: Eine Zeile pro Benutzer (Index: Benutzername) mit den Kennzahlen
+            aus ``summarize``.
+        """
+        cache = self.data_handler.load(self.cache_path, initial_value={})
+        self.reprocessed = []
+        self.errors = {}
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._process, folder, cache.get(folder)): folder
+                       for folder in self.user_folders()}
+            for future in as_completed(futures):
+                folder = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Kohortenauswertung für {folder} fehlgeschlagen: {e}")
+                    self.errors[folder] = e
+                    result = cache.get(folder)
+                if result is not None:
+                    results[folder] = result
+
+        if self.reprocessed or set(results) != set(cache):
+            self.data_handler.save(self.cache_path, results)
+        logger.info(f"Kohorte: {len(results)} Benutzer, {len(self.reprocessed)} neu ausgewertet")
+
+        report = pd.DataFrame.from_dict(
+            {folder[len(USER_PREFIX):]: result["summary"] for folder, result in results.items()},
+            orient="index")
+        report.index.name = "benutzer"
+        return report.sort_index()
@@ -0,0 +1,254 @@
+import time
+import hashlib
+import posixpath
+import logging
+from utils.metrics import METRICS
+from utils.data_handler import MISSING, WriteConflictError
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialConflictError(Exception):
+    """
+    Wird ausgelöst, wenn ein Benutzer gleichzeitig von einer anderen Session angelegt wurde.
+    """
+
+
+class ShardedCredentialStore:
+    """
+    Ablage der Anmeldedaten mit einer Datei pro Benutzer.
+
+    Die Datensätze liegen unter ``<folder>/users/<shard>/<username>.yaml``, wobei der Shard
+    aus dem Hash des Benutzernamens abgeleitet wird. Für eine Anmeldung wird damit nur der
+    eine Datensatz gelesen. Ein kleiner Index (``index.json``) führt Benutzernamen und
+    E-Mail-Adressen für Eindeutigkeitsprüfungen; er kann jederzeit aus den Datensätzen
+    neu aufgebaut werden.
+    """
+
+    INDEX_FILE = "index.json"
+    IMPORT_MARKER = "import.json"
+    IMPORT_TIMEOUT = 300  # Sekunden, nach denen eine abgebrochene Übernahme neu gestartet wird
+
+    def __init__(self, data_handler, folder="credentials"):
+        """
+        Initialisiert den Credential-Store.
+
+        Args:
+            data_handler: Der DataHandler, relativ zu dessen Root die Pfade aufgelöst werden.
+            folder: Der relative Pfad des Credential-Verzeichnisses.
+        """
+        self.data_handler = data_handler
+        self.folder = folder
+        self.index_path = posixpath.join(folder, self.INDEX_FILE)
+
+    def _record_path(self, username):
+        shard = hashlib.sha1(username.encode("utf-8")).hexdigest()[:2]
+        return posixpath.join(self.folder, "users", shard, username + ".yaml")
+
+    def exists(self):
+        """
+        Returns:
+            bool: True, wenn der Store bereits angelegt ist.
+        """
+        return self.data_handler.exists(self.index_path)
+
+    @METRICS.timed("credentials_seconds", op="load_index")
+    def load_index(self):
+        """
+        Returns:
+            dict: Benutzername -> {"email": ...}.
+        """
+        return self.data_handler.load(self.index_path, initial_value={"usernames": {}})["usernames"]
+
+    @METRICS.timed("credentials_seconds", op="load_user")
+    def load_user(self, username):
+        """
+        Lädt den Datensatz eines Benutzers.
+
+        Returns:
+            dict: Der Datensatz oder None, wenn der Benutzer nicht existiert.
+        """
+        path = self._record_path(username)
+        if not self.data_handler.exists(path):
+            return None
+        return self.data_handler.load(path)
+
+    @METRICS.timed("credentials_seconds", op="save_user")
+    def save_user(self, username, record, create=False):
+        """
+        Speichert den Datensatz eines Benutzers und trägt ihn im Index ein.
+
+        Args:
+            username: Der Benutzername.
+            record: Der Datensatz im Format von ``stauth.Authenticate``.
+            create: Bei True darf der Benutzer noch nicht existieren.
+
+        Raises:
+            CredentialConflictError: Wenn ``create`` gesetzt ist und der Benutzer bereits
+                existiert oder gleichzeitig von einer anderen Session angelegt wurde.
+        """
+        path = self._record_path(username)
+        try:
+            self.data_handler.save(path, record, expected_version=MISSING if create else None)
+        except WriteConflictError:
+            raise CredentialConflictError(f"Benutzer {username} existiert bereits")
+        self._add_to_index(username, record)
+
+    def _add_to_index(self, username, record):
+        # Bedingt auf den gelesenen Stand schreiben; bei einem Konflikt wird neu gelesen
+        entry = {"email": record.get("email")}
+        if self.load_index().get(username) == entry:
+            return
+
+        def modify(stored):
+            stored["usernames"][username] = entry
+            return stored
+
+        try:
+            self.data_handler.update(self.index_path, modify, initial_value={"usernames": {}})
+        except WriteConflictError:
+            logger.warning(f"Index-Eintrag für {username} konnte nicht geschrieben werden")
+
+    def rebuild_index(self):
+        """
+        Baut den Index aus allen gespeicherten Datensätzen neu auf.
+        """
+        index = {}
+        users_folder = posixpath.join(self.folder, "users")
+        for shard in self.data_handler.list_dirs(users_folder):
+            for name in self.data_handler.list_files(posixpath.join(users_folder, shard)):
+                username = posixpath.splitext(self.data_handler.split_compression(name)[0])[0]
+                record = self.load_user(username) or {}
+                index[username] = {"email": record.get("email")}
+        self.data_handler.save(self.index_path, {"usernames": index})
+
+    def _claim_import(self):
+        """
+        Legt die Markierung der Übernahme bedingt an bzw. übernimmt eine verwaiste.
+
+        Returns:
+            bool: True, wenn diese Session die Übernahme durchführt.
+        """
+        marker_path = posixpath.join(self.folder, self.IMPORT_MARKER)
+        version = self.data_handler.version(marker_path)
+        if version != MISSING:
+            started = self.data_handler.load(marker_path, initial_value={}).get("started", 0)
+            if time.time() - started < self.IMPORT_TIMEOUT:
+                return False
+        try:
+            self.data_handler.save(marker_path, {"started": time.time()}, expected_version=version)
+            return True
+        except WriteConflictError:
+            return False
+
+    def import_credentials(self, credentials, poll_interval=0.5):
+        """
+        Übernimmt alle Benutzer aus einer bisherigen ``credentials.yaml``.
+
+        Nur eine Session führt die Übernahme durch: sie legt vorher bedingt eine Markierung
+        (``import.json``) an. Gleichzeitig startende Sessions warten, bis der Index
+        geschrieben ist; bleibt er länger als ``IMPORT_TIMEOUT`` aus, übernehmen sie selbst.
+
+        Args:
+            credentials: Der Inhalt der Datei ({"usernames": {...}}).
+            poll_interval: Sekunden zwischen zwei Prüfungen beim Warten.
+        """
+        while not self._claim_import():
+            if self.exists():
+                return
+            time.sleep(poll_interval)
+        users = credentials.get("usernames") or {}
+        for username, record in users.items():
+            self.data_handler.save(self._record_path(username), record)
+        try:
+            # Bedingt schreiben, damit ein Index mit inzwischen registrierten Benutzern bleibt
+            self.data_handler.save(self.index_path, {
+                "usernames": {username: {"email": record.get("email")} for username, record in users.items()}
+            }, expected_version=MISSING)
+        except WriteConflictError:
+            logger.info("Anmeldedaten wurden bereits von einer anderen Session übernommen")
+
+
+class LazyUserRecords(dict):
+    """
+    Verzögert ladendes ``credentials["usernames"]``-Dictionary für ``stauth.Authenticate``.
+
+    Ein Zugriff auf einen Benutzer lädt nur dessen Datensatz aus dem Store. Iterationen
+    (z. B. die E-Mail-Prüfung bei der Registrierung) liefern für noch nicht geladene
+    Benutzer die Einträge aus dem Index. Neu gesetzte Benutzer werden in ``new_users``
+    gesammelt und mit ``ShardedCredentialStore.save_user`` gespeichert.
+
+    Nicht gefundene Benutzer werden für ``MISS_TTL`` Sekunden gemerkt, da
+    ``stauth.Authenticate`` bei Anmeldung und Registrierung mehrfach nachfragt. Index und
+    Fehlschläge gelten bis zum nächsten ``refresh()``.
+    """
+
+    MISS_TTL = 30.0
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self.new_users = set()
+        self._index = None
+        self._misses = {}
+
+    def _load(self, username):
+        if dict.__contains__(self, username):
+            return True
+        missed = self._misses.get(username)
+        if missed is not None and time.monotonic() - missed < self.MISS_TTL:
+            return False
+        record = self.store.load_user(username)
+        if record is None:
+            self._misses[username] = time.monotonic()
+            return False
+        self._misses.pop(username, None)
+        dict.__setitem__(self, username, record)
+        return True
+
+    def refresh(self):
+        """
+        Verwirft den gemerkten Index und die nicht gefundenen Benutzer. Der nächste Zugriff
+        sieht so auch Benutzer, die sich seither in einer anderen Session registriert haben.
+        """
+        self._index = None
+        self._misses.clear()
+
+    def _summaries(self):
+        if self._index is None:
+            self._index = self.store.load_index()
+        return {**self._index, **dict(dict.items(self))}
+
+    def __missing__(self, username):
+        if self._load(username):
+            return dict.__getitem__(self, username)
+        raise KeyError(username)
+
+    def __contains__(self, username):
+        return self._load(username)
+
+    def __setitem__(self, username, record):
+        dict.__setitem__(self, username, record)
+        self._misses.pop(username, None)
+        self.new_users.add(username)
+
+    def get(self, username, default=None):
+        return self[username] if self._load(username) else default
+
+    def __iter__(self):
+        return iter(self._summaries())
+
+    def __len__(self):
+        return len(self._summaries())
+
+    def __bool__(self):
+        return True
+
+    def keys(self):
+        return self._summaries().keys()
+
+    def values(self):
+        return self._summaries().values()
+
+    def items(self):
+        return self._summaries().items()
@@ -1,24 +1,140 @@
+import os
 import json
-import yaml
+import time
+import uuid
+import random
+import fsspec
 import posixpath
+import threading
+from contextlib import contextmanager, nullcontext
 import pandas as pd
-from io import StringIO
 import logging
+from utils.schema import get_schema
+from utils.metrics import METRICS
+from utils.file_cache import file_validator, move_replace
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Dateiendung -> fsspec-Kompressionsverfahren (zstd und lz4 nur mit installiertem zstandard/lz4)
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd", ".lz4": "lz4"}
+TEXT_EXTENSIONS = [".csv", ".json", ".yaml", ".yml", ".txt"]
+
+MISSING = "missing"  # Version einer Datei, die (noch) nicht existiert
+
+_held_locks = threading.local()  # von diesem Thread gehaltene Sperrdateien
+_path_locks = {}  # prozessweite Sperren für entfernte Dateisysteme
+_path_locks_guard = threading.Lock()
+
+
+class WriteConflictError(Exception):
+    """
+    Wird ausgelöst, wenn eine Datei seit dem Laden von einem anderen Prozess geändert wurde.
+    """
+
+    def __init__(self, relative_path, expected_version, current_version):
+        super().__init__(f"Datei wurde zwischenzeitlich geändert: {relative_path}")
+        self.relative_path = relative_path
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
 class DataHandler:
-    def __init__(self, filesystem, root_path):
+    def __init__(self, filesystem, root_path, compression=None):
         """
         Initialisiert den DataHandler.
 
         Args:
             filesystem: Das Dateisystemobjekt (z. B. fsspec).
             root_path: Der Root-Pfad für alle Dateioperationen.
+            compression: Kompression für Textdateien ("gzip", "zstd" oder "lz4"). Die Dateien
+                werden dann mit der passenden Endung (z. B. ``data.csv.gz``) gespeichert;
+                bestehende unkomprimierte Dateien werden weiterhin gelesen.
         """
+        if compression is not None and compression not in fsspec.available_compressions():
+            raise ValueError(f"Nicht verfügbare Kompression: {compression}")
         self.filesystem = filesystem
         self.root_path = root_path
+        self.compression = compression
+
+    @staticmethod
+    def split_compression(relative_path):
+        """
+        Trennt eine Kompressionsendung vom Pfad.
+
+        Returns:
+            tuple: (Pfad ohne Kompressionsendung, Kompressionsverfahren oder None)
+        """
+        base, suffix = posixpath.splitext(relative_path)
+        if suffix.lower() in COMPRESSION_SUFFIXES:
+            return base, COMPRESSION_SUFFIXES[suffix.lower()]
+        return relative_path, None
+
+    def _storage_path(self, relative_path, write=False):
+        """
+        Bestimmt den tatsächlich gespeicherten Pfad und dessen Kompression.
+
+        Ist eine Kompression konfiguriert, werden Textdateien komprimiert geschrieben und
+        beim Lesen bevorzugt; fehlt die komprimierte Datei, wird die unkomprimierte gelesen.
+        """
+        logical_path, compression = self.split_compression(relative_path)
+        ext = posixpath.splitext(logical_path)[-1].lower()
+        if compression is not None or self.compression is None or ext not in TEXT_EXTENSIONS:
+            return relative_path, compression
+
+        suffix = next(s for s, name in COMPRESSION_SUFFIXES.items() if name == self.compression)
+        compressed_path = relative_path + suffix
+        if write or self.filesystem.exists(self._resolve_path(compressed_path)):
+            return compressed_path, self.compression
+        return relative_path, None
+
+    def _locate(self, relative_path, fresh=False):
+        """
+        Sucht die gespeicherte Datei mit einer einzigen Metadaten-Abfrage; nur wenn eine
+        konfigurierte Kompression noch nicht angewendet wurde, wird zusätzlich die
+        unkomprimierte Datei gesucht.
+
+        Args:
+            relative_path: Der relative Pfad.
+            fresh: Zwischengespeicherte Metadaten verwerfen (siehe ``version``).
+
+        Returns:
+            tuple: (gespeicherter Pfad, Kompression, Info-Dictionary) oder None, wenn die Datei
+            nicht existiert.
+        """
+        candidates = [self._storage_path(relative_path, write=True)]
+        if candidates[0][0] != relative_path:
+            candidates.append((relative_path, None))
+        invalidate_info = getattr(self.filesystem, "invalidate_info", None) if fresh else None
+        for storage_path, compression in candidates:
+            full_path = self._resolve_path(storage_path)
+            if invalidate_info is not None:
+                invalidate_info(full_path)
+            try:
+                return storage_path, compression, self.filesystem.info(full_path)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _open(self, relative_path, mode, write=False, target=None, located=None):
+        """
+        Öffnet eine Datei als Stream, bei Bedarf mit (De-)Kompression.
+
+        Args:
+            target: Abweichender absoluter Pfad, in den geschrieben wird (z. B. eine temporäre
+                Datei); die Kompression richtet sich weiterhin nach ``relative_path``.
+            located: Ergebnis von ``_locate``, damit die Datei nicht erneut gesucht wird.
+
+        Returns:
+            fsspec.core.OpenFile: Als Kontextmanager zu verwenden.
+        """
+        if located is not None:
+            storage_path, compression = located[:2]
+        else:
+            storage_path, compression = self._storage_path(relative_path, write=write)
+        return fsspec.core.OpenFile(self.filesystem, target or self._resolve_path(storage_path), mode=mode,
+                                    compression=compression,
+                                    encoding=None if "b" in mode else "utf-8")
 
     def join(self, *args):
         """
@@ -51,8 +167,93 @@ class DataHandler:
         Returns:
             bool: True, wenn die Datei existiert, sonst False.
         """
+        METRICS.inc("data_handler_exists")
+        return self._locate(relative_path) is not None
+
+    def info(self, relative_path):
+        """
+        Liefert die Metadaten einer Datei (Grösse, Änderungszeit bzw. ETag).
+
+        Args:
+            relative_path: Der relative Pfad.
+
+        Returns:
+            dict: Das Info-Dictionary des Dateisystems.
+        """
+        located = self._locate(relative_path)
+        if located is None:
+            raise FileNotFoundError(f"Datei existiert nicht: {relative_path}")
+        return located[2]
+
+    def version(self, relative_path):
+        """
+        Liefert die aktuelle Version einer Datei, unter Umgehung zwischengespeicherter Metadaten.
+        Liegt bei konfigurierter Kompression nur eine ältere unkomprimierte Datei vor, ist es
+        deren Version.
+
+        Args:
+            relative_path: Der relative Pfad.
+
+        Returns:
+            str: ETag bzw. Änderungszeit und Grösse (lokal zusätzlich die Inode), oder
+            ``MISSING``, wenn die Datei nicht existiert.
+        """
+        located = self._locate(relative_path, fresh=True)
+        if located is None:
+            return MISSING
+        info = located[2]
+        version = file_validator(info) or f"size:{info.get('size')}"
+        # Eine Umbenennung erzeugt lokal immer eine neue Inode, auch bei gleicher mtime
+        return f"{version}:{info['ino']}" if info.get("ino") is not None else version
+
+    def list_files(self, relative_path):
+        """
+        Listet die Dateien eines Verzeichnisses mit ihrer Grösse auf. Versteckte Dateien (z. B.
+        Sperr- und temporäre Dateien des bedingten Speicherns) werden ausgelassen.
+
+        Args:
+            relative_path: Der relative Pfad des Verzeichnisses.
+
+        Returns:
+            dict: Dateiname -> Grösse in Bytes. Leer, wenn das Verzeichnis nicht existiert.
+        """
+        full_path = self._resolve_path(relative_path)
+        if not self.filesystem.exists(full_path):
+            return {}
+        entries = self.filesystem.ls(full_path, detail=True)
+        names = {posixpath.basename(entry["name"].rstrip("/")): entry.get("size") or 0
+                 for entry in entries if entry.get("type") == "file"}
+        return {name: size for name, size in names.items() if not name.startswith(".")}
+
+    def list_dirs(self, relative_path):
+        """
+        Listet die Unterverzeichnisse eines Verzeichnisses auf.
+
+        Args:
+            relative_path: Der relative Pfad des Verzeichnisses.
+
+        Returns:
+            list: Die Namen der Unterverzeichnisse. Leer, wenn das Verzeichnis nicht existiert.
+        """
         full_path = self._resolve_path(relative_path)
-        return self.filesystem.exists(full_path)
+        if not self.filesystem.exists(full_path):
+            return []
+        entries = self.filesystem.ls(full_path, detail=True)
+        return sorted(
+            posixpath.basename(entry["name"].rstrip("/"))
+            for entry in entries
+            if entry.get("type") == "directory"
+        )
+
+    def remove(self, relative_path):
+        """
+        Löscht eine Datei.
+
+        Args:
+            relative_path: Der relative Pfad.
+        """
+        storage_path, _ = self._storage_path(relative_path)
+        self.filesystem.rm(self._resolve_path(storage_path))
 
     def read_text(self, relative_path):
         """
@@ -64,8 +265,7 @@ class DataHandler:
         Returns:
             str: Der Inhalt der Datei.
         """
-        full_path = self._resolve_path(relative_path)
-        with self.filesystem.open(full_path, "r") as f:
+        with self._open(relative_path, "r") as f:
             return f.read()
 
     def read_binary(self, relative_path):
@@ -78,8 +278,7 @@ class DataHandler:
         Returns:
             bytes: Der Inhalt der Datei.
         """
-        full_path = self._resolve_path(relative_path)
-        with self.filesystem.open(full_path, "rb") as f:
+        with self._open(relative_path, "rb") as f:
             return f.read()
 
     def write_text(self, relative_path, content):
@@ -90,8 +289,7 @@ class DataHandler:
             relative_path: Der relative Pfad.
             content: Der zu schreibende Textinhalt.
         """
-        full_path = self._resolve_path(relative_path)
-        with self.filesystem.open(full_path, "w") as f:
+        with self._open(relative_path, "w", write=True) as f:
             f.write(content)
 
     def write_binary(self, relative_path, content):
@@ -102,67 +300,360 @@ class DataHandler:
             relative_path: Der relative Pfad.
             content: Der zu schreibende Binärinhalt.
         """
-        full_path = self._resolve_path(relative_path)
-        with self.filesystem.open(full_path, "wb") as f:
+        with self._open(relative_path, "wb", write=True) as f:
             f.write(content)
 
-    def load(self, relative_path, initial_value=None, **load_args):
+    def load(self, relative_path, initial_value=None, schema=None, **load_args):
         """
         Lädt den Inhalt einer Datei basierend auf der Dateiendung.
 
+        Tabellen im Binärformat (``.parquet``, ``.feather``) behalten ihre Datentypen
+        (z. B. ``datetime64``, Ganzzahlen, Kategorien); mit ``columns=[...]`` werden nur die
+        gewünschten Spalten gelesen.
+
         Args:
             relative_path: Der relative Pfad.
             initial_value: Der Standardwert, falls die Datei nicht existiert.
+            schema: Name eines registrierten Schemas (siehe ``utils.schema``); geladene
+                Tabellen werden in dessen Datentypen umgewandelt.
 
         Returns:
             Der geladene Inhalt der Datei.
         """
+        ext = posixpath.splitext(self.split_compression(relative_path)[0])[-1].lower()
+        with METRICS.timer("data_handler_seconds", op="load", ext=ext):
+            content = self._load(relative_path, initial_value, **load_args)
+            if schema is not None and isinstance(content, pd.DataFrame):
+                content = get_schema(schema).coerce(content, strict=False)
+        return content
+
+    def load_versioned(self, relative_path, initial_value=None, schema=None, **load_args):
+        """
+        Lädt eine Datei wie ``load`` und liefert zusätzlich ihre Version für ein späteres
+        bedingtes ``save``.
+
+        Die Version wird vor dem Lesen bestimmt; ändert sich die Datei währenddessen, schlägt
+        das bedingte Speichern fehl, statt die Änderung zu überschreiben.
+
+        Returns:
+            tuple: (Inhalt, Version)
+        """
+        version = self.version(relative_path)
+        return self.load(relative_path, initial_value, schema, **load_args), version
+
+    def iter_chunks(self, relative_path, chunksize=10_000, schema=None, **load_args):
+        """
+        Liest eine Tabelle stückweise, sodass nie mehr als ``chunksize`` Zeilen (bzw. eine
+        Zeilengruppe bei Parquet) gleichzeitig im Speicher liegen.
+
+        CSV-Dateien werden mit ``pd.read_csv(chunksize=...)`` gelesen, Parquet-Dateien pro
+        Batch und Feather-Dateien pro Record-Batch; andere Formate werden ganz geladen und
+        in Stücke geteilt. Fehlt die Datei, wird nichts geliefert.
+
+        Args:
+            relative_path: Der relative Pfad.
+            chunksize: Maximale Anzahl Zeilen pro Stück.
+            schema: Name eines registrierten Schemas, in dessen Datentypen jedes Stück
+                umgewandelt wird.
+
+        Yields:
+            pd.DataFrame: Die Zeilen der Datei in gespeicherter Reihenfolge.
+        """
+        located = self._locate(relative_path)
+        if located is None:
+            return
+        logger.info(f"Lese Datei stückweise: {relative_path}")
+        ext = posixpath.splitext(self.split_compression(relative_path)[0])[-1].lower()
+        coerce = get_schema(schema).coerce if schema is not None else None
+
+        def chunks():
+            if ext == ".csv":
+                with self._open(relative_path, "r", located=located) as f:
+                    yield from pd.read_csv(f, chunksize=chunksize, **load_args)
+            elif ext == ".parquet":
+                import pyarrow.parquet as pq
+                with self._open(relative_path, "rb", located=located) as f:
+                    for batch in pq.ParquetFile(f).iter_batches(batch_size=chunksize,
+                                                                columns=load_args.get("columns")):
+                        yield batch.to_pandas()
+            elif ext == ".feather":
+                import pyarrow as pa
+                with self._open(relative_path, "rb", located=located) as f:
+                    reader = pa.ipc.open_file(f)
+                    for i in range(reader.num_record_batches):
+                        frame = reader.get_batch(i).to_pandas()
+                        yield frame[load_args["columns"]] if "columns" in load_args else frame
+            else:
+                content = self._load(relative_path, located=located, **load_args)
+                for start in range(0, len(content), chunksize):
+                    yield content.iloc[start:start + chunksize]
+
+        for chunk in chunks():
+            yield coerce(chunk, strict=False) if coerce is not None else chunk
+
+    def upload(self, local_path, relative_path):
+        """
+        Lädt eine lokale Datei unverändert (ohne Kompression) hoch. Sie wird zuerst als
+        versteckte temporäre Datei übertragen und dann in einem Schritt umbenannt, sodass
+        andere Sitzungen nie eine halb geschriebene Datei sehen.
+
+        Args:
+            local_path: Der Pfad der lokalen Datei.
+            relative_path: Der relative Zielpfad.
+        """
+        logger.info(f"Lade Datei hoch: {relative_path}")
+        full_path = self._resolve_path(relative_path)
+        directory, name = posixpath.split(full_path)
+        tmp_path = posixpath.join(directory, f".{name}.{uuid.uuid4().hex[:12]}.tmp")
+        self.filesystem.mkdirs(directory, exist_ok=True)
+        self.filesystem.put_file(local_path, tmp_path)
+        self._replace(tmp_path, full_path)
+
+    def _load(self, relative_path, initial_value=None, located=None, **load_args):
         logger.info(f"Lade Datei: {relative_path}")
-        if not self.exists(relative_path):
+        # Ein Aufruf von ``_locate`` bestimmt Existenz, Pfad und Kompression zugleich
+        located = located or self._locate(relative_path)
+        if located is None:
             if initial_value is not None:
                 logger.warning(f"Datei nicht gefunden: {relative_path}. Rückgabe des Standardwerts.")
                 return initial_value
             raise FileNotFoundError(f"Datei existiert nicht: {relative_path}")
 
-        ext = posixpath.splitext(relative_path)[-1].lower()
+        ext = posixpath.splitext(self.split_compression(relative_path)[0])[-1].lower()
         if ext == ".json":
-            return json.loads(self.read_text(relative_path))
+            with self._open(relative_path, "r", located=located) as f:
+                return json.load(f)
         elif ext in [".yaml", ".yml"]:
-            return yaml.safe_load(self.read_text(relative_path))
+            import yaml
+            with self._open(relative_path, "r", located=located) as f:
+                return yaml.safe_load(f)
         elif ext == ".csv":
-            with self.filesystem.open(self._resolve_path(relative_path), "r") as f:
+            with self._open(relative_path, "r", located=located) as f:
                 return pd.read_csv(f, **load_args)
+        elif ext == ".parquet":
+            with self._open(relative_path, "rb", located=located) as f:
+                return pd.read_parquet(f, **load_args)
+        elif ext == ".feather":
+            with self._open(relative_path, "rb", located=located) as f:
+                return pd.read_feather(f, **load_args)
         elif ext == ".txt":
-            return self.read_text(relative_path)
+            with self._open(relative_path, "r", located=located) as f:
+                return f.read()
         else:
             raise ValueError(f"Nicht unterstützte Dateiendung: {ext}")
 
-    def save(self, relative_path, content):
+    def save(self, relative_path, content, expected_version=None):
         """
         Speichert den Inhalt in einer Datei basierend auf der Dateiendung.
 
+        Mit ``expected_version`` wird optimistisch gespeichert: Der Inhalt wird in eine
+        temporäre Datei geschrieben und nur dann per Umbenennung an die Stelle der Datei
+        gesetzt, wenn diese noch die erwartete Version hat. Leser sehen so nie eine halb
+        geschriebene Datei. Auf lokalen Dateisystemen sind Prüfung und Umbenennung über eine
+        Sperrdatei auch zwischen Prozessen atomar; bei WebDAV bleibt ein Zeitfenster von
+        einer Anfrage.
+
         Args:
             relative_path: Der relative Pfad.
             content: Der zu speichernde Inhalt.
+            expected_version: Version aus ``load_versioned`` bzw. ``version`` (``MISSING``,
+                wenn die Datei neu angelegt wird), None für unbedingtes Überschreiben.
+
+        Returns:
+            str: Die neue Version bei bedingtem Speichern, sonst None.
+
+        Raises:
+            WriteConflictError: Wenn die Datei nicht mehr die erwartete Version hat.
+        """
+        ext = posixpath.splitext(self.split_compression(relative_path)[0])[-1].lower()
+        with METRICS.timer("data_handler_seconds", op="save", ext=ext):
+            if expected_version is None:
+                self._save(relative_path, content)
+                return None
+            return self._save_conditional(relative_path, content, expected_version)
+
+    def update(self, relative_path, modify, initial_value=None, attempts=10, **load_args):
         """
+        Liest eine Datei, wendet ``modify`` an und speichert das Ergebnis bedingt auf den
+        gelesenen Stand. Hat ein anderer Prozess die Datei inzwischen geändert, wird erneut
+        gelesen und ``modify`` auf den neuen Stand angewendet. Ab dem zweiten Versuch geschieht
+        das auf lokalen Dateisystemen unter der Sperrdatei, sodass er nicht erneut verdrängt
+        werden kann; bei WebDAV wird zufällig zunehmend lange gewartet.
+
+        Args:
+            relative_path: Der relative Pfad.
+            modify: Funktion, die den aktuellen Inhalt (``initial_value``, wenn die Datei nicht
+                existiert) erhält und den zu speichernden liefert.
+            initial_value: Der Inhalt einer noch nicht existierenden Datei.
+            attempts: Maximale Anzahl Speicherversuche.
+
+        Returns:
+            tuple: (neue Version, gespeicherter Inhalt)
+
+        Raises:
+            WriteConflictError: Wenn auch der letzte Versuch auf einen Konflikt stösst.
+        """
+        full_path = self._resolve_path(self._storage_path(relative_path, write=True)[0])
+        for attempt in range(attempts):
+            with self._commit_lock(full_path) if attempt else nullcontext():
+                version = self.version(relative_path)
+                try:
+                    current = initial_value if version == MISSING else self.load(relative_path, **load_args)
+                except Exception:
+                    # Beim Lesen ersetzt (z. B. Bereichsanfragen über zwei Stände hinweg)?
+                    if attempt == attempts - 1 or self.version(relative_path) == version:
+                        raise
+                    self._conflict(relative_path, attempt)
+                    continue
+                content = modify(current)
+                try:
+                    return self.save(relative_path, content, expected_version=version), content
+                except WriteConflictError:
+                    if attempt == attempts - 1:
+                        raise
+                    self._conflict(relative_path, attempt)
+
+    def save_merged(self, relative_path, content, expected_version, merge, attempts=10, **load_args):
+        """
+        Speichert bedingt und führt bei einem Konflikt den aktuellen Stand der Datei mit dem
+        eigenen Inhalt zusammen, bevor erneut gespeichert wird (siehe ``update``).
+
+        Args:
+            relative_path: Der relative Pfad.
+            content: Der zu speichernde Inhalt.
+            expected_version: Die Version, auf der ``content`` beruht.
+            merge: Funktion ``merge(remote, content)``, die den zusammengeführten Inhalt liefert.
+            attempts: Maximale Anzahl Speicherversuche.
+
+        Returns:
+            tuple: (neue Version, gespeicherter Inhalt)
+
+        Raises:
+            WriteConflictError: Wenn auch der letzte Versuch auf einen Konflikt stösst.
+        """
+        try:
+            return self.save(relative_path, content, expected_version=expected_version), content
+        except WriteConflictError:
+            if attempts <= 1:
+                raise
+            self._conflict(relative_path, 0)
+        return self.update(relative_path, lambda remote: content if remote is None else merge(remote, content),
+                           attempts=attempts - 1, **load_args)
+
+    def _conflict(self, relative_path, attempt):
+        METRICS.inc("data_handler_conflicts")
+        logger.info(f"Schreibkonflikt, lese erneut: {relative_path}")
+        if "file" not in self._protocols():
+            # Ohne Sperre zufällig und zunehmend lange warten, damit sich gleichzeitige
+            # Schreiber nicht gegenseitig immer wieder verdrängen
+            time.sleep(random.uniform(0, 0.01 * 2 ** min(attempt, 6)))
+
+    def _protocols(self):
+        protocol = getattr(self.filesystem, "protocol", ())
+        return (protocol,) if isinstance(protocol, str) else protocol
+
+    @contextmanager
+    def _commit_lock(self, full_path):
+        """
+        Sperrt eine Datei gegen andere Prozesse, z. B. zwischen Versionsprüfung und Umbenennung.
+        Nur lokale Dateisysteme unterstützen ``flock``; auf entfernten Dateisystemen wird nur
+        innerhalb des Prozesses (also zwischen den Sitzungen) gesperrt. Innerhalb eines Threads
+        kann dieselbe Datei mehrfach gesperrt werden.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        held = _held_locks.__dict__.setdefault("paths", set())
+        if full_path in held:
+            yield
+            return
+        if fcntl is None or "file" not in self._protocols():
+            with _path_locks_guard:
+                lock = _path_locks.setdefault((tuple(self._protocols()), full_path), threading.Lock())
+            with lock:
+                held.add(full_path)
+                try:
+                    yield
+                finally:
+                    held.discard(full_path)
+            return
+        lock_path = posixpath.join(posixpath.dirname(full_path), f".{posixpath.basename(full_path)}.lock")
+        self.filesystem.mkdirs(posixpath.dirname(full_path), exist_ok=True)
+        while True:
+            lock_file = open(lock_path, "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Der Vorgänger löscht die Sperrdatei vor dem Entsperren; wer auf eine bereits
+            # gelöschte Datei gewartet hat, versucht es mit der neuen erneut
+            try:
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+        held.add(full_path)
+        try:
+            yield
+        finally:
+            held.discard(full_path)
+            try:
+                os.remove(lock_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def _save_conditional(self, relative_path, content, expected_version):
+        storage_path, _ = self._storage_path(relative_path, write=True)
+        full_path = self._resolve_path(storage_path)
+        tmp_path = posixpath.join(posixpath.dirname(full_path),
+                                  f".{posixpath.basename(full_path)}.{uuid.uuid4().hex[:12]}.tmp")
+        self._save(relative_path, content, target=tmp_path)
+        with self._commit_lock(full_path):
+            current_version = self.version(relative_path)
+            if current_version != expected_version:
+                self.filesystem.rm(tmp_path)
+                raise WriteConflictError(relative_path, expected_version, current_version)
+            self._replace(tmp_path, full_path)
+            return self.version(relative_path)
+
+    def _replace(self, source, target):
+        """
+        Ersetzt ``target`` in einem Schritt durch ``source``, über Dateicache und Messung hinweg.
+        """
+        move_replace(self.filesystem, source, target)
+
+    def _save(self, relative_path, content, target=None):
         logger.info(f"Speichere Datei: {relative_path}")
-        full_path = self._resolve_path(relative_path)
+        full_path = target or self._resolve_path(relative_path)
         parent_dir = posixpath.dirname(full_path)
 
         if not self.filesystem.exists(parent_dir):
             self.filesystem.mkdirs(parent_dir, exist_ok=True)
 
-        ext = posixpath.splitext(relative_path)[-1].lower()
+        ext = posixpath.splitext(self.split_compression(relative_path)[0])[-1].lower()
 
+        # Tabellen und strukturierte Daten werden direkt in den (komprimierenden) Stream geschrieben
         if isinstance(content, pd.DataFrame) and ext == ".csv":
-            self.write_text(relative_path, content.to_csv(index=False))
+            with self._open(relative_path, "w", write=True, target=target) as f:
+                content.to_csv(f, index=False)
+        elif isinstance(content, pd.DataFrame) and ext == ".parquet":
+            with self._open(relative_path, "wb", write=True, target=target) as f:
+                content.to_parquet(f, index=False)
+        elif isinstance(content, pd.DataFrame) and ext == ".feather":
+            with self._open(relative_path, "wb", write=True, target=target) as f:
+                content.reset_index(drop=True).to_feather(f)
         elif isinstance(content, (dict, list)) and ext == ".json":
-            self.write_text(relative_path, json.dumps(content, indent=4))
+            with self._open(relative_path, "w", write=True, target=target) as f:
+                json.dump(content, f, indent=4)
         elif isinstance(content, (dict, list)) and ext in [".yaml", ".yml"]:
-            self.write_text(relative_path, yaml.dump(content, default_flow_style=False))
+            import yaml
+            with self._open(relative_path, "w", write=True, target=target) as f:
+                yaml.dump(content, f, default_flow_style=False)
         elif isinstance(content, str) and ext == ".txt":
-            self.write_text(relative_path, content)
+            with self._open(relative_path, "w", write=True, target=target) as f:
+                f.write(content)
         elif isinstance(content, bytes):
-            self.write_binary(relative_path, content)
+            with self._open(relative_path, "wb", write=True, target=target) as f:
+                f.write(content)
         else:
             raise ValueError(f"Nicht unterstützter Inhaltstyp für Dateiendung {ext}")
\ No newline at end of file
@@ -1,13 +1,52 @@
-import fsspec, posixpath
+import copy, functools, itertools, posixpath, threading, uuid
+from contextlib import contextmanager
 import streamlit as st
 import pandas as pd
-from utils.data_handler import DataHandler
+from utils.data_handler import DataHandler, MISSING
+from utils.resources import get_database, get_exporter, get_metrics_server, get_prefetch_pool, get_shared_data_cache, get_shared_filesystem, get_sync_log
+from utils.helpers import ch_now
+from utils.metrics import METRICS
+from utils.schema import get_schema, schema_for_file
+
+_data_versions = itertools.count(1)  # prozessweit eindeutige Datenversionen
+_compactions = set()  # laufende Kompaktierungen im Hintergrund, pro Basisdatei
+_compactions_lock = threading.Lock()
+
+class DataEntry:
+    """
+    Everything the DataManager knows about one session state key: the file it is stored in, how
+    it was loaded, its versions, and the objects derived from it (sidecars, a pending prefetch).
+    """
+
+    def __init__(self, file_path, load_args=None, user=False, window=None, initial_value=None):
+        self.file_path = file_path
+        self.load_args = load_args or {}
+        self.user = user  # Benutzerdaten: beim Abmelden verworfen, mit anderen Sessions geteilt
+        self.window = window  # {'start', 'end'} bei partitionierten Daten und in der Datenbank
+        self.initial_value = initial_value
+        self.file_version = None  # Version, auf der ein Speichern der ganzen Datei beruht
+        self.data_version = 0  # siehe `DataManager.data_version`
+        self.merged = None  # (Version, Daten) eines mit einem anderen Prozess zusammengeführten Speicherns
+        self.prefetch = None  # laufender Download von `prefetch_user_data`
+        self.sidecars = {}  # 'stats' / 'alerts' -> (Objekt, Pfad)
+
+    @property
+    def partitioned(self):
+        return self.window is not None
+
+    @property
+    def schema(self):
+        return get_schema(self.load_args.get('schema', 'glucose'))
+
 
 class DataManager:
     """
     A singleton class for managing application data persistence and user-specific storage.
     """
 
+    STATS_UPDATE_LIMIT = 1000  # larger appends rebuild the statistics instead of updating them
+    STATS_RETENTION = {'tag': 31, 'woche': 53}  # days and weeks kept in the statistics sidecar
+
     def __new__(cls, *args, **kwargs):
         if 'data_manager' in st.session_state:
             return st.session_state.data_manager
@@ -16,113 +55,1181 @@ class DataManager:
             st.session_state.data_manager = instance
             return instance
     
-    def __init__(self, fs_protocol='file', fs_root_folder='app_data'):
+    def __init__(self, fs_protocol='file', fs_root_folder='app_data', append_mode='rewrite',
+                 write_behind=False, fs_cache_dir=None, fs_compression=None, wal_dir=None,
+                 shared_cache_max_bytes=None, metrics=False, metrics_port=None,
+                 storage_engine='files', database_path='app_data.sqlite'):
+        """
+        All features are off by default. Their tuning (segment thresholds, flush interval, cache
+        size, connection pool) uses the defaults of the component that implements the feature.
+
+        Args:
+            fs_protocol: Filesystem protocol, 'file' or 'webdav'.
+            fs_root_folder: Root folder of all stored files.
+            append_mode: 'rewrite' saves the whole file on every `append_record`, 'segments'
+                writes each new record to a small segment file next to the base file (see
+                `SegmentStore`). Once a threshold is reached, the next load folds the segments
+                back into it in the background, so appends never pay for a compaction.
+            write_behind: If True, saves are queued and uploaded by a background thread;
+                repeated saves of the same key are coalesced into one upload.
+            fs_cache_dir: Local directory for a read-through file cache in front of the
+                filesystem. Files are revalidated against their ETag/mtime before use.
+            fs_compression: Stream compression for text files ('gzip', 'zstd' or 'lz4'), e.g.
+                data.csv is stored as data.csv.gz. Existing uncompressed files stay readable.
+            wal_dir: Local directory of a write-ahead log (see `SyncLog`). If set, saves and
+                appends are committed to the log first and replayed to the filesystem by a
+                background worker with retries, so entries survive a slow or unreachable
+                WebDAV server. Entries left over from a previous run are resumed on startup
+                and merged into loaded data until they are synced.
+            shared_cache_max_bytes: Size limit of a process-wide cache of loaded user data (see
+                `SharedDataCache`). Sessions of the same user then share one snapshot instead of
+                downloading and holding their own copy, and pick up writes of other sessions on
+                their next `load_user_data`/`refresh_user_data`. None disables sharing.
+            metrics: Records timings, byte counts and cache hits of filesystem calls, loads,
+                saves and appends (see `utils.metrics`), shown on the diagnostics page.
+            metrics_port: If set, serves the metrics in Prometheus text format on this port.
+            storage_engine: 'files' stores user data as files below `fs_root_folder`, 'sqlite' stores
+                all user DataFrames and the credentials in an embedded database (see
+                `SqliteDatabase`) with an index on (username, time). Loads, time windows, saves and
+                appends keep their API; per-user queries and cross-user aggregates run in SQL. App
+                data, sidecars and exports stay on the filesystem. Existing files are taken over with
+                `migrate_to_database`.
+            database_path: Local path of the database file for `storage_engine='sqlite'`.
+
+        The filesystem, its connection pool and the file cache are shared by all sessions
+        of the process; the DataManager itself only holds per-session state, one `DataEntry`
+        per session state key.
+        """
         if hasattr(self, 'fs'):  # check if instance is already initialized
             return
-            
+
+        if append_mode not in ('rewrite', 'segments'):
+            raise ValueError(f"DataManager: Invalid append mode: {append_mode}")
+        if storage_engine not in ('files', 'sqlite'):
+            raise ValueError(f"DataManager: Invalid storage engine: {storage_engine}")
+
+        if metrics:
+            METRICS.enable()
+        if metrics_port is not None:
+            get_metrics_server(metrics_port)
+
         self.fs_root_folder = fs_root_folder
-        self.fs = self._init_filesystem(fs_protocol)
-        self.app_data_reg = {}
-        self.user_data_reg = {}
+        self.fs_compression = fs_compression
+        self.fs = self._init_filesystem(fs_protocol, cache_dir=fs_cache_dir, instrument=metrics)
+        self.append_mode = append_mode
+        self.database = get_database(database_path) if storage_engine == 'sqlite' else None
+        self.entries = {}
+        self._batches = {}
+        self.write_queue = None
+        if write_behind:
+            from utils.write_behind import WriteBehindQueue
+            self.write_queue = WriteBehindQueue()
+        self.shared_cache = get_shared_data_cache(shared_cache_max_bytes) if shared_cache_max_bytes else None
+        self.sync_log = None
+        if wal_dir is not None:
+            self.sync_log = get_sync_log(wal_dir, functools.partial(DataManager._replay, self.fs))
 
     @staticmethod
-    def _init_filesystem(protocol: str):
-        if protocol == 'webdav':
-            secrets = st.secrets['webdav']
-            return fsspec.filesystem('webdav', 
-                                     base_url=secrets['base_url'], 
-                                     auth=(secrets['username'], secrets['password']))
-        elif protocol == 'file':
-            return fsspec.filesystem('file')
-        else:
-            raise ValueError(f"AppManager: Invalid filesystem protocol: {protocol}")
+    def _init_filesystem(protocol: str, **fs_options):
+        return get_shared_filesystem(protocol, **fs_options)
 
     def _get_data_handler(self, subfolder: str = None):
         if subfolder is None:
-            return DataHandler(self.fs, self.fs_root_folder)
+            return DataHandler(self.fs, self.fs_root_folder, compression=self.fs_compression)
         else:
-            return DataHandler(self.fs, posixpath.join(self.fs_root_folder, subfolder))
+            return DataHandler(self.fs, posixpath.join(self.fs_root_folder, subfolder),
+                               compression=self.fs_compression)
+
+    def _get_segment_store(self, file_path):
+        """
+        Returns the segment store for a file path relative to the root folder.
+        """
+        from utils.segment_store import SegmentStore
+        return SegmentStore(self._get_data_handler(), file_path)
+
+    def _get_partitioned_store(self, folder_path):
+        """
+        Returns the month-partitioned store for a folder path relative to the root folder. With the
+        sqlite storage engine, this is the user's table in the database, which has the same methods.
+        """
+        if self.database is not None:
+            from utils.sqlite_store import USER_PREFIX, table_name
+            user_folder, file_name = posixpath.split(folder_path)
+            return self.database.table(table_name(file_name), user_folder[len(USER_PREFIX):])
+        from utils.partitioned_store import PartitionedStore
+        return PartitionedStore(self._get_data_handler(), folder_path)
+
+    def credential_store(self, folder='credentials'):
+        """
+        Returns the credential store of the storage engine: one file per user in `folder`, or the
+        credentials table of the database.
+        """
+        if self.database is not None:
+            from utils.sqlite_store import SqliteCredentialStore
+            return SqliteCredentialStore(self.database)
+        from utils.credential_store import ShardedCredentialStore
+        return ShardedCredentialStore(self._get_data_handler(), folder)
+
+    def cohort_analytics(self, file_name='data', max_workers=8):
+        """
+        Returns a `CohortAnalytics` engine over the data of all users in the root folder.
+        """
+        if self.database is not None:
+            from utils.sqlite_store import SqliteCohortAnalytics
+            return SqliteCohortAnalytics(self.database, file_name)
+        from utils.cohort import CohortAnalytics  # nur auf der Auswertungsseite benötigt
+        return CohortAnalytics(self._get_data_handler(), file_name=file_name, max_workers=max_workers)
+
+    def _load_file(self, file_path, initial_value=None, **load_args):
+        """
+        Loads a file relative to the root folder, merging pending segments in segment mode.
+        """
+        return self._load_file_versioned(file_path, initial_value, **load_args)[0]
+
+    def _load_file_versioned(self, file_path, initial_value=None, **load_args):
+        """
+        Loads a file like `_load_file` and also returns the version a later save of the whole file
+        is conditioned on (see `_save_file`). Segment files are only appended to and have no version.
+
+        Returns:
+            tuple: (data, version or None)
+        """
+        if self.append_mode == 'segments':
+            store = self._get_segment_store(file_path)
+            data = store.load(initial_value, **load_args)
+            self.prefetch(DataManager._compact_segments, store,
+                          {key: value for key, value in load_args.items() if key != 'columns'})
+            return data, None
+        return self._get_data_handler().load_versioned(file_path, initial_value, **load_args)
 
     def load_app_data(self, session_state_key, file_name, initial_value=None, **load_args):
         if session_state_key in st.session_state:
             return
         
-        dh = self._get_data_handler()
-        data = dh.load(file_name, initial_value, **load_args)
-        st.session_state[session_state_key] = data
-        self.app_data_reg[session_state_key] = file_name
+        entry = DataEntry(file_name, self._with_file_schema(file_name, load_args))
+        data, entry.file_version = self._load_file_versioned(file_name, initial_value, **entry.load_args)
+        st.session_state[session_state_key] = self._merge_pending(file_name, data)
+        self.entries[session_state_key] = entry
+        self._bump_version(session_state_key)
 
-    def load_user_data(self, session_state_key, file_name, initial_value=None, **load_args):
+    @METRICS.timed('data_manager_seconds', op='load_user_data')
+    def load_user_data(self, session_state_key, file_name, initial_value=None, time_window=None, **load_args):
+        """
+        Loads a file of the logged-in user into the session state.
+
+        If `time_window` is given, `file_name` names a month-partitioned folder (see
+        `PartitionedStore`) and only the partitions overlapping the window are fetched.
+        The window is either a lookback such as '90D' / `pd.Timedelta` or a `(start, end)` tuple.
+        Older partitions can be added later with `load_older_user_data`.
+        Tables of files with a registered schema (see `register_schema`) are loaded in its types
+        unless another `schema=` is passed.
+        """
         username = st.session_state.get('username', None)
         if username is None:
-            for key in self.user_data_reg:  # delete all user data
-                st.session_state.pop(key, None)
-            self.user_data_reg = {}
+            self._clear_user_data()
             st.error(f"DataManager: No user logged in, cannot load file `{file_name}` into session state with key `{session_state_key}`")
             return
         elif session_state_key in st.session_state:
+            self.refresh_user_data(session_state_key)
             return
 
+        file_path = posixpath.join('user_data_' + username, file_name)
+        if self._prefetched(session_state_key, file_path) is not None:
+            self._load_user_file(session_state_key)  # wartet auf den vorab gestarteten Download
+            return
+        if self._register_user_data(session_state_key, file_path, initial_value, time_window, load_args):
+            return
+        self._load_user_file(session_state_key)
+
+    def prefetch(self, function, *args, **kwargs):
+        """
+        Runs `function(*args, **kwargs)` on the process-wide prefetch pool while the page keeps
+        rendering. The function must not access `st.session_state`.
+
+        Returns:
+            concurrent.futures.Future: The pending result; `result()` re-raises errors of the call.
+        """
+        return get_prefetch_pool().submit(function, *args, **kwargs)
+
+    def prefetch_user_data(self, session_state_key, file_name, initial_value=None, time_window=None, **load_args):
+        """
+        Starts downloading a file of the logged-in user in the background. Takes the same arguments
+        as `load_user_data`, which later awaits the download and puts the data into the session
+        state; pages calling `refresh_user_data` first also wait for it. Nothing is fetched if the
+        key is already loaded or a current snapshot of another session is shared. Without a
+        logged-in user, all user data of the session is dropped.
+
+        Returns:
+            concurrent.futures.Future: The pending download, or None if nothing was started.
+        """
+        username = st.session_state.get('username', None)
+        if username is None:
+            self._clear_user_data()
+            return None
+        if session_state_key in st.session_state:
+            return None
+
+        file_path = posixpath.join('user_data_' + username, file_name)
+        future = self._prefetched(session_state_key, file_path)
+        if future is not None:
+            return future
+        if self._register_user_data(session_state_key, file_path, initial_value, time_window, load_args):
+            return None
+        entry = self.entries[session_state_key]
+        entry.prefetch = self.prefetch(self._fetch_user_file, file_path, entry.window, initial_value,
+                                       entry.load_args)
+        return entry.prefetch
+
+    def _prefetched(self, session_state_key, file_path):
+        """
+        Returns the pending download of `file_path` started by `prefetch_user_data`, or None.
+        """
+        entry = self.entries.get(session_state_key)
+        if entry is None or entry.file_path != file_path:
+            return None
+        return entry.prefetch
+
+    def _clear_user_data(self):
+        """
+        Drops all user data of the session, e.g. after a logout.
+        """
+        for key, entry in list(self.entries.items()):  # delete all user data
+            if not entry.user:
+                continue
+            st.session_state.pop(key, None)
+            if entry.prefetch is not None:
+                entry.prefetch.cancel()
+            del self.entries[key]
+
+    def _register_user_data(self, session_state_key, file_path, initial_value, time_window, load_args):
+        """
+        Registers a user data key for loading. If another session shares a current snapshot of the
+        file, it is put into the session state right away.
+
+        Returns:
+            bool: True if the data was taken from the shared cache.
+        """
+        window = None
+        if time_window is not None:
+            from utils.partitioned_store import PartitionedStore  # nur mit Zeitfenster benötigt
+            if isinstance(time_window, tuple):
+                start, end = time_window
+            else:
+                start, end = ch_now() - pd.Timedelta(time_window), None
+            start = PartitionedStore.partition_start(start) if start is not None else None
+            window = {'start': start, 'end': end}
+        elif self.database is not None:
+            # In der Datenbank liegen alle Benutzerdaten in Tabellen, auch ohne Zeitfenster
+            window = {'start': None, 'end': None}
+        entry = DataEntry(file_path, self._with_file_schema(file_path, load_args), user=True, window=window,
+                          initial_value=initial_value)
+        self.entries[session_state_key] = entry
+
+        # Ein aktueller Schnappschuss einer anderen Session ersetzt den Download
+        shared = self._get_shared(entry)
+        if shared is not None:
+            entry.data_version, st.session_state[session_state_key] = shared
+            return True
+        return False
+
+    def _fetch_user_file(self, file_path, window, initial_value, load_args):
+        """
+        Reads user data from the filesystem. Does not touch the session state, so it can run on
+        the prefetch pool.
+
+        Returns:
+            tuple: (data, version or None), see `_load_file_versioned`.
+        """
+        if window is not None:
+            return self._get_partitioned_store(file_path).load(window['start'], window['end'],
+                                                              initial_value, **load_args), None
+        return self._load_file_versioned(file_path, initial_value, **load_args)
+
+    def _load_user_file(self, session_state_key):
+        """
+        Fetches registered user data from the filesystem, or awaits its prefetch, and shares it
+        with other sessions.
+        """
+        entry = self.entries[session_state_key]
+        future, entry.prefetch = entry.prefetch, None
+        if future is not None:
+            data, version = future.result()
+        else:
+            data, version = self._fetch_user_file(entry.file_path, entry.window, entry.initial_value,
+                                                  entry.load_args)
+        st.session_state[session_state_key] = self._merge_pending(entry.file_path, data)
+        entry.file_version = version
+        entry.merged = None
+        self._bump_version(session_state_key)
+        self._share(session_state_key)
+
+    def _shared_key(self, entry):
+        """
+        Returns the file key and variant (loaded time window) of user data in the shared cache.
+        """
+        variant = None if entry.window is None else (str(entry.window['start']), str(entry.window['end']))
+        return (self.fs_root_folder, entry.file_path), variant
+
+    def _get_shared(self, entry):
+        if self.shared_cache is None:
+            return None
+        return self.shared_cache.get(*self._shared_key(entry))
+
+    def _share(self, session_state_key, publish=False):
+        """
+        Puts the session state value of user data into the shared cache. With `publish` the value
+        is the result of a write and outdates snapshots of the file held by other sessions.
+        """
+        entry = self.entries.get(session_state_key)
+        if self.shared_cache is None or entry is None or not entry.user:
+            return
+        file_key, variant = self._shared_key(entry)
+        share = self.shared_cache.publish if publish else self.shared_cache.put
+        share(file_key, variant, st.session_state[session_state_key], entry.data_version)
+
+    @METRICS.timed('data_manager_seconds', op='refresh_user_data')
+    def refresh_user_data(self, session_state_key):
+        """
+        Replaces loaded user data with a newer snapshot written by another session. If no snapshot
+        of the loaded time window is cached, the data is fetched again.
+
+        Returns:
+            bool: True if the session state value was replaced.
+        """
+        entry = self.entries.get(session_state_key)
+        if entry is not None and entry.prefetch is not None and session_state_key not in st.session_state:
+            self._load_user_file(session_state_key)  # Startseite wurde vor dem Warten verlassen
+            return True
+        merged = self._apply_merged(session_state_key)
+        if self.shared_cache is None or entry is None or not entry.user:
+            return merged
+        shared = self._get_shared(entry)
+        if shared is not None:
+            if shared[0] <= entry.data_version:
+                return merged
+            entry.data_version, st.session_state[session_state_key] = shared
+        elif self.shared_cache.file_version(self._shared_key(entry)[0]) > entry.data_version:
+            self._load_user_file(session_state_key)
+        else:
+            self._share(session_state_key)  # verdrängten Schnappschuss wieder bereitstellen
+            return merged
+        # Statistiken und Warnungen werden beim nächsten Zugriff gegen die neuen Daten geprüft
+        entry.sidecars.clear()
+        return True
+
+    def _apply_merged(self, session_state_key):
+        """
+        Takes over records that another process saved concurrently, after a save of this session
+        was merged with them (see `_save_file`).
+
+        Returns:
+            bool: True if the session state value was extended.
+        """
+        entry = self.entries.get(session_state_key)
+        if entry is None:
+            return False
+        merged, entry.merged = entry.merged, None
+        if merged is None or session_state_key not in st.session_state:
+            return False
+        version, data = merged
+        st.session_state[session_state_key] = entry.schema.merge(data, st.session_state[session_state_key])
+        # Erst jetzt enthält der Session-State den gespeicherten Stand
+        entry.file_version = version
+        entry.sidecars.clear()
+        self._bump_version(session_state_key)
+        self._share(session_state_key, publish=True)
+        return True
+
+    def load_older_user_data(self, session_state_key, period='90D'):
+        """
+        Extends the time window of partitioned user data further into the past and prepends the
+        newly fetched records to the session state value.
+
+        Returns:
+            bool: True if there may be even older data left to load.
+        """
+        entry = self.entries.get(session_state_key)
+        if entry is None or not entry.partitioned or entry.window['start'] is None:
+            return False
+
+        window = entry.window
+        store = self._get_partitioned_store(entry.file_path)
+        earliest = store.earliest()
+        if earliest is None or earliest >= window['start']:
+            return False
+
+        from utils.partitioned_store import PartitionedStore
+        new_start = PartitionedStore.partition_start(window['start'] - pd.Timedelta(period))
+        older = store.load(new_start, window['start'] - pd.Timedelta(1, 'ns'), **entry.load_args)
+        if older is not None:
+            current = st.session_state.get(session_state_key)
+            frames = [frame for frame in (older, current) if frame is not None and not frame.empty]
+            st.session_state[session_state_key] = pd.concat(frames, ignore_index=True)
+            self._bump_version(session_state_key)
+        window['start'] = new_start
+        self._share(session_state_key)
+        return earliest < new_start
+
+    def _load_full_user_data(self, session_state_key, columns=None):
+        """
+        Returns the complete stored history of a user data key, also outside a loaded time window.
+        For partitioned data, `columns` restricts which columns are fetched.
+        """
+        entry = self.entries.get(session_state_key)
+        if entry is not None and entry.partitioned:
+            load_args = {**entry.load_args}
+            if columns is not None:
+                load_args['columns'] = columns
+            data = self._get_partitioned_store(entry.file_path).load(**load_args)
+            return self._merge_pending(entry.file_path, data, columns)
+        data_value = st.session_state.get(session_state_key)
+        if columns is not None and data_value is not None:
+            return data_value[columns]
+        return data_value
+
+    def stored_keys(self, session_state_key):
+        """
+        Returns the schema key columns (e.g. `datum_zeit` and `zeitpunkt`) of all stored records of
+        a user data key, fetching only these columns.
+        """
+        key = self._get_schema(session_state_key).key
+        data_value = self._load_full_user_data(session_state_key, columns=key)
+        if data_value is None or data_value.empty:
+            return self._get_schema(session_state_key).empty_frame()[key]
+        return data_value[key]
+
+    def _stored_record_count(self, session_state_key):
+        """
+        Returns the number of stored records of a user data key without reading the records.
+        """
+        entry = self.entries.get(session_state_key)
+        if entry is not None and entry.partitioned:
+            index = self._get_partitioned_store(entry.file_path).load_index()
+            pending = self._merge_pending(entry.file_path, None, ops=('partition_append',))
+            return sum(meta['rows'] for meta in index.values()) + (0 if pending is None else len(pending))
+        data_value = st.session_state.get(session_state_key)
+        return 0 if data_value is None else len(data_value)
+
+    @METRICS.timed('data_manager_seconds', op='load_user_statistics')
+    def load_user_statistics(self, session_state_key, file_name='stats.json'):
+        """
+        Returns the running glucose statistics for user data loaded under `session_state_key`.
+
+        The statistics are kept as a sidecar file next to the user's data and updated on every
+        `append_record`; per day and per week, only the periods in `STATS_RETENTION` are kept. If the sidecar lags behind the stored data, only the records after its
+        watermark are added (see `_catch_up`). The history is read again, chunk by chunk, only if
+        the sidecar is missing or still does not match the stored data.
+        """
+        entry = self._user_entry(session_state_key)
+        if 'stats' in entry.sidecars:
+            return entry.sidecars['stats'][0]
+
+        from utils.statistics import GlucoseStatistics
+        stats_path = posixpath.join(posixpath.dirname(entry.file_path), file_name)
+        dh = self._get_data_handler()
+        stored = dh.load(stats_path, initial_value={})
+        stats = GlucoseStatistics.from_dict(stored, self.STATS_RETENTION) if stored else None
+        rows = None if stats is None else stats.rows
+        if stats is None or not self._catch_up(session_state_key, stats,
+                                               lambda chunk: stats.merge(GlucoseStatistics.from_frame(chunk))):
+            stats = GlucoseStatistics(retention=self.STATS_RETENTION)
+            for chunk in self._records_since(session_state_key, None):
+                stats.merge(GlucoseStatistics.from_frame(chunk))
+        if stats.rows != rows:
+            dh.save(stats_path, stats.to_dict())
+        entry.sidecars['stats'] = (stats, stats_path)
+        return stats
+
+    def _user_entry(self, session_state_key):
+        """
+        Returns the entry of a key loaded with `load_user_data`.
+        """
+        entry = self.entries.get(session_state_key)
+        if entry is None or not entry.user:
+            raise ValueError(f"DataManager: Key {session_state_key} is not loaded as user data")
+        return entry
+
+    def _records_since(self, session_state_key, watermark, chunksize=10_000):
+        """
+        Yields the stored records of a user data key after `watermark` (all records if None) in
+        time order, including appends still waiting in the write-ahead log. Partitioned data is
+        only read from the partition of the watermark on.
+        """
+        entry = self.entries.get(session_state_key)
+        if entry is None or not entry.partitioned:
+            data = st.session_state.get(session_state_key)
+            chunks, pending = ([] if data is None else [data]), None
+        else:
+            load_args = {key: value for key, value in entry.load_args.items() if key != 'columns'}
+            chunks = self._get_partitioned_store(entry.file_path).iter_chunks(start=watermark, chunksize=chunksize,
+                                                                              **load_args)
+            pending = self._merge_pending(entry.file_path, None, ops=('partition_append',))
+            if pending is not None:
+                pending = pending.sort_values('datum_zeit', kind='stable')
+        for chunk in itertools.chain(chunks, [] if pending is None else [pending]):
+            if watermark is not None:
+                chunk = chunk[chunk['datum_zeit'] > watermark]
+            if not chunk.empty:
+                yield chunk
+
+    def _catch_up(self, session_state_key, sidecar, add):
+        """
+        Brings a sidecar (statistics or alerts) up to date with the stored data by passing the
+        records after its watermark to `add`, so a lagging sidecar does not require the full
+        history. A sidecar ahead of the stored data is kept while writes of this session are
+        still pending.
+
+        Returns:
+            bool: False if the sidecar still does not match the stored data and has to be rebuilt.
+        """
+        stored_rows = self._stored_record_count(session_state_key)
+        if sidecar.rows > stored_rows and self.has_pending_writes:
+            return True
+        if sidecar.rows < stored_rows:
+            for chunk in self._records_since(session_state_key, sidecar.watermark):
+                if add(chunk) is False:
+                    return False
+        return sidecar.rows == stored_rows
+
+    def _update_statistics(self, entry, records):
+        """
+        Adds new records to the registered statistics and persists the sidecar once.
+        """
+        stats, stats_path = entry.sidecars['stats']
+        for record in records:
+            stats.update(record)
+        content = copy.deepcopy(stats.to_dict()) if self.write_queue is not None else stats.to_dict()
+        dh = self._get_data_handler()
+        self._persist(stats_path, lambda: dh.save(stats_path, content))
+
+    @METRICS.timed('data_manager_seconds', op='load_user_alerts')
+    def load_user_alerts(self, session_state_key, file_name='alerts.json', rules=None):
+        """
+        Returns the alert engine for user data loaded under `session_state_key`.
+
+        Like the statistics, the rule state (sliding windows, previous reading) and the latest
+        alerts are kept as a sidecar file next to the user's data and evaluated incrementally on
+        every `append_record`. A lagging sidecar is brought up to date with the records after its
+        watermark, whose alerts become `last_alerts`. The full history is backfilled only if the
+        sidecar is missing, was written with other rules, or records older than its watermark
+        were added (e.g. by an import).
+
+        Args:
+            rules: The alert rules, `utils.alerts.DEFAULT_RULES` by default.
+        """
+        entry = self._user_entry(session_state_key)
+        if 'alerts' in entry.sidecars:
+            return entry.sidecars['alerts'][0]
+
+        from utils.alerts import AlertEngine
+        alerts_path = posixpath.join(posixpath.dirname(entry.file_path), file_name)
+        dh = self._get_data_handler()
+        stored = dh.load(alerts_path, initial_value={})
+        engine = AlertEngine.from_dict(stored, rules) if stored else None
+        rows = None if engine is None else engine.rows
+        fired = []
+
+        def add(chunk):
+            evaluated = engine.update_many(chunk.to_dict('records'))
+            fired.extend(engine.last_alerts)
+            return evaluated
+
+        if engine is None or not self._catch_up(session_state_key, engine, add):
+            engine = AlertEngine.from_frame(self._load_full_user_data(session_state_key), rules)
+        else:
+            engine.last_alerts = fired
+        if engine.rows != rows:
+            dh.save(alerts_path, engine.to_dict())
+        entry.sidecars['alerts'] = (engine, alerts_path)
+        return engine
+
+    def _update_alerts(self, entry, records):
+        """
+        Evaluates new records against the registered alert rules and persists the sidecar once.
+        The triggered alerts are available as `last_alerts` of the engine.
+
+        Returns:
+            bool: False if a record is older than the evaluated history and the engine has to be
+            rebuilt.
+        """
+        engine, alerts_path = entry.sidecars['alerts']
+        if not engine.update_many(records):
+            return False
+        content = copy.deepcopy(engine.to_dict()) if self.write_queue is not None else engine.to_dict()
+        dh = self._get_data_handler()
+        self._persist(alerts_path, lambda: dh.save(alerts_path, content))
+        return True
+
+    def migrate_user_file(self, source_file_name, target_file_name, **load_args):
+        """
+        One-shot conversion of a user file into another format, e.g. `data.csv` -> `data.parquet`.
+        A target without file extension is written as a month-partitioned folder. Nothing happens
+        if the target already exists or the source does not. The source file is kept as a backup.
+
+        Returns:
+            bool: True if a migration took place.
+        """
+        username = st.session_state.get('username', None)
+        if username is None:
+            return False
+
         user_data_folder = 'user_data_' + username
-        dh = self._get_data_handler(user_data_folder)
-        data = dh.load(file_name, initial_value, **load_args)
-        st.session_state[session_state_key] = data
-        self.user_data_reg[session_state_key] = dh.join(user_data_folder, file_name)
+        source_path = posixpath.join(user_data_folder, source_file_name)
+        target_path = posixpath.join(user_data_folder, target_file_name)
+        dh = self._get_data_handler()
+        partitioned = posixpath.splitext(target_file_name)[-1] == ''
+        if partitioned:
+            target_exists = self._get_partitioned_store(target_path).exists()
+        else:
+            target_exists = dh.exists(target_path)
+        if target_exists or not dh.exists(source_path):
+            return False
 
-    @property
-    def data_reg(self):
-        return {**self.app_data_reg, **self.user_data_reg}
+        data = self._load_file(source_path, **self._with_file_schema(source_file_name, load_args))
+        if partitioned:
+            self._get_partitioned_store(target_path).write(data)
+        else:
+            dh.save(target_path, data)
+        return True
+
+    def migrate_to_database(self, file_name='data', credentials_folder='credentials',
+                            credentials_file='credentials.yaml'):
+        """
+        One-shot transfer of the data files of all users and of the credentials into the database
+        of the sqlite storage engine (see `migrate_to_sqlite`). Users already in the database are
+        skipped; the files are kept as a backup.
+
+        Returns:
+            dict: Numbers of migrated users, records and credentials.
+        """
+        if self.database is None:
+            raise ValueError("DataManager: migrate_to_database requires storage_engine='sqlite'")
+        from utils.sqlite_store import migrate_to_sqlite
+        return migrate_to_sqlite(self._get_data_handler(), self.database, file_name,
+                                 credentials_folder, credentials_file)
+
+    def windowed_averages(self, session_state_key, freq='W', start=None, end=None, by_zeitpunkt=False):
+        """
+        Returns the mean, minimum and maximum per day ('D'), week ('W') or month ('M') over the
+        complete stored history of a user data key. With the sqlite storage engine the aggregation
+        runs in SQL on the index; otherwise the history is loaded and grouped with pandas.
+
+        Returns:
+            pd.DataFrame: Columns 'periode' (period start), optionally 'zeitpunkt', 'anzahl',
+            'mittelwert', 'minimum' and 'maximum', sorted by period.
+        """
+        entry = self._user_entry(session_state_key)
+        if self.database is not None:
+            store = self._get_partitioned_store(entry.file_path)
+            return self.database.windowed_averages(store.table, store.username, freq, start, end, by_zeitpunkt)
+
+        data = self._load_full_user_data(session_state_key)
+        data = self._get_schema(session_state_key).empty_frame() if data is None else data
+        zeit = pd.to_datetime(data['datum_zeit'])
+        mask = zeit.notna() & data['blutzuckerwert'].notna()
+        if start is not None:
+            mask &= zeit >= pd.Timestamp(start)
+        if end is not None:
+            mask &= zeit < pd.Timestamp(end)
+        periode = zeit.dt.to_period(freq).dt.start_time.rename('periode')
+        keys = [periode] + ([data['zeitpunkt'].astype(object).rename('zeitpunkt')] if by_zeitpunkt else [])
+        result = data['blutzuckerwert'][mask].astype('float64').groupby(
+            [key[mask] for key in keys]).agg(['count', 'mean', 'min', 'max'])
+        result.columns = ['anzahl', 'mittelwert', 'minimum', 'maximum']
+        return result.reset_index().astype({'anzahl': 'int64'})
+
+    def export_user_data(self, session_state_key, fmt='csv', title=''):
+        """
+        Exports the complete stored history of a user data key in the background, as 'csv', 'xlsx'
+        or 'pdf' report with summary page (see `Exporter`). The records are streamed from the
+        filesystem in chunks, so neither the session state nor a full copy of the history is used.
+        Pending writes are flushed first. The file is kept in the user's `exports/` folder, one per
+        stored data version, so repeated exports of unchanged data return right away.
+
+        Returns:
+            ExportJob: The job; once its status is 'fertig', `job.read()` returns the file,
+            e.g. for `st.download_button`.
+        """
+        entry = self._user_entry(session_state_key)
+        file_path = entry.file_path
+        if self.has_pending_writes:
+            self.flush(timeout=10)
+
+        # Die Quelle wird ohne Session-State an den Export-Pool übergeben
+        load_args = {key: value for key, value in entry.load_args.items() if key != 'columns'}
+        if entry.partitioned:
+            store = self._get_partitioned_store(file_path)
+            chunks = lambda chunksize: store.iter_chunks(chunksize=chunksize, **load_args)
+            version = store.version
+        elif self.append_mode == 'segments':
+            store = self._get_segment_store(file_path)
+            chunks = lambda chunksize: store.iter_chunks(chunksize, **load_args)
+            version = store.version
+        else:
+            dh = self._get_data_handler()
+            chunks = lambda chunksize: dh.iter_chunks(file_path, chunksize, **load_args)
+            version = functools.partial(dh.version, file_path)
+
+        return get_exporter().submit(self._get_data_handler(), *self._export_target(file_path), fmt, chunks,
+                                     version, title)
+
+    def export_job(self, session_state_key, fmt='csv'):
+        """
+        Returns the last export job of the process for a user data key and format, or None. The
+        jobs are kept by the `Exporter`, so the job survives page switches and is shared by all
+        sessions of the user.
+        """
+        entry = self.entries.get(session_state_key)
+        if entry is None or not entry.user:
+            return None
+        return get_exporter().job(self._get_data_handler(), *self._export_target(entry.file_path), fmt)
+
+    @staticmethod
+    def _export_target(file_path):
+        """
+        Returns the export folder and file name (without version and extension) of a data file.
+        """
+        folder, name = posixpath.split(file_path)
+        return posixpath.join(folder, 'exports'), posixpath.splitext(DataHandler.split_compression(name)[0])[0]
+
+    def _bump_version(self, session_state_key):
+        self.entries[session_state_key].data_version = next(_data_versions)
+
+    def data_version(self, session_state_key):
+        """
+        Returns a process-wide unique version that changes whenever the session state value of the
+        key is replaced or extended through the DataManager. Useful as cache key for derived views.
+        """
+        entry = self.entries.get(session_state_key)
+        return 0 if entry is None else entry.data_version
+
+    def _entry(self, session_state_key):
+        """
+        Returns the entry of a key, registering keys that were never loaded as app data stored in
+        `<key>.csv`.
+        """
+        if session_state_key not in self.entries:
+            self.entries[session_state_key] = DataEntry(f"{session_state_key}.csv")
+        return self.entries[session_state_key]
 
+    @METRICS.timed('data_manager_seconds', op='save_data')
     def save_data(self, session_state_key):
         """
         Saves data from session state to persistent storage using the registered data handler.
         """
-        # Registriere den Schlüssel in data_reg, falls er nicht existiert
-        if session_state_key not in self.data_reg:
-            self.app_data_reg[session_state_key] = f"{session_state_key}.csv"
+        # Registriere den Schlüssel, falls er nicht existiert
+        entry = self._entry(session_state_key)
 
         # Überprüfen, ob der Schlüssel im Session-State existiert
         if session_state_key not in st.session_state:
             raise ValueError(f"DataManager: Key {session_state_key} not found in session state")
-        
+
+        # Gespeicherte Statistiken und Warnungen werden beim nächsten Zugriff gegen die Daten geprüft
+        entry.sidecars.clear()
+        self._bump_version(session_state_key)
+        self._share(session_state_key, publish=True)
+
         # Speichere die Daten
+        file_path = entry.file_path
+        data_value = st.session_state[session_state_key]
+        if isinstance(data_value, list):
+            data_value = list(data_value)  # Schnappschuss, da Listen direkt verändert werden
+
+        if entry.partitioned:
+            # Nur die Partitionen im geladenen Zeitfenster werden ersetzt
+            if self.sync_log is not None and self.database is None:
+                self._log_write('partition_write', file_path, data_value, session_state_key)
+                return
+            store = self._get_partitioned_store(file_path)
+            self._persist(file_path, lambda: store.write(data_value))
+        elif self.append_mode == 'segments' and isinstance(data_value, pd.DataFrame):
+            # Ein vollständiger Speichervorgang ersetzt Basisdatei und Segmente
+            if self.sync_log is not None:
+                self._log_write('segment_replace', file_path, data_value, session_state_key)
+                return
+            store = self._get_segment_store(file_path)
+            self._persist(file_path, lambda: store.replace(data_value))
+        else:
+            # Die Version, auf der der Inhalt beruht, wird beim Auftrag festgehalten
+            version = entry.file_version or MISSING
+            if self.sync_log is not None:
+                self._log_write('save', file_path, data_value, session_state_key, expected_version=version)
+                return
+            self._persist(file_path, lambda: self._save_file(entry, data_value, version))
+
+    def _save_file(self, entry, data_value, version):
+        """
+        Saves a whole file on top of the version its content is based on. If another process
+        saved the file in between, only DataFrames can be reconciled: the stored records are
+        merged with ours by the schema key and saved again. The merged records reach the
+        session state on its next `refresh_user_data`; until then, saves keep being merged.
+        """
         dh = self._get_data_handler()
-        dh.save(self.data_reg[session_state_key], st.session_state[session_state_key])
+        if not isinstance(data_value, pd.DataFrame):
+            dh.save(entry.file_path, data_value)
+            return
+        new_version, saved = dh.save_merged(entry.file_path, data_value, version, entry.schema.merge,
+                                            **entry.load_args)
+        if saved is data_value:
+            entry.file_version = new_version
+        else:
+            entry.merged = (new_version, saved)
 
     def save_all_data(self):
         """
         Saves all valid data from the session state to the persistent storage.
         """
-        keys = [key for key in self.data_reg.keys() if key in st.session_state]
+        keys = [key for key in self.entries if key in st.session_state]
         for key in keys:
             self.save_data(key)
 
+    @METRICS.timed('data_manager_seconds', op='append_record')
     def append_record(self, session_state_key, record_dict):
         """
         Append a new record to a value stored in the session state. The value must be either a list or a DataFrame.
+        Inside a `batch` block the record is buffered and persisted when the block exits.
         """
+        if not isinstance(record_dict, dict):
+            raise ValueError(f"DataManager: The record_dict must be a dictionary")
+
+        if session_state_key in self._batches:
+            self._batches[session_state_key].append(record_dict)
+            return
+
         # Initialisiere den Schlüssel im Session-State, falls er nicht existiert
         if session_state_key not in st.session_state:
-            st.session_state[session_state_key] = pd.DataFrame(columns=["datum_zeit", "blutzuckerwert", "zeitpunkt"])
+            st.session_state[session_state_key] = self._get_schema(session_state_key).empty_frame()
             st.warning(f"Session state key '{session_state_key}' wurde initialisiert.")
 
-        # Registriere den Schlüssel in data_reg, falls er nicht existiert
-        if session_state_key not in self.data_reg:
-            self.app_data_reg[session_state_key] = f"{session_state_key}.csv"
-
-        # Füge den neuen Datensatz hinzu
         data_value = st.session_state[session_state_key]
-        
-        if not isinstance(record_dict, dict):
-            raise ValueError(f"DataManager: The record_dict must be a dictionary")
-        
         if isinstance(data_value, pd.DataFrame):
-            data_value = pd.concat([data_value, pd.DataFrame([record_dict])], ignore_index=True)
-        elif isinstance(data_value, list):
-            data_value.append(record_dict)
-        else:
+            self.append_records(session_state_key, [record_dict])
+            return
+        elif not isinstance(data_value, list):
             raise ValueError(f"DataManager: The session state value for key '{session_state_key}' must be a DataFrame or a list")
-        
-        # Aktualisiere den Session-State und speichere die Daten
+
+        # Registriere den Schlüssel, falls er nicht existiert
+        self._entry(session_state_key)
+
+        # Füge den neuen Datensatz hinzu, aktualisiere den Session-State und speichere die Daten
+        data_value.append(record_dict)
         st.session_state[session_state_key] = data_value
+        self._bump_version(session_state_key)
         self.save_data(session_state_key)
+
+    @METRICS.timed('data_manager_seconds', op='append_records')
+    def append_records(self, session_state_key, records):
+        """
+        Append many records to a DataFrame stored in the session state with a single concat and a
+        single persistence call. For user data loaded with a time window, all records are stored but
+        only those inside the window are added to the session state.
+
+        Args:
+            session_state_key: Key of the DataFrame in the session state.
+            records: A DataFrame or an iterable of record dictionaries.
+        """
+        if isinstance(records, pd.DataFrame):
+            records_df = records
+        else:
+            records = list(records)
+            if not all(isinstance(record, dict) for record in records):
+                raise ValueError(f"DataManager: All records must be dictionaries")
+            records_df = pd.DataFrame.from_records(records)
+        if records_df.empty:
+            return
+
+        # Initialisiere den Schlüssel im Session-State, falls er nicht existiert
+        if session_state_key not in st.session_state:
+            st.session_state[session_state_key] = self._get_schema(session_state_key).empty_frame()
+            st.warning(f"Session state key '{session_state_key}' wurde initialisiert.")
+
+        # Registriere den Schlüssel, falls er nicht existiert
+        entry = self._entry(session_state_key)
+
+        data_value = st.session_state[session_state_key]
+        if not isinstance(data_value, pd.DataFrame):
+            raise ValueError(f"DataManager: The session state value for key '{session_state_key}' must be a DataFrame")
+        unknown_columns = set(records_df.columns) - set(data_value.columns)
+        if len(data_value.columns) and unknown_columns:
+            raise ValueError(f"DataManager: Unknown columns for key '{session_state_key}': {sorted(unknown_columns)}")
+
+        # Typen und Wertebereiche vektorisiert gegen das Schema prüfen
+        schema = entry.schema
+        records_df = schema.coerce(records_df)
+        if records_df.empty:
+            return
+
+        # Füge die neuen Datensätze hinzu, aktualisiere den Session-State und speichere die Daten;
+        # Datensätze ausserhalb des geladenen Zeitfensters werden nur gespeichert
+        visible_df = self._in_window(entry, records_df)
+        if not visible_df.empty:
+            frames = [frame for frame in (data_value, visible_df) if not frame.empty]
+            data_value = pd.concat(frames, ignore_index=True)
+            if not schema.matches(data_value):
+                data_value = schema.coerce(data_value, strict=False)
+            st.session_state[session_state_key] = data_value
+            self._bump_version(session_state_key)
+            self._share(session_state_key, publish=True)
+        # save_data verwirft Statistiken und Warnungen; hier werden sie laufend nachgeführt
+        sidecars = dict(entry.sidecars)
+        self._persist_new_rows(session_state_key, records_df)
+        entry.sidecars.update(sidecars)
+
+        if 'stats' in entry.sidecars:
+            if len(records_df) <= self.STATS_UPDATE_LIMIT:
+                self._update_statistics(entry, records_df.to_dict('records'))
+            else:
+                # Grosse Mengen: beim nächsten Zugriff vektorisiert neu aufbauen
+                del entry.sidecars['stats']
+        if 'alerts' in entry.sidecars:
+            if len(records_df) > self.STATS_UPDATE_LIMIT or \
+                    not self._update_alerts(entry, records_df.to_dict('records')):
+                del entry.sidecars['alerts']
+
+    def _in_window(self, entry, records_df):
+        """
+        Returns the records that fall into the loaded time window of partitioned user data, e.g.
+        to keep an import of years of history out of the session state.
+        """
+        window = entry.window
+        if window is None or (window['start'] is None and window['end'] is None):
+            return records_df
+        time_column = self._get_partitioned_store(entry.file_path).time_column
+        zeit = records_df[time_column]
+        mask = pd.Series(True, index=records_df.index)
+        if window['start'] is not None:
+            mask &= zeit >= pd.Timestamp(window['start'])
+        if window['end'] is not None:
+            mask &= zeit <= pd.Timestamp(window['end'])
+        return records_df if mask.all() else records_df[mask]
+
+    @staticmethod
+    def _with_file_schema(file_name, load_args):
+        """
+        Adds the schema registered for the file name (see `register_schema`) to the load arguments
+        unless the caller passed one, so registered tables are always loaded in their typed form.
+        """
+        schema = schema_for_file(file_name)
+        if schema is None or 'schema' in load_args:
+            return load_args
+        return {**load_args, 'schema': schema}
+
+    def _get_schema(self, session_state_key):
+        """
+        Returns the schema the key was loaded with (`schema=` load argument), or the glucose
+        schema for keys that were never loaded.
+        """
+        entry = self.entries.get(session_state_key)
+        return get_schema('glucose') if entry is None else entry.schema
+
+    @contextmanager
+    def batch(self, session_state_key):
+        """
+        Collects all `append_record` calls for the key and applies them with one `append_records`
+        call when the block exits. If the block raises, the collected records are discarded.
+
+            with data_manager.batch('data_df'):
+                for record in records:
+                    data_manager.append_record('data_df', record)
+        """
+        if session_state_key in self._batches:  # verschachtelte Blöcke gehören zum äusseren
+            yield
+            return
+
+        self._batches[session_state_key] = []
+        try:
+            yield
+        except BaseException:
+            self._batches.pop(session_state_key, None)
+            raise
+        records = self._batches.pop(session_state_key)
+        if records:
+            self.append_records(session_state_key, records)
+
+    def _persist_new_rows(self, session_state_key, new_rows_df):
+        """
+        Persists rows that were appended to a DataFrame in the session state, using the cheapest
+        write the storage layout allows.
+        """
+        if self.entries[session_state_key].partitioned:
+            self._append_partition(session_state_key, new_rows_df)
+        elif self.append_mode == 'segments':
+            self._append_segment(session_state_key, new_rows_df)
+        else:
+            self.save_data(session_state_key)
+
+    def _append_segment(self, session_state_key, record_df):
+        """
+        Persists new records as a segment; compaction is left to the next load.
+        """
+        file_path = self.entries[session_state_key].file_path
+        if self.sync_log is not None:
+            self._log_write('segment_append', file_path, record_df, session_state_key)
+            return
+        store = self._get_segment_store(file_path)
+        self._persist(f"{file_path}#{uuid.uuid4().hex}", lambda: store.append(record_df))
+
+    @staticmethod
+    def _compact_segments(store, load_args):
+        """
+        Compacts the segments of a store once they pass the threshold. Runs on the prefetch pool;
+        at most one compaction per base file runs at a time in this process.
+        """
+        key = (store.data_handler.root_path, store.base_path)
+        with _compactions_lock:
+            if key in _compactions:
+                return
+            _compactions.add(key)
+        try:
+            if store.needs_compaction():
+                store.compact(**load_args)
+        finally:
+            with _compactions_lock:
+                _compactions.discard(key)
+
+    def _append_partition(self, session_state_key, record_df):
+        """
+        Persists new records by rewriting only the month partitions they fall into.
+        """
+        file_path = self.entries[session_state_key].file_path
+        if self.sync_log is not None and self.database is None:
+            self._log_write('partition_append', file_path, record_df, session_state_key)
+            return
+        store = self._get_partitioned_store(file_path)
+        self._persist(f"{file_path}#{uuid.uuid4().hex}", lambda: store.append(record_df))
+
+    def _log_write(self, op, file_path, content, session_state_key, expected_version=None):
+        """
+        Commits a write to the local write-ahead log; the sync worker replays it via `_replay`.
+        """
+        self.sync_log.append(op, file_path, content,
+                             root=self.fs_root_folder, compression=self.fs_compression,
+                             load_args=self.entries[session_state_key].load_args,
+                             expected_version=expected_version)
+
+    @staticmethod
+    def _replay(fs, entry, content):
+        """
+        Applies a write-ahead log entry to the filesystem. Appends carry the entry id, so replaying
+        an entry that was already applied before a crash does not duplicate its records.
+        """
+        options = entry['options']
+        from utils.segment_store import SegmentStore
+        from utils.partitioned_store import PartitionedStore
+        dh = DataHandler(fs, options['root'], compression=options['compression'])
+        op, file_path = entry['op'], entry['target']
+        if op == 'save':
+            if isinstance(content, pd.DataFrame) and options.get('expected_version') is not None:
+                # Zusammenführen ist idempotent, ein erneutes Einspielen also unbedenklich
+                schema = get_schema(options['load_args'].get('schema', 'glucose'))
+                dh.save_merged(file_path, content, options['expected_version'], schema.merge,
+                               **options['load_args'])
+            else:
+                dh.save(file_path, content)
+        elif op == 'segment_append':
+            store = SegmentStore(dh, file_path)
+            # Vor dem Anhängen kompaktieren: so enthält die Basisdatei nur bereits quittierte Einträge
+            if store.needs_compaction():
+                store.compact(**options['load_args'])
+            store.append(content, segment_id=entry['id'], timestamp_ns=entry['created_ns'])
+        elif op == 'segment_replace':
+            SegmentStore(dh, file_path).replace(content)
+        elif op == 'partition_append':
+            # Auch nach dem Schlüssel abgleichen: der Index vermerkt die ID erst nach der Partition
+            schema = options['load_args'].get('schema')
+            PartitionedStore(dh, file_path).append(content, append_id=entry['id'],
+                                                   key=get_schema(schema).key if schema else None)
+        elif op == 'partition_write':
+            PartitionedStore(dh, file_path).write(content)
+        else:
+            raise ValueError(f"DataManager: Unknown write-ahead log operation: {op}")
+
+    def _merge_pending(self, file_path, data, columns=None, ops=None):
+        """
+        Applies write-ahead log entries that are not synced yet to data loaded from `file_path`.
+        `ops` restricts the applied entries to these operations.
+        """
+        if self.sync_log is None:
+            return data
+        for entry in self.sync_log.pending(file_path):
+            if entry['options']['root'] != self.fs_root_folder or (ops is not None and entry['op'] not in ops):
+                continue
+            content = self.sync_log.content(entry)
+            if content is None:  # seit dem Auflisten eingespielt
+                continue
+            if columns is not None and isinstance(content, pd.DataFrame):
+                content = content[columns]
+            if entry['op'] in ('save', 'segment_replace'):
+                data = content
+                continue
+            if entry['op'] == 'partition_write' and data is not None and not data.empty:
+                # Nur die Monate im geschriebenen Fenster ersetzen
+                time_column = self._get_partitioned_store(file_path).time_column
+                months = data[time_column].dt.strftime('%Y-%m')
+                data = data[~months.isin(content[time_column].dt.strftime('%Y-%m'))]
+            frames = [frame for frame in (data, content) if frame is not None and not frame.empty]
+            data = pd.concat(frames, ignore_index=True) if frames else content
+        return data
+
+    def _persist(self, write_key, job):
+        """
+        Runs a save job directly or hands it to the write-behind queue. Jobs with the same
+        `write_key` replace each other while they are still queued.
+        """
+        if self.write_queue is None:
+            job()
+        else:
+            self.write_queue.submit(write_key, job)
+
+    @property
+    def has_pending_writes(self):
+        """
+        True while the write-behind queue or the write-ahead log still hold data of this session
+        that is not on the filesystem yet.
+        """
+        if self.sync_log is not None:
+            # Das Log ist prozessweit geteilt: nur Einträge der eigenen Dateien zählen
+            targets = {entry.file_path for entry in self.entries.values()}
+            if any(entry['options']['root'] == self.fs_root_folder and entry['target'] in targets
+                   for entry in self.sync_log.pending()):
+                return True
+        return self.write_queue is not None and self.write_queue.has_pending
+
+    @property
+    def write_errors(self):
+        """
+        Errors of failed write-behind saves of this session by write key, empty if all succeeded.
+        The saves are retried by `retry_failed_writes` and `flush`.
+        """
+        return dict(self.write_queue.errors) if self.write_queue is not None else {}
+
+    def retry_failed_writes(self):
+        """
+        Queues the failed write-behind saves again.
+
+        Returns:
+            int: Number of saves queued again.
+        """
+        return self.write_queue.retry() if self.write_queue is not None else 0
+
+    @property
+    def sync_error(self):
+        """
+        The last error of the write-ahead log sync, None while syncing works.
+        """
+        return self.sync_log.last_error if self.sync_log is not None else None
+
+    def flush(self, timeout=None):
+        """
+        Uploads all queued saves and waits until they are done. Write-ahead log entries are
+        already durable; they are only waited for until the next sync attempt fails.
+
+        Returns:
+            bool: True if nothing is pending anymore.
+        """
+        done = True
+        if self.write_queue is not None:
+            done = self.write_queue.flush(timeout)
+        if self.sync_log is not None:
+            done = self.sync_log.flush(timeout) and done
+        return done
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# Mögliche Bucket-Grössen, von fein nach grob
+RESOLUTIONS = ["5min", "15min", "30min", "1h", "3h", "6h", "12h", "1D", "7D", "30D"]
+
+
+def lttb(x, y, threshold):
+    """
+    Reduziert eine Zeitreihe mit dem Largest-Triangle-Three-Buckets-Verfahren.
+
+    Der erste und letzte Punkt bleiben erhalten; aus jedem Zwischen-Bucket wird der Punkt
+    gewählt, der mit dem zuvor gewählten Punkt und dem Mittel des nächsten Buckets das
+    grösste Dreieck bildet. Spitzen und Täler bleiben so sichtbar.
+
+    Args:
+        x: Aufsteigend sortierte x-Werte (numerisch).
+        y: Die zugehörigen y-Werte.
+        threshold: Anzahl der Punkte im Ergebnis.
+
+    Returns:
+        np.ndarray: Die Indizes der ausgewählten Punkte.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def choose_resolution(start, end, max_points=1000):
+    """
+    Wählt die feinste Bucket-Grösse, bei der das Zeitfenster höchstens ``max_points`` Buckets ergibt.
+
+    Args:
+        start: Beginn des sichtbaren Zeitfensters.
+        end: Ende des sichtbaren Zeitfensters.
+        max_points: Maximale Anzahl Punkte im Diagramm.
+
+    Returns:
+        str: Eine Frequenz aus ``RESOLUTIONS``.
+    """
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for resolution in RESOLUTIONS:
+        if span / pd.Timedelta(resolution) <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def bucket_aggregate(series, resolution):
+    """
+    Fasst eine Zeitreihe vektorisiert zu Buckets mit Mittel-, Minimal- und Maximalwert zusammen.
+
+    Args:
+        series: Werte mit DatetimeIndex.
+        resolution: Die Bucket-Grösse, z. B. "1h".
+
+    Returns:
+        pd.DataFrame: Spalten "Mittelwert", "Minimum", "Maximum"; leere Buckets entfallen.
+    """
+    grouped = series.resample(resolution)
+    return pd.DataFrame({
+        "Mittelwert": grouped.mean(),
+        "Minimum": grouped.min(),
+        "Maximum": grouped.max(),
+    }).dropna()
+
+
+def downsample(data_df, start=None, end=None, max_points=1000, method="lttb",
+               time_column="datum_zeit", value_column="blutzuckerwert"):
+    """
+    Bereitet die Werte eines Zeitfensters für ein Diagramm mit höchstens ``max_points`` Punkten auf.
+
+    Args:
+        data_df: DataFrame mit Zeit- und Wertspalte.
+        start: Beginn des Zeitfensters, None für den ersten Wert.
+        end: Ende des Zeitfensters, None für den letzten Wert.
+        max_points: Maximale Anzahl Punkte.
+        method: "lttb" für eine formerhaltende Auswahl einzelner Werte, "buckets" für
+            Mittel-/Min-/Max-Bänder pro Zeit-Bucket.
+
+    Returns:
+        pd.DataFrame: Mit DatetimeIndex; bei "lttb" eine Spalte ``value_column``, bei
+        "buckets" die Spalten aus ``bucket_aggregate``.
+    """
+    series = (pd.Series(pd.to_numeric(data_df[value_column], errors="coerce").to_numpy(dtype=float),
+                        index=pd.DatetimeIndex(pd.to_datetime(data_df[time_column])))
+              .dropna()
+              .sort_index())
+    series = series.loc[start:end]
+    if series.empty or len(series) <= max_points:
+        return series.rename(value_column).to_frame()
+
+    if method == "buckets":
+        resolution = choose_resolution(series.index[0], series.index[-1], max_points)
+        return bucket_aggregate(series, resolution)
+    indices = lttb(series.index.asi8, series.to_numpy(), max_points)
+    return series.iloc[indices].rename(value_column).to_frame()
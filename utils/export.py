@@ -0,0 +1,344 @@
+import os
+import hashlib
+import posixpath
+import tempfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from utils.statistics import GlucoseStatistics, ALLE
+from utils.table_view import SPALTEN
+from utils.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Format -> (Dateiendung, MIME-Typ)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "pdf": (".pdf", "application/pdf"),
+}
+EXCEL_MAX_ROWS = 1_048_575  # Datenzeilen pro Tabellenblatt (ohne Kopfzeile)
+PDF_ROWS_PER_COLUMN = 80
+PDF_COLUMNS = 2  # Spalten mit Werten pro Seite
+A4 = (8.27, 11.69)  # Zoll
+
+WARTEND, LAEUFT, FERTIG, FEHLER = "wartend", "läuft", "fertig", "fehler"
+
+
+def export_file_name(name, fmt, version):
+    """
+    Returns:
+        str: Der Dateiname eines Exports; er enthält einen Hash der Datenversion, sodass
+        jede Version nur einmal exportiert wird.
+    """
+    digest = hashlib.sha1(str(version).encode("utf-8")).hexdigest()[:12]
+    return f"{name}_{digest}{FORMATS[fmt][0]}"
+
+
+def _table(chunk):
+    """
+    Wählt die exportierten Spalten aus und benennt sie mit ihren Anzeigenamen.
+    """
+    columns = [column for column in SPALTEN if column in chunk.columns]
+    return chunk[columns].rename(columns=SPALTEN)
+
+
+def _summary_rows(stats):
+    """
+    Returns:
+        list: Kennzahlen über die ganze Historie, gesamt und pro Messzeitpunkt.
+    """
+    zeitpunkte = sorted({key.split("|")[2] for key in stats.groups if key.startswith("gesamt|")} - {ALLE})
+    rows = []
+    for zeitpunkt in [ALLE] + zeitpunkte:
+        kennzahlen = stats.summary("gesamt", "", zeitpunkt)
+        if kennzahlen is None:
+            continue
+        rows.append({
+            "Zeitpunkt": zeitpunkt,
+            "Anzahl": kennzahlen["anzahl"],
+            "Mittelwert (mg/dL)": round(kennzahlen["mittelwert"], 1),
+            "Std.-Abw.": round(kennzahlen["standardabweichung"], 1),
+            "Min": kennzahlen["minimum"],
+            "Max": kennzahlen["maximum"],
+            "Im Zielbereich": f"{kennzahlen['zeit_im_zielbereich']:.0%}",
+            "HbA1c (geschätzt)": f"{kennzahlen['hba1c']:.1f} %",
+        })
+    return rows
+
+
+def _write_csv(chunks, local_path, job, title):
+    with open(local_path, "w", encoding="utf-8", newline="") as f:
+        header = True
+        for chunk in chunks():
+            _table(chunk).to_csv(f, index=False, header=header)
+            header = False
+            job.rows += len(chunk)
+        if header:
+            pd.DataFrame(columns=list(SPALTEN.values())).to_csv(f, index=False)
+
+
+def _write_xlsx(chunks, local_path, job, title):
+    from openpyxl import Workbook
+
+    # Im write_only-Modus landen die Zeilen direkt in temporären Dateien statt im Speicher
+    workbook = Workbook(write_only=True)
+    stats = GlucoseStatistics()
+    sheet, sheet_rows = None, EXCEL_MAX_ROWS
+    for chunk in chunks():
+        stats.merge(GlucoseStatistics.from_frame(chunk))
+        table = _table(chunk).astype(object)
+        for row in table.where(table.notna(), None).itertuples(index=False):
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet(f"Werte {len(workbook.worksheets) + 1}")
+                sheet.append(list(table.columns))
+                sheet_rows = 0
+            sheet.append(list(row))
+            sheet_rows += 1
+        job.rows += len(chunk)
+    if sheet is None:
+        workbook.create_sheet("Werte 1").append(list(SPALTEN.values()))
+
+    summary = workbook.create_sheet("Zusammenfassung", 0)
+    summary.append([title])
+    summary.append([])
+    rows = _summary_rows(stats)
+    if rows:
+        summary.append(list(rows[0]))
+        for row in rows:
+            summary.append(list(row.values()))
+    else:
+        summary.append(["Keine Werte vorhanden."])
+    workbook.save(local_path)
+
+
+def _pdf_table(figure, rect, columns, rows, font_size=8):
+    axes = figure.add_axes(rect)
+    axes.axis("off")
+    if rows:
+        table = axes.table(cellText=rows, colLabels=columns, loc="upper center", cellLoc="left")
+        table.auto_set_font_size(False)
+        table.set_fontsize(font_size)
+    return axes
+
+
+def _write_pdf(chunks, local_path, job, title):
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    # Erster Durchgang: Kennzahlen für die Zusammenfassung am Anfang des Berichts
+    stats = GlucoseStatistics()
+    for chunk in chunks():
+        stats.merge(GlucoseStatistics.from_frame(chunk))
+
+    # Die PDF-Standardschriften sparen das Einbetten und Setzen jedes einzelnen Zeichens
+    with matplotlib.rc_context({"pdf.use14corefonts": True}), PdfPages(local_path) as pdf:
+        figure = Figure(figsize=A4)
+        figure.text(0.08, 0.95, title, fontsize=16, weight="bold")
+        tage = stats.periods("tag")
+        if tage:
+            erster, letzter = (pd.Timestamp(tag).strftime("%d.%m.%Y") for tag in (tage[0], tage[-1]))
+            figure.text(0.08, 0.92, f"{erster} – {letzter} · {stats.count} Werte", fontsize=10)
+        rows = _summary_rows(stats)
+        if rows:
+            _pdf_table(figure, [0.05, 0.68, 0.9, 0.2], list(rows[0]), [list(row.values()) for row in rows], 7)
+            wochen = stats.periods("woche")
+            mittelwerte = [stats.summary("woche", woche)["mittelwert"] for woche in wochen]
+            axes = figure.add_axes([0.1, 0.3, 0.85, 0.3])
+            axes.plot(range(len(wochen)), mittelwerte, marker="o", markersize=2)
+            axes.axhspan(*GlucoseStatistics.TARGET_RANGE, color="green", alpha=0.1)
+            axes.set_title("Wochenmittelwert (mg/dL)", fontsize=10)
+            step = max(1, len(wochen) // 8)
+            axes.set_xticks(range(0, len(wochen), step))
+            axes.set_xticklabels(wochen[::step], fontsize=7, rotation=30)
+        else:
+            figure.text(0.08, 0.85, "Keine Werte vorhanden.", fontsize=10)
+        pdf.savefig(figure)
+
+        # Zweiter Durchgang: die Werte seitenweise als Textblock, jede Seite wird sofort geschrieben
+        header = f"{'Datum/Zeit':<17} {'mg/dL':>5}  Zeitpunkt"
+        page = []
+
+        def write_page():
+            figure = Figure(figsize=A4)
+            figure.text(0.08, 0.96, title, fontsize=9)
+            for i in range(PDF_COLUMNS):
+                lines = page[i * PDF_ROWS_PER_COLUMN:(i + 1) * PDF_ROWS_PER_COLUMN]
+                if lines:
+                    figure.text(0.06 + i * 0.47, 0.93, "\n".join([header, "-" * len(header)] + lines),
+                                family="monospace", fontsize=7, va="top")
+            pdf.savefig(figure)
+            page.clear()
+
+        for chunk in chunks():
+            zeiten = pd.to_datetime(chunk["datum_zeit"]).dt.strftime("%d.%m.%Y %H:%M").fillna("")
+            werte = pd.to_numeric(chunk["blutzuckerwert"], errors="coerce")
+            zeitpunkte = chunk["zeitpunkt"].astype(object).fillna("")
+            for zeit, wert, zeitpunkt in zip(zeiten, werte, zeitpunkte):
+                page.append(f"{zeit:<17} {'' if pd.isna(wert) else f'{wert:g}':>5}  {zeitpunkt}")
+                if len(page) == PDF_COLUMNS * PDF_ROWS_PER_COLUMN:
+                    write_page()
+            job.rows += len(chunk)
+        if page:
+            write_page()
+
+
+WRITERS = {"csv": _write_csv, "xlsx": _write_xlsx, "pdf": _write_pdf}
+
+
+class ExportJob:
+    """
+    Zustand eines Exports.
+
+    ``status`` ist "wartend", "läuft", "fertig" oder "fehler"; ``rows`` zählt die bereits
+    geschriebenen Datensätze und ``error`` hält die Fehlermeldung eines fehlgeschlagenen Exports.
+    """
+
+    def __init__(self, data_handler, path, fmt, version):
+        """
+        Args:
+            data_handler: Der DataHandler, relativ zu dessen Root ``path`` liegt.
+            path: Der relative Pfad der exportierten Datei.
+            fmt: "csv", "xlsx" oder "pdf".
+            version: Die exportierte Datenversion.
+        """
+        self.data_handler = data_handler
+        self.path = path
+        self.fmt = fmt
+        self.version = version
+        self.status = WARTEND
+        self.rows = 0
+        self.error = None
+        self.future = None
+
+    @property
+    def done(self):
+        return self.status in (FERTIG, FEHLER)
+
+    @property
+    def file_name(self):
+        return posixpath.basename(self.path)
+
+    @property
+    def mime(self):
+        return FORMATS[self.fmt][1]
+
+    def read(self):
+        """
+        Returns:
+            bytes: Der Inhalt der fertigen Datei, z. B. für ``st.download_button``.
+        """
+        return self.data_handler.read_binary(self.path)
+
+
+class Exporter:
+    """
+    Erstellt Exporte (CSV, Excel, PDF-Bericht) in einem Thread-Pool.
+
+    Die Datensätze werden stückweise gelesen und direkt in eine lokale temporäre Datei
+    geschrieben, der Speicherbedarf hängt damit nur von der Stückgrösse ab und nicht von der
+    Länge der Historie. Die fertige Datei wird in ein Verzeichnis des Benutzers hochgeladen;
+    ihr Name enthält die Datenversion, sodass ein erneuter Export derselben Version die
+    bestehende Datei wiederverwendet. Ältere Exporte desselben Formats werden danach gelöscht.
+    """
+
+    MAX_ATTEMPTS = 3  # Neustarts, wenn sich die Daten während des Exports ändern
+
+    def __init__(self, max_workers=2, chunksize=10_000):
+        """
+        Args:
+            max_workers: Maximale Anzahl gleichzeitiger Exporte.
+            chunksize: Anzahl Datensätze, die gleichzeitig gelesen werden.
+        """
+        self.chunksize = chunksize
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, data_handler, folder, name, fmt, chunks, version, title=""):
+        """
+        Startet einen Export, sofern für die aktuelle Datenversion nicht schon einer läuft
+        oder vorhanden ist.
+
+        Args:
+            data_handler: Der DataHandler, relativ zu dessen Root ``folder`` liegt.
+            folder: Das Zielverzeichnis (z. B. ``user_data_x/exports``).
+            name: Der Dateiname ohne Endung; die Datenversion wird angehängt.
+            fmt: "csv", "xlsx" oder "pdf".
+            chunks: Aufruf ``chunks(chunksize)``, der die Datensätze stückweise liefert. Er darf
+                nicht auf ``st.session_state`` zugreifen und wird für den PDF-Bericht zweimal
+                aufgerufen.
+            version: Aufruf ohne Argumente, der die aktuelle Version der Daten liefert.
+            title: Der Titel im Bericht.
+
+        Returns:
+            ExportJob: Der laufende, wartende oder bereits fertige Export.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Nicht unterstütztes Exportformat: {fmt}")
+        current = version()
+        key = (data_handler.root_path, folder, name, fmt)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and (not job.done or (job.version == current and job.status == FERTIG)):
+                return job
+            job = ExportJob(data_handler, posixpath.join(folder, export_file_name(name, fmt, current)),
+                            fmt, current)
+            self._jobs[key] = job
+        if data_handler.exists(job.path):
+            job.status = FERTIG
+            return job
+        job.future = self._pool.submit(self._run, job, folder, name, chunks, version, title)
+        return job
+
+    def job(self, data_handler, folder, name, fmt):
+        """
+        Returns:
+            ExportJob: Der zuletzt gestartete Export dieser Datei und dieses Formats, oder None.
+        """
+        with self._lock:
+            return self._jobs.get((data_handler.root_path, folder, name, fmt))
+
+    def running(self):
+        """
+        Returns:
+            int: Anzahl der wartenden und laufenden Exporte.
+        """
+        with self._lock:
+            return sum(not job.done for job in self._jobs.values())
+
+    def _run(self, job, folder, name, chunks, version, title):
+        try:
+            with METRICS.timer("export_seconds", fmt=job.fmt):
+                self._export(job, folder, name, chunks, version, title)
+            job.status = FERTIG
+        except Exception as e:
+            logger.exception(f"Export {job.path} fehlgeschlagen")
+            job.error = str(e)
+            job.status = FEHLER
+
+    def _export(self, job, folder, name, chunks, version, title):
+        with tempfile.TemporaryDirectory(prefix="export_") as tmp_dir:
+            local_path = os.path.join(tmp_dir, "export" + FORMATS[job.fmt][0])
+            for attempt in range(self.MAX_ATTEMPTS):
+                job.status = LAEUFT
+                job.rows = 0
+                WRITERS[job.fmt](lambda: chunks(self.chunksize), local_path, job, title)
+                current = version()
+                if current == job.version or attempt == self.MAX_ATTEMPTS - 1:
+                    break
+                # Während des Lesens geändert: mit der neuen Version wiederholen
+                logger.info(f"Daten für {job.path} während des Exports geändert, starte neu")
+                job.version = current
+                job.path = posixpath.join(folder, export_file_name(name, job.fmt, current))
+            job.data_handler.upload(local_path, job.path)
+
+        prefix, ext = f"{name}_", FORMATS[job.fmt][0]
+        for file_name in job.data_handler.list_files(folder):
+            if file_name.startswith(prefix) and file_name.endswith(ext) and file_name != job.file_name:
+                try:
+                    job.data_handler.remove(posixpath.join(folder, file_name))
+                except FileNotFoundError:
+                    pass
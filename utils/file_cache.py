@@ -0,0 +1,390 @@
+import io
+import os
+import atexit
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from utils.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+def file_validator(info):
+    """
+    Bildet aus den Metadaten einer Datei einen Vergleichswert, der sich bei jeder Änderung ändert.
+
+    Args:
+        info: Das Info-Dictionary des Dateisystems (z. B. ``fs.info(path)``).
+
+    Returns:
+        str: ETag bzw. Änderungszeit und Grösse, oder None, wenn keines davon bekannt ist.
+    """
+    if info.get("etag"):
+        return f"etag:{info['etag']}"
+    for key in ("modified", "mtime", "last_modified", "LastModified", "created"):
+        if info.get(key) is not None:
+            return f"{key}:{info[key]}:{info.get('size')}"
+    return None
+
+
+def move_replace(filesystem, source, target):
+    """
+    Ersetzt ``target`` in einem Schritt durch ``source``. Hüllen wie ``CachedFileSystem``
+    leiten den Aufruf über ihre eigene ``move_replace``-Methode weiter.
+
+    Args:
+        filesystem: Das Dateisystem oder eine Hülle darum.
+        source: Der vollständige Pfad der zu verschiebenden Datei.
+        target: Der vollständige Zielpfad; eine vorhandene Datei wird überschrieben.
+    """
+    method = getattr(type(filesystem), "move_replace", None)
+    if method is not None:
+        method(filesystem, source, target)
+        return
+    client = getattr(filesystem, "client", None)
+    if client is not None and hasattr(client, "move"):
+        # WebDAV: serverseitiges MOVE mit Überschreiben statt Kopieren und Löschen
+        client.move(source, target, overwrite=True)
+    else:
+        filesystem.mv(source, target)
+
+
+class DiskCache:
+    """
+    Begrenzter Dateicache auf der lokalen Festplatte mit LRU-Verdrängung.
+
+    Jeder Eintrag speichert die Bytes einer entfernten Datei zusammen mit ihrem
+    Vergleichswert (ETag oder Änderungszeit). Ein Treffer liegt nur vor, wenn der
+    Vergleichswert noch mit dem der entfernten Datei übereinstimmt.
+
+    Der Index wird höchstens alle ``index_flush_interval`` Sekunden sowie beim Beenden
+    des Prozesses geschrieben. Da der Dateiname eines Eintrags den Vergleichswert enthält,
+    verweist ein nach einem Absturz veralteter Index nie auf Bytes eines anderen Stands;
+    nicht mehr referenzierte Dateien werden beim nächsten Start gelöscht, sofern sie älter
+    als ``ORPHAN_GRACE`` sind. Jüngere Dateien können einem anderen Prozess gehören, der
+    dasselbe Verzeichnis verwendet und seinen Index noch nicht geschrieben hat.
+    """
+
+    INDEX_FILE = "index.json"
+    ORPHAN_GRACE = 3600  # Sekunden, die eine nicht referenzierte Datei vor dem Löschen alt sein muss
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024, index_flush_interval=5.0):
+        """
+        Initialisiert den Cache.
+
+        Args:
+            cache_dir: Lokales Verzeichnis für die Cache-Dateien.
+            max_bytes: Maximale Gesamtgrösse des Caches in Bytes.
+            index_flush_interval: Mindestabstand in Sekunden zwischen zwei Schreibvorgängen
+                des Index.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_flush_interval = index_flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._index_written = time.monotonic()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = OrderedDict(self._read_index())
+        self._remove_orphans()
+        atexit.register(self.flush)
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self):
+        tmp_path = os.path.join(self.cache_dir, self.INDEX_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, os.path.join(self.cache_dir, self.INDEX_FILE))
+        self._dirty = False
+        self._index_written = time.monotonic()
+
+    def _index_changed(self):
+        self._dirty = True
+        if time.monotonic() - self._index_written >= self.index_flush_interval:
+            self._write_index()
+
+    def flush(self):
+        """
+        Schreibt den Index, falls er seit dem letzten Schreiben geändert wurde.
+        """
+        with self._lock:
+            if self._dirty:
+                self._write_index()
+
+    def _remove_orphans(self):
+        referenced = {os.path.basename(self._blob_path(key, entry["validator"]))
+                      for key, entry in self._index.items()}
+        cutoff = time.time() - self.ORPHAN_GRACE
+        for name in os.listdir(self.cache_dir):
+            if name != self.INDEX_FILE and name not in referenced:
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _blob_path(self, key, validator):
+        return os.path.join(self.cache_dir, hashlib.sha1(f"{key}\0{validator}".encode("utf-8")).hexdigest())
+
+    @property
+    def size(self):
+        """
+        Returns:
+            int: Die aktuelle Gesamtgrösse aller Einträge in Bytes.
+        """
+        with self._lock:
+            return sum(entry["size"] for entry in self._index.values())
+
+    def get(self, key, validator):
+        """
+        Liest einen Eintrag, sofern er zum Vergleichswert passt.
+
+        Args:
+            key: Der Pfad der entfernten Datei.
+            validator: Der aktuelle Vergleichswert der entfernten Datei.
+
+        Returns:
+            bytes: Der Inhalt oder None bei einem Cache-Miss.
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if validator is None or entry is None or entry["validator"] != validator:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        # Ausserhalb der Sperre lesen, damit grosse Dateien andere Zugriffe nicht blockieren;
+        # ``put`` ersetzt Dateien nur vollständig, verdrängte fehlen höchstens
+        try:
+            with open(self._blob_path(key, validator), "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                entry = self._index.get(key)
+                if entry is not None and entry["validator"] == validator:
+                    del self._index[key]
+                    self._index_changed()
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, validator, data):
+        """
+        Speichert einen Eintrag und verdrängt bei Bedarf die am längsten unbenutzten.
+
+        Args:
+            key: Der Pfad der entfernten Datei.
+            validator: Der Vergleichswert der entfernten Datei.
+            data: Der Inhalt als Bytes.
+        """
+        if validator is None or len(data) > self.max_bytes:
+            self.invalidate(key)
+            return
+        path = self._blob_path(key, validator)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            previous = self._index.get(key)
+            os.replace(tmp_path, path)
+            if previous is not None and previous["validator"] != validator:
+                self._remove_blob(key, previous["validator"])
+            self._index[key] = {"validator": validator, "size": len(data)}
+            self._index.move_to_end(key)
+            self._evict()
+            self._index_changed()
+
+    def invalidate(self, key):
+        """
+        Entfernt einen Eintrag aus dem Cache.
+
+        Args:
+            key: Der Pfad der entfernten Datei.
+        """
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry is None:
+                return
+            self._remove_blob(key, entry["validator"])
+            self._index_changed()
+
+    def _remove_blob(self, key, validator):
+        try:
+            os.remove(self._blob_path(key, validator))
+        except OSError:
+            pass
+
+    def _evict(self):
+        total = sum(entry["size"] for entry in self._index.values())
+        while total > self.max_bytes and self._index:
+            key, entry = self._index.popitem(last=False)
+            total -= entry["size"]
+            self._remove_blob(key, entry["validator"])
+
+    def stats(self):
+        """
+        Returns:
+            dict: Treffer, Fehlschläge, Anzahl Einträge und Gesamtgrösse.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._index), "bytes": self.size}
+
+
+class _TeeWriter(io.RawIOBase):
+    """
+    Schreibt in die entfernte Datei und sammelt die Bytes für den Cache.
+    """
+
+    def __init__(self, cached_fs, path, remote_file):
+        self._cached_fs = cached_fs
+        self._path = path
+        self._remote_file = remote_file
+        self._buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._remote_file.write(data)
+        self._buffer.write(data)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self._remote_file.close()
+        self._cached_fs._store_written(self._path, self._buffer.getvalue())
+        super().close()
+
+
+class CachedFileSystem:
+    """
+    Lese-Cache vor einem fsspec-Dateisystem.
+
+    Dateien werden beim Lesen gegen den ETag bzw. die Änderungszeit der entfernten Datei
+    geprüft und bei unverändertem Stand aus dem lokalen ``DiskCache`` geliefert. Die
+    Metadaten selbst werden für ``info_ttl`` Sekunden gemerkt, damit ``exists()`` und das
+    folgende ``open()`` zusammen nur eine Abfrage kosten. Schreibvorgänge aktualisieren
+    den Cache.
+
+    Änderungen eines anderen Prozesses oder Servers sind dadurch bei ``exists()`` und
+    beim Lesen bis zu ``info_ttl`` Sekunden lang nicht sichtbar. Versionsprüfungen
+    (``DataHandler.version`` und damit das bedingte Speichern) verwerfen die gemerkten
+    Metadaten über ``invalidate_info`` vorher und sehen immer den aktuellen Stand. Alle
+    anderen Methoden werden an das darunterliegende Dateisystem weitergereicht.
+    """
+
+    def __init__(self, filesystem, cache, info_ttl=2.0):
+        """
+        Initialisiert den Cache-Wrapper.
+
+        Args:
+            filesystem: Das entfernte fsspec-Dateisystem.
+            cache: Der DiskCache für die Dateiinhalte.
+            info_ttl: Sekunden, für die Metadaten wiederverwendet werden; so lange können
+                Änderungen anderer Prozesse beim Lesen unbemerkt bleiben. 0 deaktiviert das.
+        """
+        self.filesystem = filesystem
+        self.cache = cache
+        self.info_ttl = info_ttl
+        self._infos = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.filesystem, name)
+
+    def invalidate_info(self, path):
+        with self._lock:
+            self._infos.pop(path, None)
+
+    def info(self, path, **kwargs):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._infos.get(path)
+        if cached is not None and now - cached[0] < self.info_ttl:
+            METRICS.inc("fs_info_cache", result="hit")
+            info = cached[1]
+        else:
+            METRICS.inc("fs_info_cache", result="miss")
+            try:
+                info = self.filesystem.info(path, **kwargs)
+            except FileNotFoundError:
+                info = None
+            with self._lock:
+                self._infos[path] = (now, info)
+        if info is None:
+            raise FileNotFoundError(path)
+        return info
+
+    def exists(self, path, **kwargs):
+        try:
+            self.info(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _read_bytes(self, path):
+        validator = file_validator(self.info(path))
+        data = self.cache.get(path, validator)
+        if data is None:
+            with self.filesystem.open(path, "rb") as f:
+                data = f.read()
+            self.cache.put(path, validator, data)
+        return data
+
+    def _store_written(self, path, data):
+        self.invalidate_info(path)
+        try:
+            validator = file_validator(self.info(path))
+        except FileNotFoundError:
+            validator = None
+        self.cache.put(path, validator, data)
+
+    def open(self, path, mode="rb", **kwargs):
+        if "r" in mode:
+            f = io.BytesIO(self._read_bytes(path))
+        elif "w" in mode:
+            self.invalidate_info(path)
+            f = io.BufferedWriter(_TeeWriter(self, path, self.filesystem.open(path, "wb", **kwargs)))
+        else:
+            return self.filesystem.open(path, mode, **kwargs)
+        if "b" in mode:
+            return f
+        return io.TextIOWrapper(f, encoding="utf-8")
+
+    def mv(self, path1, path2, *args, **kwargs):
+        self.filesystem.mv(path1, path2, *args, **kwargs)
+        self._moved(path1, path2)
+
+    def move_replace(self, path1, path2):
+        move_replace(self.filesystem, path1, path2)
+        self._moved(path1, path2)
+
+    def _moved(self, path1, path2):
+        self.invalidate_info(path1)
+        self.invalidate_info(path2)
+        self.cache.invalidate(path1)
+        self.cache.invalidate(path2)
+
+    def rm(self, path, *args, **kwargs):
+        self.filesystem.rm(path, *args, **kwargs)
+        self.invalidate_info(path)
+        self.cache.invalidate(path)
+
+    def mkdirs(self, path, *args, **kwargs):
+        self.filesystem.mkdirs(path, *args, **kwargs)
+        self.invalidate_info(path)
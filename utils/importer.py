@@ -0,0 +1,157 @@
+import io
+import logging
+import numpy as np
+import pandas as pd
+from utils.schema import GLUCOSE_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+MMOL_TO_MGDL = 18.016
+
+# Bekannte Exportformate: Zeitspalte, mögliche Wertspalten und deren Einheit
+EXPORT_FORMATS = [
+    {
+        "name": "FreeStyle Libre",
+        "time_column": ["Gerätezeitstempel", "Device Timestamp"],
+        "value_columns": {
+            "Glukosewert-Verlauf mg/dL": 1.0, "Glukose-Scan mg/dL": 1.0,
+            "Historic Glucose mg/dL": 1.0, "Scan Glucose mg/dL": 1.0,
+            "Glukosewert-Verlauf mmol/L": MMOL_TO_MGDL, "Glukose-Scan mmol/L": MMOL_TO_MGDL,
+            "Historic Glucose mmol/L": MMOL_TO_MGDL, "Scan Glucose mmol/L": MMOL_TO_MGDL,
+        },
+        "dayfirst": True,
+    },
+    {
+        "name": "Dexcom",
+        "time_column": ["Timestamp (YYYY-MM-DDThh:mm:ss)", "Zeitstempel (JJJJ-MM-TTThh:mm:ss)"],
+        "value_columns": {
+            "Glucose Value (mg/dL)": 1.0, "Glukosewert (mg/dl)": 1.0, "Glukosewert (mg/dL)": 1.0,
+            "Glucose Value (mmol/L)": MMOL_TO_MGDL, "Glukosewert (mmol/l)": MMOL_TO_MGDL,
+        },
+        "dayfirst": False,
+    },
+    {
+        "name": "Blutzucker-Tracker",
+        "time_column": ["datum_zeit"],
+        "value_columns": {"blutzuckerwert": 1.0},
+        "dayfirst": False,
+    },
+]
+
+SENSOR_ZEITPUNKT = "Sensor"
+
+
+def detect_format(header_lines):
+    """
+    Erkennt das Exportformat anhand der ersten Zeilen einer CSV-Datei.
+
+    Args:
+        header_lines: Die ersten Zeilen der Datei als Text.
+
+    Returns:
+        tuple: (Formatbeschreibung, Anzahl zu überspringender Zeilen, Trennzeichen)
+
+    Raises:
+        ValueError: Wenn keines der bekannten Formate passt.
+    """
+    for row, line in enumerate(header_lines):
+        delimiter = ";" if line.count(";") > line.count(",") else ","
+        columns = [column.strip().strip('"') for column in line.split(delimiter)]
+        for export_format in EXPORT_FORMATS:
+            if any(column in columns for column in export_format["time_column"]):
+                return export_format, row, delimiter
+    raise ValueError("Unbekanntes Exportformat: keine bekannte Zeitspalte gefunden")
+
+
+def _convert_chunk(chunk, export_format):
+    """
+    Wandelt einen Block eines Exports vektorisiert in das Schema der App um.
+    """
+    time_column = next(c for c in export_format["time_column"] if c in chunk.columns)
+    datum_zeit = pd.to_datetime(chunk[time_column], errors="coerce", dayfirst=export_format["dayfirst"])
+
+    # Pro Zeile die erste vorhandene Wertspalte verwenden (z. B. Verlauf oder Scan bei Libre)
+    werte = pd.Series(np.nan, index=chunk.index)
+    for column, factor in export_format["value_columns"].items():
+        if column in chunk.columns:
+            values = pd.to_numeric(chunk[column].astype(str).str.replace(",", ".", regex=False),
+                                   errors="coerce") * factor
+            werte = werte.fillna(values)
+
+    if "zeitpunkt" in chunk.columns:
+        zeitpunkt = chunk["zeitpunkt"].astype(object)
+    else:
+        zeitpunkt = SENSOR_ZEITPUNKT
+
+    result = pd.DataFrame({"datum_zeit": datum_zeit, "blutzuckerwert": werte, "zeitpunkt": zeitpunkt})
+    low, high = GLUCOSE_SCHEMA.value_ranges["blutzuckerwert"]
+    result = result[result["datum_zeit"].notna() & result["blutzuckerwert"].between(low, high)]
+    return GLUCOSE_SCHEMA.coerce(result)
+
+
+def _key_hashes(frame):
+    """
+    Returns:
+        np.ndarray: Ein Hash pro Zeile über den Schlüssel des Schemas (Zeitpunkt und Messzeitpunkt),
+        unabhängig von Zeitauflösung und Kategorientyp der Spalten.
+    """
+    keys = pd.DataFrame({
+        column: (pd.to_datetime(frame[column]).astype("datetime64[ns]") if column == "datum_zeit"
+                 else frame[column].astype(str))
+        for column in GLUCOSE_SCHEMA.key
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def read_export(file, existing_keys=None, chunksize=50_000, progress_callback=None):
+    """
+    Liest einen CSV-Export eines Messgeräts blockweise ein.
+
+    Das Format wird sofort erkannt; die Datensätze werden erst beim Durchlaufen gelesen.
+    Jeder Block wird vektorisiert umgewandelt und nach dem Schlüssel des Schemas
+    (``datum_zeit`` und ``zeitpunkt``) gegen bereits vorhandene sowie früher im Export
+    gelesene Datensätze dedupliziert. Neben dem Block wird nur ein Hash pro Datensatz
+    gehalten; der Aufrufer speichert jeden Block, bevor der nächste gelesen wird.
+
+    Args:
+        file: Binäre Datei (z. B. ein ``st.file_uploader``-Objekt).
+        existing_keys: DataFrame mit den Schlüsselspalten bereits gespeicherter Datensätze,
+            die übersprungen werden (siehe ``DataManager.stored_keys``).
+        chunksize: Anzahl Zeilen pro Block.
+        progress_callback: Wird nach jedem Block mit dem gelesenen Anteil (0..1) aufgerufen.
+
+    Returns:
+        tuple: (Name des erkannten Formats, Iterator über DataFrames mit den neuen
+        Datensätzen eines Blocks)
+
+    Raises:
+        ValueError: Wenn das Format nicht erkannt wird; beim Durchlaufen, wenn Werte nicht
+            umgewandelt werden können.
+    """
+    file.seek(0, io.SEEK_END)
+    total_bytes = file.tell() or 1
+    file.seek(0)
+    header_lines = [file.readline().decode("utf-8-sig", errors="replace") for _ in range(20)]
+    export_format, skiprows, delimiter = detect_format(header_lines)
+    file.seek(0)
+
+    def blocks():
+        seen = _key_hashes(existing_keys) if existing_keys is not None and len(existing_keys) else np.array([], dtype=np.uint64)
+        imported = 0
+        reader = pd.read_csv(file, skiprows=skiprows, sep=delimiter, chunksize=chunksize,
+                             encoding="utf-8-sig", dtype=str, skipinitialspace=True)
+        for chunk in reader:
+            converted = _convert_chunk(chunk, export_format)
+            hashes = _key_hashes(converted)
+            new = ~pd.Series(hashes).duplicated().to_numpy() & ~np.isin(hashes, seen)
+            converted = converted[new]
+            if progress_callback is not None:
+                progress_callback(min(file.tell() / total_bytes, 1.0))
+            if converted.empty:
+                continue
+            seen = np.concatenate([seen, hashes[new]])
+            imported += len(converted)
+            yield converted.sort_values("datum_zeit", kind="stable").reset_index(drop=True)
+        logger.info(f"Import ({export_format['name']}): {imported} neue Werte")
+
+    return export_format["name"], blocks()
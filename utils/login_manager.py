@@ -1,13 +1,17 @@
 import secrets
 import streamlit as st
-import streamlit_authenticator as stauth
 from utils.data_manager import DataManager
+from utils.credential_store import LazyUserRecords
+from utils.metrics import METRICS
 
 
 class LoginManager:
     """
     Singleton-Klasse, die den Anwendungszustand, die Speicherung und die Benutzer-Authentifizierung verwaltet.
     """
+
+    LOGOUT_FLUSH_TIMEOUT = 10  # Sekunden, die beim Abmelden auf offene Speicherungen gewartet wird
+
     def __new__(cls, *args, **kwargs):
         if 'login_manager' in st.session_state:
             return st.session_state.login_manager
@@ -18,9 +22,17 @@ class LoginManager:
 
     def __init__(self, data_manager: DataManager = None,
                  auth_credentials_file: str = 'credentials.yaml',
-                 auth_cookie_name: str = 'bmld_inf2_streamlit_app'):
+                 auth_cookie_name: str = 'bmld_inf2_streamlit_app',
+                 auth_credentials_folder: str = 'credentials'):
         """
         Initialisiert die Komponenten für das Dateisystem und die Authentifizierung.
+
+        Die Anmeldedaten liegen pro Benutzer in ``auth_credentials_folder`` (siehe
+        ``ShardedCredentialStore``) bzw. bei ``storage_engine='sqlite'`` in der Datenbank. Eine
+        bestehende ``auth_credentials_file`` wird beim ersten Start einmalig dorthin übernommen.
+
+        Die Anmeldedaten werden im Hintergrund geladen, während ``streamlit_authenticator``
+        importiert und die Seite aufgebaut wird; erst die Formulare warten darauf.
         """
         if hasattr(self, 'authenticator'):  # Verhindert doppelte Initialisierung
             return
@@ -30,9 +42,13 @@ class LoginManager:
 
         self.data_manager = data_manager
         self.auth_credentials_file = auth_credentials_file
+        self.auth_credentials_folder = auth_credentials_folder
         self.auth_cookie_name = auth_cookie_name
         self.auth_cookie_key = secrets.token_urlsafe(32)
-        self.auth_credentials = self._load_auth_credentials()
+        self.auth_credentials = {"usernames": {}}
+        self._pending_credentials = data_manager.prefetch(self._load_auth_credentials)
+
+        import streamlit_authenticator as stauth  # schwerer Import, läuft parallel zum Download
 
         self.authenticator = stauth.Authenticate(
             self.auth_credentials,
@@ -40,26 +56,47 @@ class LoginManager:
             self.auth_cookie_key
         )
 
+    def _await_credentials(self):
+        """
+        Wartet auf die im Hintergrund geladenen Anmeldedaten.
+        """
+        if self._pending_credentials is not None:
+            # Erst nach dem Konstruktor einsetzen, da dieser sonst alle Benutzer durchläuft
+            self.auth_credentials["usernames"] = self._pending_credentials.result()
+            self._pending_credentials = None
+
+    @METRICS.timed('credentials_seconds', op='load_auth_credentials')
     def _load_auth_credentials(self):
         """
-        Lädt die Benutzeranmeldedaten aus der konfigurierten Datei.
+        Liefert die Benutzeranmeldedaten, die erst beim Zugriff auf einen Benutzer geladen werden.
         """
         dh = self.data_manager._get_data_handler()
-        return dh.load(self.auth_credentials_file, initial_value={"usernames": {}})
+        store = self.data_manager.credential_store(self.auth_credentials_folder)
+        if not store.exists() and dh.exists(self.auth_credentials_file):
+            store.import_credentials(dh.load(self.auth_credentials_file))
+        return LazyUserRecords(store)
 
     def _save_auth_credentials(self):
         """
-        Speichert die aktuellen Benutzeranmeldedaten in der Datei.
+        Speichert die Datensätze neu registrierter Benutzer, ohne bestehende zu überschreiben.
         """
-        dh = self.data_manager._get_data_handler()
-        dh.save(self.auth_credentials_file, self.auth_credentials)
+        user_records = self.auth_credentials["usernames"]
+        for username in sorted(user_records.new_users):
+            try:
+                user_records.store.save_user(username, user_records[username], create=True)
+            except Exception:
+                dict.pop(user_records, username, None)
+                raise
+            finally:
+                user_records.new_users.discard(username)
 
     def login_register(self, login_title='Login', register_title='Register new user'):
         """
         Zeigt die Authentifizierungsoberfläche an.
         """
+        self._await_credentials()
         if st.session_state.get("authentication_status") is True:
-            self.authenticator.logout()
+            self.logout()
         else:
             login_tab, register_tab = st.tabs((login_title, register_title))
             with login_tab:
@@ -67,12 +104,24 @@ class LoginManager:
             with register_tab:
                 self.register()
 
+    def logout(self):
+        """
+        Zeigt den Logout-Button an und speichert beim Abmelden alle noch offenen Daten.
+        Dauert das länger als ``LOGOUT_FLUSH_TIMEOUT``, wird ein Hinweis angezeigt.
+        """
+        self._await_credentials()
+        self.authenticator.logout()
+        if st.session_state.get("authentication_status") is not True:
+            if not self.data_manager.flush(timeout=self.LOGOUT_FLUSH_TIMEOUT):
+                st.warning("Noch nicht alle Daten sind gespeichert; sie werden im Hintergrund hochgeladen.")
+
     def login(self, stop=True):
         """
         Zeigt das Anmeldeformular an und verarbeitet den Authentifizierungsstatus.
         """
+        self._await_credentials()
         if st.session_state.get("authentication_status") is True:
-            self.authenticator.logout()
+            self.logout()
         else:
             self.authenticator.login()
             if st.session_state["authentication_status"] is False:
@@ -86,27 +135,22 @@ class LoginManager:
         """
         Zeigt das Registrierungsformular an und verarbeitet den Registrierungsablauf.
         """
+        self._await_credentials()
         if st.session_state.get("authentication_status") is True:
-            self.authenticator.logout()
+            self.logout()
         else:
             st.info("""
             Das Passwort muss 8-20 Zeichen lang sein und mindestens einen Grossbuchstaben, 
             einen Kleinbuchstaben, eine Ziffer und ein Sonderzeichen aus @$!%*?& enthalten.
             """)
+            # Benutzernamen und E-Mail-Adressen gegen den aktuellen Stand aller Sessions prüfen
+            self.auth_credentials["usernames"].refresh()
             res = self.authenticator.register_user()
             if res[1] is not None:
                 st.success(f"Benutzer {res[1]} erfolgreich registriert.")
                 try:
                     self._save_auth_credentials()
 
-                    # Authentifizierungsdaten neu laden
-                    self.auth_credentials = self._load_auth_credentials()
-                    self.authenticator = stauth.Authenticate(
-                        self.auth_credentials,
-                        self.auth_cookie_name,
-                        self.auth_cookie_key
-                    )
-
                     st.success("Anmeldedaten erfolgreich gespeichert.")
 
                     # Sauberer Logout + Hinweis
@@ -123,4 +167,21 @@ class LoginManager:
         """
         Leitet den Benutzer zur Anmeldeseite weiter, wenn er nicht eingeloggt ist.
         """
-       
+        if st.session_state.get("authentication_status") is not True:
+            st.switch_page(login_page_py_file)
+
+    @staticmethod
+    def is_admin():
+        """
+        Prüft, ob der eingeloggte Benutzer in der Admin-Liste steht.
+
+        Die Liste wird in den Secrets unter ``[admin] usernames = [...]`` gepflegt; ohne
+        Eintrag hat niemand Admin-Rechte.
+        """
+        if st.session_state.get("authentication_status") is not True:
+            return False
+        try:
+            admins = st.secrets.get("admin", {}).get("usernames", [])
+        except FileNotFoundError:  # keine secrets.toml vorhanden
+            admins = []
+        return st.session_state.get("username") in admins
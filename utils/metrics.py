@@ -0,0 +1,362 @@
+import io
+import os
+import time
+import threading
+import functools
+import logging
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "blutzucker"
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            self.metrics.inc(self.name.replace("_seconds", "_errors"), **self.labels)
+        return False
+
+
+class Metrics:
+    """
+    Prozessweite Messwerte: Zähler, Zeitmessungen (als Histogramm) und Gauges.
+
+    Ist die Erfassung deaktiviert, liefern ``timer``/``timed`` einen leeren Kontext und
+    ``inc``/``observe`` kehren sofort zurück; die Messpunkte im Code kosten dann nur eine
+    Attributabfrage. Gauges (z. B. Cache-Treffer) werden über registrierte Collector-
+    Funktionen erst beim Export abgefragt.
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+    def __init__(self, enabled=False):
+        """
+        Args:
+            enabled: Ob Messwerte erfasst werden.
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+        self._collectors = {}
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        """
+        Verwirft alle Zähler und Zeitmessungen.
+        """
+        with self._lock:
+            self._counters = {}
+            self._timers = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """
+        Erhöht einen Zähler.
+        """
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """
+        Erfasst eine Dauer in Sekunden.
+        """
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = {"count": 0, "sum": 0.0, "max": 0.0,
+                                             "buckets": [0] * len(self.BUCKETS)}
+            timer["count"] += 1
+            timer["sum"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    timer["buckets"][i] += 1
+                    break
+
+    def timer(self, name, **labels):
+        """
+        Misst die Dauer eines ``with``-Blocks; Ausnahmen werden zusätzlich als
+        ``<name ohne _seconds>_errors`` gezählt.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def timed(self, name, **labels):
+        """
+        Decorator-Variante von ``timer``.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Timer(self, name, labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def quantile(cls, buckets, q):
+        """
+        Schätzt ein Quantil aus den Histogrammklassen einer Zeitmessung.
+
+        Returns:
+            float: Die obere Grenze der Klasse, in die das Quantil fällt (Sekunden).
+        """
+        total = sum(buckets)
+        cumulative = 0
+        for bound, count in zip(cls.BUCKETS, buckets):
+            cumulative += count
+            if total and cumulative >= q * total:
+                return bound
+        return float("nan")
+
+    def register_collector(self, name, collector):
+        """
+        Registriert eine Funktion, die beim Export Gauges liefert.
+
+        Args:
+            name: Eindeutiger Name; eine erneute Registrierung ersetzt die alte.
+            collector: Aufruf ohne Argumente, der (Name, Labels, Wert)-Tupel liefert.
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def counter(self, name, **labels):
+        """
+        Returns:
+            Der Wert eines Zählers; ohne Labels die Summe über alle Labels.
+        """
+        with self._lock:
+            if labels:
+                return self._counters.get(self._key(name, labels), 0)
+            return sum(value for (key, _), value in self._counters.items() if key == name)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: "counters", "timers" und "gauges" als Listen von Dictionaries.
+        """
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            timers = [{"name": name, "labels": dict(labels), "count": timer["count"],
+                       "sum": timer["sum"], "max": timer["max"], "buckets": list(timer["buckets"])}
+                      for (name, labels), timer in sorted(self._timers.items())]
+            collectors = list(self._collectors.values())
+        gauges = []
+        for collector in collectors:
+            try:
+                gauges += [{"name": name, "labels": labels, "value": value}
+                           for name, labels, value in collector()]
+            except Exception as e:
+                logger.warning(f"Metrik-Collector fehlgeschlagen: {e}")
+        return {"counters": counters, "timers": timers, "gauges": gauges}
+
+    def to_prometheus(self):
+        """
+        Returns:
+            str: Alle Messwerte im Prometheus-Textformat.
+        """
+        def fmt(labels, **extra):
+            items = {**labels, **extra}
+            if not items:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in items.items()) + "}"
+
+        snapshot = self.snapshot()
+        lines, typed = [], set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for counter in snapshot["counters"]:
+            name = f"{PREFIX}_{counter['name']}_total"
+            declare(name, "counter")
+            lines.append(f"{name}{fmt(counter['labels'])} {counter['value']}")
+        for timer in snapshot["timers"]:
+            name = f"{PREFIX}_{timer['name']}"
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS, timer["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{fmt(timer['labels'], le=le)} {cumulative}")
+            lines.append(f"{name}_sum{fmt(timer['labels'])} {timer['sum']}")
+            lines.append(f"{name}_count{fmt(timer['labels'])} {timer['count']}")
+        for gauge in snapshot["gauges"]:
+            name = f"{PREFIX}_{gauge['name']}"
+            declare(name, "gauge")
+            lines.append(f"{name}{fmt(gauge['labels'])} {gauge['value']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Schreibt die Messwerte atomar in eine Datei (z. B. für den Textfile-Collector des
+        node_exporters).
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve_prometheus(self, port=9464, host="127.0.0.1"):
+        """
+        Startet einen HTTP-Endpunkt (``/metrics``) in einem Hintergrund-Thread.
+
+        Returns:
+            ThreadingHTTPServer: Der laufende Server.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+METRICS = Metrics()
+
+
+class _CountingFile:
+    """
+    Dateiobjekt, das gelesene und geschriebene Bytes als Zähler erfasst.
+    """
+
+    def __init__(self, f, metrics, labels):
+        self._f = f
+        self._metrics = metrics
+        self._labels = labels
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._metrics.inc("fs_bytes_read", len(data), **self._labels)
+        return data
+
+    def read1(self, *args):
+        data = self._f.read1(*args) if hasattr(self._f, "read1") else self._f.read(*args)
+        self._metrics.inc("fs_bytes_read", len(data), **self._labels)
+        return data
+
+    def readinto(self, buffer):
+        n = self._f.readinto(buffer)
+        self._metrics.inc("fs_bytes_read", n or 0, **self._labels)
+        return n
+
+    def write(self, data):
+        self._metrics.inc("fs_bytes_written", len(data), **self._labels)
+        return self._f.write(data)
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+class InstrumentedFileSystem:
+    """
+    Hülle um ein fsspec-Dateisystem, die jeden Aufruf misst.
+
+    Pro Methode wird die Dauer als ``fs_operation_seconds{op=...}`` erfasst, über
+    geöffnete Dateien zusätzlich die gelesenen und geschriebenen Bytes. Bei deaktivierter
+    Erfassung werden die Aufrufe unverändert durchgereicht.
+    """
+
+    def __init__(self, filesystem, metrics=METRICS, backend=None):
+        """
+        Args:
+            filesystem: Das zu messende Dateisystem.
+            metrics: Die Messwert-Sammlung.
+            backend: Label zur Unterscheidung mehrerer Dateisysteme, standardmässig das Protokoll.
+        """
+        self.filesystem = filesystem
+        self.metrics = metrics
+        protocol = getattr(filesystem, "protocol", "fs")
+        self.backend = backend or (protocol[0] if isinstance(protocol, (tuple, list)) else protocol)
+
+    def open(self, path, mode="rb", **kwargs):
+        if not self.metrics.enabled:
+            return self.filesystem.open(path, mode, **kwargs)
+        labels = {"backend": self.backend}
+        with self.metrics.timer("fs_operation_seconds", op="open", **labels):
+            if "b" in mode:
+                return _CountingFile(self.filesystem.open(path, mode, **kwargs), self.metrics, labels)
+            # Textdateien auf Byte-Ebene zählen
+            binary = _CountingFile(self.filesystem.open(path, mode + "b"), self.metrics, labels)
+        return io.TextIOWrapper(binary, encoding=kwargs.get("encoding") or "utf-8")
+
+    def move_replace(self, path1, path2):
+        from utils.file_cache import move_replace
+        if not self.metrics.enabled:
+            return move_replace(self.filesystem, path1, path2)
+        with self.metrics.timer("fs_operation_seconds", op="move_replace", backend=self.backend):
+            return move_replace(self.filesystem, path1, path2)
+
+    def __getattr__(self, name):
+        attr = getattr(self.filesystem, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            if not self.metrics.enabled:
+                return attr(*args, **kwargs)
+            with self.metrics.timer("fs_operation_seconds", op=name, backend=self.backend):
+                return attr(*args, **kwargs)
+        return call
@@ -0,0 +1,254 @@
+import posixpath
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionedStore:
+    """
+    Zeitlich partitionierte Ablage einer Tabelle.
+
+    Die Datensätze werden nach Monat der Zeitspalte in einzelne Dateien aufgeteilt
+    (z. B. ``data/2024-05.parquet``). Ein kleiner Index (``index.json``) hält pro Partition
+    den ersten und letzten Zeitpunkt sowie die Anzahl Zeilen fest, sodass für ein
+    Zeitfenster nur die überlappenden Partitionen geladen werden müssen.
+    """
+
+    INDEX_FILE = "index.json"
+    MAX_APPEND_IDS = 100  # pro Partition gemerkte IDs für idempotentes ``append``
+
+    def __init__(self, data_handler, folder, time_column="datum_zeit", ext=".parquet"):
+        """
+        Initialisiert den PartitionedStore.
+
+        Args:
+            data_handler: Der DataHandler, relativ zu dessen Root die Pfade aufgelöst werden.
+            folder: Der relative Pfad des Partitionsverzeichnisses.
+            time_column: Die Spalte, nach der partitioniert wird.
+            ext: Die Dateiendung und damit das Format der Partitionen.
+        """
+        self.data_handler = data_handler
+        self.folder = folder
+        self.time_column = time_column
+        self.ext = ext
+        self.index_path = posixpath.join(folder, self.INDEX_FILE)
+
+    @staticmethod
+    def partition_key(timestamp):
+        """
+        Returns:
+            str: Der Partitionsschlüssel (``YYYY-MM``) eines Zeitpunkts.
+        """
+        return pd.Timestamp(timestamp).strftime("%Y-%m")
+
+    @staticmethod
+    def partition_start(timestamp):
+        """
+        Returns:
+            pd.Timestamp: Der Beginn der Partition, in die ``timestamp`` fällt.
+        """
+        return pd.Timestamp(timestamp).to_period("M").start_time
+
+    def exists(self):
+        """
+        Returns:
+            bool: True, wenn bereits ein Partitionsindex existiert.
+        """
+        return self.data_handler.exists(self.index_path)
+
+    def load_index(self):
+        """
+        Returns:
+            dict: Partitionsschlüssel -> {"start", "end", "rows", optional "appends"}.
+        """
+        return self.data_handler.load(self.index_path, initial_value={})
+
+    def _partition_path(self, key):
+        return posixpath.join(self.folder, key + self.ext)
+
+    def partitions(self, start=None, end=None, index=None):
+        """
+        Gibt die Partitionen zurück, die das Zeitfenster [start, end] überlappen.
+
+        Returns:
+            list: Sortierte Partitionsschlüssel.
+        """
+        index = self.load_index() if index is None else index
+        keys = []
+        for key, meta in sorted(index.items()):
+            if start is not None and pd.Timestamp(meta["end"]) < pd.Timestamp(start):
+                continue
+            if end is not None and pd.Timestamp(meta["start"]) > pd.Timestamp(end):
+                continue
+            keys.append(key)
+        return keys
+
+    def earliest(self):
+        """
+        Returns:
+            pd.Timestamp: Der früheste gespeicherte Zeitpunkt oder None.
+        """
+        index = self.load_index()
+        if not index:
+            return None
+        return min(pd.Timestamp(meta["start"]) for meta in index.values())
+
+    def load(self, start=None, end=None, initial_value=None, **load_args):
+        """
+        Lädt alle Partitionen, die das Zeitfenster überlappen.
+
+        Es werden immer ganze Partitionen geladen, damit ein späteres ``write`` des
+        Ergebnisses keine Datensätze am Rand des Fensters verliert.
+
+        Args:
+            start: Beginn des Zeitfensters, None für unbeschränkt.
+            end: Ende des Zeitfensters, None für unbeschränkt.
+            initial_value: Der Standardwert, falls keine Partition im Fenster liegt.
+
+        Returns:
+            pd.DataFrame: Die Datensätze der geladenen Partitionen.
+        """
+        frames = [self.data_handler.load(self._partition_path(key), **load_args)
+                  for key in self.partitions(start, end)]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return initial_value
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_chunks(self, start=None, end=None, chunksize=10_000, **load_args):
+        """
+        Liest die Partitionen im Zeitfenster stückweise (siehe ``DataHandler.iter_chunks``),
+        ohne die Historie als Ganzes in den Speicher zu laden.
+
+        Yields:
+            pd.DataFrame: Die Datensätze in der Reihenfolge der Partitionen.
+        """
+        for key in self.partitions(start, end):
+            yield from self.data_handler.iter_chunks(self._partition_path(key), chunksize, **load_args)
+
+    def version(self):
+        """
+        Returns:
+            str: Die Version des Index; sie ändert sich mit jedem ``write`` und ``append``.
+        """
+        return self.data_handler.version(self.index_path)
+
+    def _split(self, frame):
+        frame = frame.copy()
+        frame[self.time_column] = pd.to_datetime(frame[self.time_column])
+        keys = frame[self.time_column].dt.strftime("%Y-%m")
+        return {key: part for key, part in frame.groupby(keys, sort=True)}
+
+    def _new_rows(self, existing, rows, record_key):
+        """
+        Returns:
+            pd.DataFrame: Die Zeilen aus ``rows``, deren Schlüssel in ``existing`` noch fehlt.
+        """
+        def keys(frame):
+            columns = {column: (pd.to_datetime(frame[column]).astype("datetime64[ns]")
+                                if column == self.time_column else frame[column].astype(str))
+                       for column in record_key}
+            return pd.MultiIndex.from_frame(pd.DataFrame(columns))
+
+        return rows[~keys(rows).isin(keys(existing))]
+
+    def _commit_partition(self, key, rows, append=False, record_key=None):
+        """
+        Schreibt eine Partition bedingt auf den gelesenen Stand (siehe ``DataHandler.update``).
+        Bei einem Konflikt wird nur diese eine Partition neu gelesen.
+
+        Args:
+            key: Der Partitionsschlüssel.
+            rows: Die zu schreibenden Datensätze.
+            append: Bei True werden ``rows`` an die bestehende Partition angehängt, sonst
+                ersetzen sie sie.
+            record_key: Beim Anhängen die Spalten, die einen Datensatz eindeutig bestimmen;
+                bereits vorhandene Datensätze werden nicht erneut angehängt.
+
+        Returns:
+            tuple: (geschriebene Partition, ihre neue Version)
+        """
+        def modify(existing):
+            part = rows
+            if append and existing is not None:
+                if record_key:
+                    part = self._new_rows(existing, rows, record_key)
+                part = pd.concat([existing, part], ignore_index=True)
+            return part.sort_values(self.time_column, kind="stable").reset_index(drop=True)
+
+        version, part = self.data_handler.update(self._partition_path(key), modify)
+        return part, version
+
+    def _update_index(self, written, append_id=None):
+        """
+        Trägt geschriebene Partitionen bedingt im Index ein. Wurde eine Partition inzwischen
+        von einem anderen Prozess erneut geschrieben, gehört ihr Eintrag diesem.
+
+        Args:
+            written: Partitionsschlüssel -> (Partition, Version) aus ``_commit_partition``.
+            append_id: Die ID des Auftrags, die bei den Partitionen vermerkt wird.
+        """
+        def modify(index):
+            for key, (part, version) in written.items():
+                entry = index.get(key)
+                if self.data_handler.version(self._partition_path(key)) == version:
+                    entry = {
+                        "start": part[self.time_column].min().isoformat(),
+                        "end": part[self.time_column].max().isoformat(),
+                        "rows": int(len(part)),
+                        "appends": (entry or {}).get("appends", []),
+                    }
+                if entry is None:
+                    continue
+                if append_id is not None and append_id not in entry.get("appends", []):
+                    entry["appends"] = (entry.get("appends", []) + [append_id])[-self.MAX_APPEND_IDS:]
+                if not entry.get("appends"):
+                    entry.pop("appends", None)
+                index[key] = entry
+            return index
+
+        self.data_handler.update(self.index_path, modify, initial_value={})
+
+    def write(self, frame):
+        """
+        Ersetzt die Partitionen, in die ``frame`` fällt, durch dessen Inhalt.
+        Partitionen ausserhalb des Frames bleiben unverändert.
+
+        Args:
+            frame: Datensätze, die ganze Partitionen abdecken (z. B. ein Ergebnis von ``load``).
+        """
+        if frame is None or frame.empty:
+            return
+        written = {key: self._commit_partition(key, part) for key, part in self._split(frame).items()}
+        self._update_index(written)
+
+    def append(self, frame, append_id=None, key=None):
+        """
+        Hängt neue Datensätze an; nur die betroffenen Partitionen werden neu geschrieben.
+
+        Mehrere Prozesse können gleichzeitig anhängen: Jede Partition wird bedingt auf den
+        gelesenen Stand geschrieben und bei einem Konflikt erneut gelesen und ergänzt, statt
+        die Datensätze des anderen Prozesses zu überschreiben.
+
+        Args:
+            frame: Die neuen Datensätze.
+            append_id: Optionale eindeutige ID des Auftrags. Sie wird im Index der
+                Partition vermerkt; ein erneutes ``append`` mit derselben ID überspringt
+                Partitionen, die die Datensätze bereits enthalten.
+            key: Optionale Spalten, die einen Datensatz eindeutig bestimmen (z. B.
+                ``Schema.key``). Datensätze, deren Schlüssel die Partition bereits enthält,
+                werden übersprungen. Damit bleibt ein erneutes Einspielen auch dann
+                idempotent, wenn zwischen dem Schreiben der Partition und dem Vermerk der
+                ``append_id`` im Index abgebrochen wurde.
+        """
+        if frame is None or frame.empty:
+            return
+        index = self.load_index()
+        written = {}
+        for partition, part in self._split(frame).items():
+            if append_id is not None and append_id in index.get(partition, {}).get("appends", []):
+                continue
+            written[partition] = self._commit_partition(partition, part, append=True, record_key=key)
+        if written:
+            self._update_index(written, append_id)
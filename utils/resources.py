@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+import fsspec
+import streamlit as st
+from utils.metrics import METRICS, InstrumentedFileSystem
+
+
+def create_filesystem(protocol: str, pool_size: int = 10, timeout: float = 30.0):
+    """
+    Erstellt ein neues fsspec-Dateisystem.
+
+    Args:
+        protocol: 'webdav' oder 'file'.
+        pool_size: Maximale Anzahl gleichzeitiger Keep-Alive-Verbindungen zum WebDAV-Server.
+        timeout: Zeitlimit pro Anfrage in Sekunden.
+
+    Returns:
+        Das Dateisystemobjekt.
+    """
+    if protocol == 'webdav':
+        import httpx
+
+        secrets = st.secrets['webdav']
+        return fsspec.filesystem('webdav',
+                                 base_url=secrets['base_url'],
+                                 auth=(secrets['username'], secrets['password']),
+                                 timeout=httpx.Timeout(timeout),
+                                 limits=httpx.Limits(max_connections=pool_size,
+                                                     max_keepalive_connections=pool_size),
+                                 skip_instance_cache=True)
+    elif protocol == 'file':
+        return fsspec.filesystem('file')
+    else:
+        raise ValueError(f"AppManager: Invalid filesystem protocol: {protocol}")
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_filesystem(protocol: str, pool_size: int = 10, timeout: float = 30.0,
+                          cache_dir: str = None, cache_max_bytes: int = 200 * 1024 * 1024,
+                          instrument: bool = False):
+    """
+    Liefert ein prozessweit geteiltes Dateisystem.
+
+    Alle Browser-Sessions desselben Servers verwenden dasselbe Objekt und damit denselben
+    HTTP-Verbindungspool; TLS-Handshakes und Verbindungsaufbau fallen nur einmal an. Der
+    zugrunde liegende httpx-Client und der optionale Dateicache sind threadsicher.
+
+    Args:
+        protocol: 'webdav' oder 'file'.
+        pool_size: Maximale Anzahl gleichzeitiger Keep-Alive-Verbindungen.
+        timeout: Zeitlimit pro Anfrage in Sekunden.
+        cache_dir: Lokales Verzeichnis für den Dateicache, None deaktiviert ihn.
+        cache_max_bytes: Maximale Grösse des Dateicaches in Bytes.
+        instrument: Misst alle Aufrufe an das Dateisystem (unterhalb des Dateicaches, also
+            nur tatsächliche Serverzugriffe), siehe ``utils.metrics``.
+
+    Returns:
+        Das geteilte Dateisystemobjekt.
+    """
+    fs = create_filesystem(protocol, pool_size, timeout)
+    if instrument:
+        fs = InstrumentedFileSystem(fs, METRICS, backend=protocol)
+    if cache_dir is not None:
+        from utils.file_cache import CachedFileSystem, DiskCache
+
+        cache = DiskCache(cache_dir, cache_max_bytes)
+        fs = CachedFileSystem(fs, cache)
+        METRICS.register_collector("file_cache", lambda: [
+            (f"file_cache_{name}", {}, value) for name, value in cache.stats().items()])
+    return fs
+
+
+@st.cache_resource(show_spinner=False)
+def get_sync_log(directory: str, _apply):
+    """
+    Liefert das prozessweit geteilte Write-Ahead-Log für ``directory``.
+
+    Alle Sessions schreiben in dasselbe Log, damit genau ein Worker die Einträge in
+    Reihenfolge einspielt. Beim ersten Aufruf werden Einträge eines früheren Prozesses
+    wieder aufgenommen.
+
+    Args:
+        directory: Lokales Verzeichnis des Logs.
+        _apply: Aufruf ``apply(entry, content)``, der einen Eintrag einspielt.
+
+    Returns:
+        SyncLog: Das geteilte Log.
+    """
+    from utils.sync_log import SyncLog
+
+    sync_log = SyncLog(directory, _apply)
+    METRICS.register_collector(f"sync_log:{directory}", lambda: [
+        ("sync_log_pending", {"directory": directory}, len(sync_log.pending())),
+        ("sync_log_failures", {"directory": directory}, sync_log.failures),
+    ])
+    return sync_log
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_data_cache(max_bytes: int = 256 * 1024 * 1024):
+    """
+    Liefert den prozessweit geteilten Cache für geladene Benutzerdaten.
+
+    Args:
+        max_bytes: Maximale Grösse aller Einträge in Bytes.
+
+    Returns:
+        SharedDataCache: Der geteilte Cache.
+    """
+    from utils.shared_cache import SharedDataCache
+
+    cache = SharedDataCache(max_bytes)
+
+    def collect():
+        stats = cache.stats()
+        return [("shared_cache_hits", {}, stats["hits"]), ("shared_cache_misses", {}, stats["misses"]),
+                ("shared_cache_entries", {}, len(stats["entries"])), ("shared_cache_bytes", {}, stats["bytes"])]
+
+    METRICS.register_collector("shared_cache", collect)
+    return cache
+
+
+@st.cache_resource(show_spinner=False)
+def get_prefetch_pool(max_workers: int = 8):
+    """
+    Liefert den prozessweit geteilten Thread-Pool für vorab gestartete Ladevorgänge.
+
+    Die Aufgaben dürfen nicht auf ``st.session_state`` zugreifen, da sie ausserhalb des
+    Skript-Threads der Session laufen.
+
+    Args:
+        max_workers: Maximale Anzahl gleichzeitiger Ladevorgänge.
+
+    Returns:
+        ThreadPoolExecutor: Der geteilte Pool.
+    """
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+
+
+@st.cache_resource(show_spinner=False)
+def get_database(path: str, timeout: float = 30.0):
+    """
+    Liefert die prozessweit geteilte SQLite-Datenbank (siehe ``utils.sqlite_store``); jeder
+    Thread verwendet darin seine eigene Verbindung.
+
+    Args:
+        path: Lokaler Pfad der Datenbankdatei.
+        timeout: Sekunden, die auf eine Schreibsperre eines anderen Prozesses gewartet wird.
+
+    Returns:
+        SqliteDatabase: Die geteilte Datenbank.
+    """
+    from utils.sqlite_store import SqliteDatabase
+
+    return SqliteDatabase(path, timeout)
+
+
+@st.cache_resource(show_spinner=False)
+def get_exporter(max_workers: int = 2, chunksize: int = 10_000):
+    """
+    Liefert den prozessweit geteilten Exporter (siehe ``utils.export``).
+
+    Exporte laufen in einem eigenen, kleinen Pool, damit lange Berichte die vorab gestarteten
+    Ladevorgänge nicht blockieren.
+
+    Args:
+        max_workers: Maximale Anzahl gleichzeitiger Exporte.
+        chunksize: Anzahl Datensätze, die ein Export gleichzeitig im Speicher hält.
+
+    Returns:
+        Exporter: Der geteilte Exporter.
+    """
+    from utils.export import Exporter
+
+    exporter = Exporter(max_workers, chunksize)
+    METRICS.register_collector("exporter", lambda: [("exports_running", {}, exporter.running())])
+    return exporter
+
+
+@st.cache_resource(show_spinner=False)
+def get_metrics_server(port: int = 9464, host: str = "127.0.0.1"):
+    """
+    Startet einmal pro Prozess den Prometheus-Endpunkt ``http://<host>:<port>/metrics``.
+
+    Returns:
+        Der laufende HTTP-Server.
+    """
+    return METRICS.serve_prometheus(port, host)
@@ -0,0 +1,217 @@
+import logging
+import posixpath
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class Schema:
+    """
+    Beschreibt die Spalten und Datentypen einer Tabelle.
+
+    ``coerce`` wandelt einen DataFrame vektorisiert in die kompakten Zieltypen um und
+    prüft dabei die Werte, sodass alle Auswertungen auf typisierten Spalten statt auf
+    Python-Objekten arbeiten.
+    """
+
+    def __init__(self, name, columns, value_ranges=None, key=None):
+        """
+        Initialisiert das Schema.
+
+        Args:
+            name: Der Name, unter dem das Schema registriert wird.
+            columns: Spaltenname -> Datentyp (z. B. "datetime64[ns]", "int16" oder ein
+                ``pd.CategoricalDtype``), in der gewünschten Reihenfolge.
+            value_ranges: Spaltenname -> (Minimum, Maximum) für numerische Spalten.
+            key: Spalten, die einen Datensatz eindeutig bestimmen; standardmässig alle.
+        """
+        self.name = name
+        self.columns = columns
+        self.value_ranges = value_ranges or {}
+        self.key = list(key) if key is not None else list(columns)
+
+    def empty_frame(self):
+        """
+        Returns:
+            pd.DataFrame: Ein leerer DataFrame mit allen Spalten in den Zieltypen.
+        """
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in self.columns.items()})
+
+    def matches(self, data_df):
+        """
+        Returns:
+            bool: True, wenn alle Spalten des Schemas mit dem Zieltyp vorhanden sind.
+        """
+        return all(column in data_df.columns and data_df[column].dtype == dtype
+                   for column, dtype in self.columns.items())
+
+    def coerce(self, data_df, strict=True):
+        """
+        Wandelt die vorhandenen Spalten eines DataFrames in die Zieltypen um. Leere Zellen
+        sind erlaubt; da Ganzzahltypen wie ``int16`` keine fehlenden Werte kennen, werden
+        Zeilen ohne Wert in einer solchen Spalte mit einer Warnung im Log verworfen.
+
+        Args:
+            data_df: Der umzuwandelnde DataFrame; fehlende Spalten werden nicht ergänzt.
+            strict: Bei True sind nur die bekannten Kategorien erlaubt, sonst werden
+                unbekannte Werte als zusätzliche Kategorien übernommen.
+
+        Returns:
+            pd.DataFrame: Ein neuer DataFrame mit den Zieltypen und dem Index der
+            verbleibenden Zeilen.
+
+        Raises:
+            ValueError: Wenn Werte nicht umgewandelt werden können oder ausserhalb des
+                erlaubten Bereichs liegen.
+        """
+        result = {}
+        incomplete = {}
+        for column in data_df.columns:
+            values = data_df[column]
+            dtype = self.columns.get(column)
+            if dtype is None:
+                result[column] = values
+            elif isinstance(dtype, pd.CategoricalDtype):
+                result[column] = self._coerce_category(column, values, dtype, strict)
+            elif str(dtype).startswith("datetime64"):
+                result[column] = self._coerce_datetime(column, values, dtype)
+            else:
+                result[column] = self._coerce_number(column, values, dtype)
+                if result[column].dtype != dtype:
+                    incomplete[column] = dtype
+        result = pd.DataFrame(result, index=data_df.index)
+        if incomplete:
+            missing = result[list(incomplete)].isna().any(axis=1)
+            logger.warning(f"Schema '{self.name}': {int(missing.sum())} Zeilen ohne Wert in "
+                           f"{', '.join(incomplete)} verworfen")
+            result = result[~missing].astype(incomplete)
+        return result
+
+    def merge(self, remote_df, local_df):
+        """
+        Führt zwei Stände derselben Tabelle nach ``key`` zusammen, z. B. nach einem
+        Schreibkonflikt. Bei gleichem Schlüssel gilt der lokale Datensatz; Datensätze, die
+        nur entfernt vorhanden sind, werden angehängt.
+
+        Returns:
+            pd.DataFrame: ``local_df`` gefolgt von den nur in ``remote_df`` vorhandenen Datensätzen.
+        """
+        if remote_df is None or remote_df.empty:
+            return local_df
+        if local_df is None or local_df.empty:
+            return remote_df
+        # Gleiche Typen auf beiden Seiten, z. B. Zeitpunkte statt Text aus einer CSV-Datei
+        remote_df, local_df = (frame if self.matches(frame) else self.coerce(frame, strict=False)
+                               for frame in (remote_df, local_df))
+        key = [column for column in self.key if column in remote_df.columns and column in local_df.columns]
+        if not key:
+            key = [column for column in local_df.columns if column in remote_df.columns]
+        local_keys = pd.util.hash_pandas_object(local_df[key], index=False).to_numpy()
+        remote_keys = pd.util.hash_pandas_object(remote_df[key], index=False).to_numpy()
+        remote_only = remote_df[~np.isin(remote_keys, local_keys)]
+        merged = pd.concat([local_df, remote_only], ignore_index=True)
+        if not self.matches(merged):
+            merged = self.coerce(merged, strict=False)
+        return merged
+
+    def _invalid(self, column, mask, values):
+        if mask.any():
+            examples = ", ".join(map(str, values[mask].unique()[:3]))
+            raise ValueError(f"Schema '{self.name}': {int(mask.sum())} ungültige Werte in Spalte "
+                             f"'{column}' (z. B. {examples})")
+
+    @staticmethod
+    def _missing(values):
+        # Leere Zellen, auch leere Zeichenketten aus Formularen und CSV-Dateien
+        missing = values.isna()
+        if not pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_datetime64_any_dtype(values):
+            missing |= values.astype(str).str.strip().eq("").to_numpy()
+        return missing
+
+    def _coerce_datetime(self, column, values, dtype):
+        converted = pd.to_datetime(values, errors="coerce")
+        self._invalid(column, converted.isna() & ~self._missing(values), values)
+        return converted.astype(dtype)
+
+    def _coerce_number(self, column, values, dtype):
+        converted = pd.to_numeric(values, errors="coerce")
+        invalid = converted.isna() & ~self._missing(values)
+        if column in self.value_ranges:
+            low, high = self.value_ranges[column]
+            invalid |= (converted < low) | (converted > high)
+        self._invalid(column, invalid, values)
+        if np.issubdtype(np.dtype(dtype), np.integer):
+            converted = converted.round()
+            if converted.isna().any():
+                # Fehlende Werte lassen sich nicht als Ganzzahl speichern, siehe ``coerce``
+                return converted
+        return converted.astype(dtype)
+
+    def _coerce_category(self, column, values, dtype, strict):
+        present = values.dropna().unique()
+        unknown = [value for value in present if value not in dtype.categories]
+        if unknown:
+            if strict:
+                self._invalid(column, values.isin(unknown), values)
+            dtype = pd.CategoricalDtype(list(dtype.categories) + sorted(map(str, unknown)))
+        return values.astype(dtype)
+
+
+SCHEMAS = {}
+FILE_SCHEMAS = {}
+
+
+def register_schema(schema, file_names=()):
+    """
+    Registriert ein Schema unter seinem Namen.
+
+    Args:
+        schema: Das Schema.
+        file_names: Dateinamen ohne Endung (z. B. ``data`` für ``data.csv``, ``data.parquet``
+            und den partitionierten Ordner ``data``), deren Tabellen standardmässig in
+            dieses Schema umgewandelt werden (siehe ``schema_for_file``).
+
+    Returns:
+        Schema: Das registrierte Schema.
+    """
+    SCHEMAS[schema.name] = schema
+    for file_name in file_names:
+        FILE_SCHEMAS[file_name] = schema.name
+    return schema
+
+
+def schema_for_file(file_name):
+    """
+    Returns:
+        str: Der Name des für ``file_name`` registrierten Schemas oder None.
+    """
+    name = posixpath.basename(file_name.rstrip("/")).split(".", 1)[0]
+    return FILE_SCHEMAS.get(name)
+
+
+def get_schema(name):
+    """
+    Returns:
+        Schema: Das unter ``name`` registrierte Schema.
+
+    Raises:
+        ValueError: Wenn kein Schema mit diesem Namen registriert ist.
+    """
+    if name not in SCHEMAS:
+        raise ValueError(f"Unbekanntes Schema: {name}")
+    return SCHEMAS[name]
+
+
+ZEITPUNKTE = ["Nüchtern", "Nach dem Essen", "Sensor"]
+
+GLUCOSE_SCHEMA = register_schema(Schema(
+    "glucose",
+    {
+        "datum_zeit": "datetime64[ns]",
+        "blutzuckerwert": "int16",
+        "zeitpunkt": pd.CategoricalDtype(ZEITPUNKTE),
+    },
+    value_ranges={"blutzuckerwert": (0, 1500)},
+    key=["datum_zeit", "zeitpunkt"],
+), file_names=["data"])
@@ -0,0 +1,275 @@
+import posixpath
+import time
+import uuid
+import logging
+import pandas as pd
+from utils.data_handler import MISSING, WriteConflictError
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentStore:
+    """
+    Append-only Ablage für tabellarische Daten.
+
+    Neue Datensätze werden als kleine Segmentdateien in einem Verzeichnis neben der
+    Basisdatei abgelegt (z. B. ``data.csv.segments/``) und beim Laden mit der Basisdatei
+    zusammengeführt. Ein Speichervorgang kostet damit nur noch die Grösse des neuen
+    Segments statt der gesamten Historie. Überschreiten die Segmente eine Anzahl oder
+    Gesamtgrösse, werden sie mit ``compact`` wieder in die Basisdatei gefaltet.
+
+    Bevor ``compact`` oder ``replace`` die Basisdatei schreibt, wird im Segmentverzeichnis ein
+    Manifest (``<zeit>_<id>.compaction.json``) mit der bisherigen Version der Basisdatei und
+    den übernommenen Segmenten abgelegt. Hat sich die Basisdatei seither geändert, werden
+    diese Segmente beim Laden übersprungen. Ein Abbruch zwischen dem Schreiben der
+    Basisdatei und dem Löschen der Segmente führt so nicht zu doppelten Datensätzen.
+    """
+
+    SEGMENT_SUFFIX = ".segments"
+    MANIFEST_SUFFIX = ".compaction.json"
+    STALE_MANIFEST_SECONDS = 3600  # danach gilt ein nicht angewandtes Manifest als verwaist
+
+    def __init__(self, data_handler, base_path, max_segments=50, max_segment_bytes=1_000_000):
+        """
+        Initialisiert den SegmentStore.
+
+        Args:
+            data_handler: Der DataHandler, relativ zu dessen Root die Pfade aufgelöst werden.
+            base_path: Der relative Pfad der Basisdatei (z. B. ``user_data_x/data.csv``).
+            max_segments: Anzahl Segmente, ab der kompaktiert werden soll.
+            max_segment_bytes: Gesamtgrösse der Segmente, ab der kompaktiert werden soll.
+        """
+        self.data_handler = data_handler
+        self.base_path = base_path
+        self.segment_dir = base_path + self.SEGMENT_SUFFIX
+        self.ext = posixpath.splitext(base_path)[-1].lower()
+        self.max_segments = max_segments
+        self.max_segment_bytes = max_segment_bytes
+
+    def _listing(self):
+        """
+        Returns:
+            tuple: (Segmente als Liste von (relativer Pfad, Grösse), relative Pfade der Manifeste),
+            jeweils in Schreibreihenfolge.
+        """
+        files = self.data_handler.list_files(self.segment_dir)
+        segments, manifests = [], []
+        for name, size in sorted(files.items()):
+            name = self.data_handler.split_compression(name)[0]
+            if name.endswith(self.MANIFEST_SUFFIX):
+                manifests.append(self.data_handler.join(self.segment_dir, name))
+            elif name.endswith(self.ext):
+                segments.append((self.data_handler.join(self.segment_dir, name), size))
+        return segments, manifests
+
+    def _applied_manifests(self, manifests):
+        """
+        Liest die Manifeste, deren Basisdatei inzwischen geschrieben wurde.
+
+        Returns:
+            list: (relativer Pfad, Manifest)-Tupel der angewandten Manifeste.
+        """
+        if not manifests:
+            return []
+        base_version = self.data_handler.version(self.base_path)
+        applied = []
+        for path in manifests:
+            try:
+                manifest = self.data_handler.load(path)
+            except FileNotFoundError:  # gleichzeitig abgeschlossen
+                continue
+            if manifest.get("base_before") != base_version:
+                applied.append((path, manifest))
+        return applied
+
+    def _segments(self):
+        """
+        Gibt die Segmente in Schreibreihenfolge zurück, die noch nicht in der Basisdatei
+        enthalten sind.
+
+        Returns:
+            list: Liste von (relativer Pfad, Grösse)-Tupeln.
+        """
+        segments, manifests = self._listing()
+        merged = {name for _, manifest in self._applied_manifests(manifests) for name in manifest["segments"]}
+        return [(path, size) for path, size in segments if posixpath.basename(path) not in merged]
+
+    def append(self, frame, segment_id=None, timestamp_ns=None):
+        """
+        Schreibt neue Datensätze als eigenes Segment.
+
+        Args:
+            frame: Die neuen Datensätze als DataFrame.
+            segment_id: Optionale eindeutige ID. Nur zusammen mit ``timestamp_ns`` ist ein
+                erneutes Schreiben idempotent, da es dann dasselbe Segment überschreibt.
+            timestamp_ns: Zeitstempel für die Schreibreihenfolge, standardmässig die aktuelle Zeit.
+
+        Returns:
+            str: Der relative Pfad des geschriebenen Segments.
+        """
+        if segment_id is None:
+            segment_id = uuid.uuid4().hex[:12]
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        name = f"{timestamp_ns:020d}_{segment_id}{self.ext}"
+        path = self.data_handler.join(self.segment_dir, name)
+        self.data_handler.save(path, frame)
+        return path
+
+    def load(self, initial_value=None, **load_args):
+        """
+        Lädt die Basisdatei und führt alle Segmente in Schreibreihenfolge an.
+
+        Args:
+            initial_value: Der Standardwert, falls weder Basisdatei noch Segmente existieren.
+
+        Returns:
+            Der zusammengeführte Inhalt.
+        """
+        segments = self._segments()
+        if not segments:
+            return self.data_handler.load(self.base_path, initial_value, **load_args)
+
+        if self.data_handler.exists(self.base_path):
+            base = self.data_handler.load(self.base_path, **load_args)
+        else:
+            base = initial_value
+        if base is not None and not isinstance(base, pd.DataFrame):
+            return base
+
+        frames = [base] if base is not None and not base.empty else []
+        for path, _ in segments:
+            frames.append(self.data_handler.load(path, **load_args))
+        if not frames:
+            return base
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_chunks(self, chunksize=10_000, **load_args):
+        """
+        Liest die Basisdatei und danach alle Segmente stückweise (siehe
+        ``DataHandler.iter_chunks``).
+
+        Yields:
+            pd.DataFrame: Die Datensätze in Schreibreihenfolge.
+        """
+        segments = self._segments()
+        yield from self.data_handler.iter_chunks(self.base_path, chunksize, **load_args)
+        for path, _ in segments:
+            yield from self.data_handler.iter_chunks(path, chunksize, **load_args)
+
+    def version(self):
+        """
+        Returns:
+            str: Version der Basisdatei zusammen mit den Namen aller Segmente; sie ändert
+            sich mit jedem ``append``, ``compact`` und ``replace``.
+        """
+        names = [posixpath.basename(path) for path, _ in self._segments()]
+        return "|".join([self.data_handler.version(self.base_path)] + names)
+
+    def needs_compaction(self):
+        """
+        Prüft, ob die Segmente die konfigurierten Schwellenwerte überschreiten.
+
+        Returns:
+            bool: True, wenn kompaktiert werden sollte.
+        """
+        segments = self._segments()
+        total_bytes = sum(size for _, size in segments)
+        return len(segments) >= self.max_segments or total_bytes >= self.max_segment_bytes
+
+    def _write_manifest(self, base_version, segments):
+        """
+        Hält vor dem Schreiben der Basisdatei fest, welche Segmente sie enthalten wird.
+
+        Returns:
+            str: Der relative Pfad des Manifests.
+        """
+        path = self.data_handler.join(self.segment_dir,
+                                      f"{time.time_ns():020d}_{uuid.uuid4().hex[:12]}{self.MANIFEST_SUFFIX}")
+        self.data_handler.save(path, {"base_before": base_version, "created": time.time(),
+                                      "segments": [posixpath.basename(path) for path, _ in segments]})
+        return path
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                self.data_handler.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _cleanup(self):
+        """
+        Räumt Manifeste abgebrochener Kompaktierungen auf: Bei angewandten werden die übrig
+        gebliebenen Segmente gelöscht, verwaiste nicht angewandte werden verworfen.
+        """
+        segments, manifests = self._listing()
+        if not manifests:
+            return
+        present = {posixpath.basename(path) for path, _ in segments}
+        applied = self._applied_manifests(manifests)
+        for path, manifest in applied:
+            self._remove([self.data_handler.join(self.segment_dir, name)
+                          for name in manifest["segments"] if name in present])
+            self._remove([path])
+        applied_paths = {path for path, _ in applied}
+        for path in manifests:
+            if path in applied_paths:
+                continue
+            try:
+                manifest = self.data_handler.load(path)
+            except FileNotFoundError:
+                continue
+            if time.time() - manifest.get("created", 0) > self.STALE_MANIFEST_SECONDS:
+                self._remove([path])
+
+    def compact(self, **load_args):
+        """
+        Faltet alle aktuell vorhandenen Segmente in die Basisdatei und löscht sie danach.
+
+        Segmente, die während der Kompaktierung neu hinzukommen, bleiben erhalten. Wurde die
+        Basisdatei währenddessen von einem anderen Prozess kompaktiert oder ersetzt, bricht
+        die Kompaktierung ab und lässt alle Segmente stehen.
+
+        Returns:
+            bool: True, wenn kompaktiert wurde.
+        """
+        self._cleanup()
+        segments = self._segments()
+        if not segments:
+            return False
+        logger.info(f"Kompaktiere {len(segments)} Segmente in {self.base_path}")
+        base_version = self.data_handler.version(self.base_path)
+        if base_version != MISSING:
+            frames = [self.data_handler.load(self.base_path, **load_args)]
+        else:
+            frames = []
+        try:
+            frames += [self.data_handler.load(path, **load_args) for path, _ in segments]
+        except FileNotFoundError:
+            logger.info(f"Segmente von {self.base_path} wurden gleichzeitig kompaktiert")
+            return False
+        frames = [frame for frame in frames if not frame.empty]
+        manifest = self._write_manifest(base_version, segments)
+        if frames:
+            try:
+                self.data_handler.save(self.base_path, pd.concat(frames, ignore_index=True),
+                                       expected_version=base_version)
+            except WriteConflictError:
+                logger.info(f"{self.base_path} wurde gleichzeitig geändert, Kompaktierung abgebrochen")
+                self._remove([manifest])
+                return False
+        self._remove([path for path, _ in segments] + [manifest])
+        return True
+
+    def replace(self, frame):
+        """
+        Ersetzt den gesamten Inhalt durch ``frame`` und verwirft alle Segmente.
+
+        Args:
+            frame: Der vollständige neue Inhalt.
+        """
+        self._cleanup()
+        segments = self._segments()
+        manifest = self._write_manifest(self.data_handler.version(self.base_path), segments) if segments else None
+        self.data_handler.save(self.base_path, frame)
+        self._remove([path for path, _ in segments] + ([manifest] if manifest else []))
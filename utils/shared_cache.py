@@ -0,0 +1,130 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+
+class SharedDataCache:
+    """
+    Prozessweiter, versionierter Cache für geladene Benutzerdaten.
+
+    Alle Browser-Sessions desselben Servers teilen sich die geladenen Daten eines
+    Benutzers als unveränderliche Schnappschüsse: eine zweite Session (weiterer Tab,
+    Fachperson und Patient) erhält denselben DataFrame statt einer eigenen Kopie.
+    Jede Datei hat eine Version, die bei jedem Schreibvorgang erhöht wird; Einträge mit
+    einer älteren Version sind veraltet. Der Speicherbedarf ist durch ``max_bytes``
+    begrenzt, darüber werden die am längsten nicht verwendeten Einträge verdrängt.
+
+    Schnappschüsse dürfen nicht direkt verändert werden; Änderungen erzeugen einen
+    neuen DataFrame, der mit ``publish`` veröffentlicht wird.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Initialisiert den Cache.
+
+        Args:
+            max_bytes: Maximale Grösse aller Einträge in Bytes.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._file_versions = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _size(value):
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(deep=True).sum())
+        return sys.getsizeof(value)
+
+    def file_version(self, file_key):
+        """
+        Returns:
+            int: Die Version des letzten Schreibvorgangs auf die Datei, 0 wenn unbekannt.
+        """
+        with self._lock:
+            return self._file_versions.get(file_key, 0)
+
+    def get(self, file_key, variant=None):
+        """
+        Liefert einen aktuellen Schnappschuss.
+
+        Args:
+            file_key: Schlüssel der Datei (z. B. (Root, Pfad)).
+            variant: Unterscheidet mehrere Ausschnitte derselben Datei (z. B. Zeitfenster).
+
+        Returns:
+            tuple: (Version, Wert) oder None, wenn kein aktueller Eintrag existiert.
+        """
+        key = (file_key, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["version"] < self._file_versions.get(file_key, 0):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry["hits"] += 1
+            self.hits += 1
+            return entry["version"], entry["value"]
+
+    def put(self, file_key, variant, value, version):
+        """
+        Legt einen frisch geladenen Schnappschuss ab, ohne die Dateiversion zu ändern.
+
+        Args:
+            version: Die Version des Schnappschusses (prozessweit eindeutig).
+        """
+        with self._lock:
+            if version < self._file_versions.get(file_key, 0):
+                return
+            key = (file_key, variant)
+            self._entries[key] = {"version": version, "value": value, "bytes": self._size(value),
+                                  "hits": 0, "created": time.time()}
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def publish(self, file_key, variant, value, version):
+        """
+        Veröffentlicht einen geänderten Schnappschuss nach einem Schreibvorgang.
+
+        Die Dateiversion wird auf ``version`` gesetzt; Einträge anderer Varianten derselben
+        Datei werden damit veraltet und entfernt.
+        """
+        with self._lock:
+            self._file_versions[file_key] = max(version, self._file_versions.get(file_key, 0))
+            for key in [key for key in self._entries if key[0] == file_key and key[1] != variant]:
+                del self._entries[key]
+            self.put(file_key, variant, value, version)
+
+    def invalidate(self, file_key):
+        """
+        Entfernt alle Einträge einer Datei.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == file_key]:
+                del self._entries[key]
+
+    def _evict(self):
+        total = sum(entry["bytes"] for entry in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            total -= entry["bytes"]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Gesamtgrösse, Treffer, Fehlzugriffe und pro Eintrag Version, Grösse,
+            Treffer und Alter in Sekunden.
+        """
+        now = time.time()
+        with self._lock:
+            entries = [
+                {"file": file_key, "variant": variant, "version": entry["version"],
+                 "bytes": entry["bytes"], "hits": entry["hits"], "age": now - entry["created"]}
+                for (file_key, variant), entry in self._entries.items()
+            ]
+            return {"bytes": sum(entry["bytes"] for entry in entries), "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "entries": entries}
@@ -0,0 +1,678 @@
+import os
+import re
+import json
+import atexit
+import sqlite3
+import weakref
+import posixpath
+import threading
+import logging
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from utils.schema import get_schema
+from utils.statistics import GlucoseStatistics
+from utils.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+USER_PREFIX = "user_data_"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"  # feste Breite: sortiert als Text und für SQL-Datumsfunktionen lesbar
+
+# Häufigkeit -> SQL-Ausdruck für den Beginn der Periode
+PERIODS = {
+    "D": "date({column})",
+    "W": "date({column}, '-6 days', 'weekday 1')",  # Montag der Woche
+    "M": "strftime('%Y-%m-01', {column})",
+}
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _quote(identifier):
+    if not _IDENTIFIER.match(identifier):
+        raise ValueError(f"Ungültiger Tabellen- oder Spaltenname: {identifier}")
+    return f'"{identifier}"'
+
+
+def _sql_time(timestamp):
+    return pd.Timestamp(timestamp).strftime(TIME_FORMAT)
+
+
+def _sql_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def table_name(file_name):
+    """
+    Returns:
+        str: Der Tabellenname für eine Datendatei, z. B. ``data`` für ``data.csv.gz``.
+    """
+    name = posixpath.basename(file_name)
+    while posixpath.splitext(name)[1]:
+        name = posixpath.splitext(name)[0]
+    return name
+
+
+class SqliteDatabase:
+    """
+    Eingebettete SQLite-Datenbank für Messwerte und Anmeldedaten.
+
+    Jede Datendatei (z. B. ``data``) wird zu einer Tabelle mit einer zusätzlichen Spalte
+    ``username`` und einem Index auf (username, Zeitspalte); Zeitfenster, Abfragen pro Benutzer
+    und Auswertungen über alle Benutzer laufen damit als indizierte SQL-Abfragen statt als
+    vollständige Dateiscans. Zeitpunkte werden als ISO-Text gespeichert.
+
+    Jeder Thread erhält eine eigene Verbindung; dank WAL-Journal blockieren Leser die Schreiber
+    nicht, und mehrere Prozesse können dieselbe Datei verwenden. Die Verbindung wird geschlossen,
+    sobald ihr Thread beendet ist, die übrigen mit ``close()`` beim Beenden des Prozesses. Die
+    Datei muss lokal liegen, nicht auf einem WebDAV-Laufwerk.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        """
+        Args:
+            path: Pfad der Datenbankdatei; das Verzeichnis wird bei Bedarf angelegt.
+            timeout: Sekunden, die auf eine Schreibsperre eines anderen Prozesses gewartet wird.
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        self._columns = {}  # Tabelle -> bekannte Spalten
+        atexit.register(self.close)
+        with self.transaction() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS credentials "
+                        "(username TEXT PRIMARY KEY, email TEXT, record TEXT NOT NULL)")
+            con.execute("CREATE TABLE IF NOT EXISTS versions "
+                        "(tbl TEXT NOT NULL, username TEXT NOT NULL, version INTEGER NOT NULL, "
+                        "PRIMARY KEY (tbl, username))")
+            con.execute("CREATE TABLE IF NOT EXISTS appends "
+                        "(tbl TEXT NOT NULL, username TEXT NOT NULL, append_id TEXT NOT NULL, "
+                        "PRIMARY KEY (tbl, username, append_id))")
+
+    def connection(self):
+        """
+        Returns:
+            sqlite3.Connection: Die Verbindung des aktuellen Threads (im Autocommit-Modus).
+        """
+        con = getattr(self._local, "connection", None)
+        if con is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            con = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                  check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = con
+            with self._connections_lock:
+                self._connections.add(con)
+            # Streamlit startet pro Skriptlauf einen neuen Thread: dessen Verbindung nicht offen lassen
+            weakref.finalize(threading.current_thread(), self._release, con)
+        return con
+
+    def _release(self, con):
+        with self._connections_lock:
+            if con not in self._connections:
+                return
+            self._connections.discard(con)
+        con.close()
+
+    def close(self):
+        """
+        Schliesst die Verbindungen aller Threads; ein späterer Zugriff öffnet eine neue.
+        """
+        with self._connections_lock:
+            connections, self._connections = self._connections, set()
+            self._local = threading.local()
+        for con in connections:
+            try:
+                con.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Schliessen der Datenbankverbindung fehlgeschlagen: {e}")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Führt den Block als eine Schreibtransaktion aus; bei einer Ausnahme wird sie verworfen.
+        """
+        con = self.connection()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    def columns(self, table):
+        """
+        Returns:
+            list: Die Spalten einer Tabelle ohne ``username``; leer, wenn sie nicht existiert.
+        """
+        if table not in self._columns:
+            rows = self.connection().execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+            if not rows:
+                return []
+            self._columns[table] = [row[1] for row in rows if row[1] != "username"]
+        return self._columns[table]
+
+    def ensure_table(self, con, table, frame, time_column="datum_zeit"):
+        """
+        Legt die Tabelle für die Spalten von ``frame`` an bzw. ergänzt fehlende Spalten.
+        """
+        existing = self.columns(table)
+        if not existing:
+            definitions = ", ".join(f"{_quote(column)} {_sql_type(dtype)}" for column, dtype in frame.dtypes.items())
+            con.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} (username TEXT NOT NULL, {definitions})")
+            con.execute(f"CREATE INDEX IF NOT EXISTS {_quote(table + '_username_zeit')} "
+                        f"ON {_quote(table)} (username, {_quote(time_column)})")
+        else:
+            for column in frame.columns:
+                if column not in existing:
+                    con.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column)} "
+                                f"{_sql_type(frame[column].dtype)}")
+        self._columns.pop(table, None)
+
+    def table(self, table, username, time_column="datum_zeit"):
+        """
+        Returns:
+            SqliteTableStore: Die Datensätze eines Benutzers in einer Tabelle.
+        """
+        return SqliteTableStore(self, table, username, time_column)
+
+    @METRICS.timed("sqlite_seconds", op="query")
+    def query(self, sql, params=(), schema=None, parse_dates=None):
+        """
+        Führt eine beliebige Abfrage aus.
+
+        Args:
+            sql: Die SQL-Abfrage mit ``?``-Platzhaltern.
+            params: Die Werte der Platzhalter.
+            schema: Name eines registrierten Schemas, in dessen Datentypen das Ergebnis
+                umgewandelt wird.
+            parse_dates: Spalten, die als Zeitpunkte gelesen werden.
+
+        Returns:
+            pd.DataFrame: Das Ergebnis.
+        """
+        frame = pd.read_sql_query(sql, self.connection(), params=list(params))
+        for column in parse_dates or []:
+            frame[column] = pd.to_datetime(frame[column], format="ISO8601")
+        if schema is not None:
+            frame = get_schema(schema).coerce(frame, strict=False)
+        return frame
+
+    def windowed_averages(self, table, username=None, freq="W", start=None, end=None, by_zeitpunkt=False,
+                          time_column="datum_zeit", value_column="blutzuckerwert"):
+        """
+        Mittelwerte pro Tag, Woche oder Monat, in SQL über den Index berechnet.
+
+        Args:
+            table: Die Tabelle.
+            username: Nur die Werte dieses Benutzers, None für alle Benutzer gemeinsam.
+            freq: "D", "W" (Wochen ab Montag) oder "M".
+            start: Beginn des Zeitraums (einschliesslich), None für unbeschränkt.
+            end: Ende des Zeitraums (ausschliesslich), None für unbeschränkt.
+            by_zeitpunkt: Zusätzlich nach Messzeitpunkt gruppieren.
+
+        Returns:
+            pd.DataFrame: "periode" (Zeitpunkt), optional "zeitpunkt", "anzahl", "mittelwert",
+            "minimum" und "maximum", nach Periode sortiert.
+        """
+        if freq not in PERIODS:
+            raise ValueError(f"Nicht unterstützte Häufigkeit: {freq}")
+        if not self.columns(table):
+            return pd.DataFrame({"periode": pd.Series(dtype="datetime64[ns]"), "anzahl": pd.Series(dtype="int64"),
+                                 "mittelwert": pd.Series(dtype="float64"), "minimum": pd.Series(dtype="float64"),
+                                 "maximum": pd.Series(dtype="float64")})
+        time, value = _quote(time_column), _quote(value_column)
+        groups = ["periode"] + (["zeitpunkt"] if by_zeitpunkt else [])
+        where, params = self._filters(username, start, end, time_column)
+        frame = self.query(
+            f"SELECT {PERIODS[freq].format(column=time)} AS periode"
+            f"{', zeitpunkt' if by_zeitpunkt else ''}, COUNT({value}) AS anzahl, AVG({value}) AS mittelwert, "
+            f"MIN({value}) AS minimum, MAX({value}) AS maximum "
+            f"FROM {_quote(table)} WHERE {value} IS NOT NULL{where} "
+            f"GROUP BY {', '.join(groups)} ORDER BY {', '.join(groups)}",
+            params, parse_dates=["periode"])
+        return frame.astype({"anzahl": "int64", "mittelwert": "float64", "minimum": "float64", "maximum": "float64"})
+
+    def rolling_average(self, table, username, window="7D", time_column="datum_zeit", value_column="blutzuckerwert"):
+        """
+        Gleitender Mittelwert über ein Zeitfenster, als SQL-Fensterfunktion berechnet.
+
+        Args:
+            window: Länge des Fensters, das jeweils beim Messzeitpunkt endet, z. B. "7D".
+
+        Returns:
+            pd.DataFrame: Zeitspalte, Wertspalte und "mittelwert" in zeitlicher Reihenfolge.
+        """
+        if not self.columns(table):
+            return pd.DataFrame({time_column: pd.Series(dtype="datetime64[ns]"),
+                                 value_column: pd.Series(dtype="float64"), "mittelwert": pd.Series(dtype="float64")})
+        days = pd.Timedelta(window) / pd.Timedelta(days=1)
+        time, value = _quote(time_column), _quote(value_column)
+        frame = self.query(
+            f"SELECT {time}, {value}, AVG({value}) OVER (ORDER BY julianday({time}) "
+            f"RANGE BETWEEN {float(days)!r} PRECEDING AND CURRENT ROW) AS mittelwert "
+            f"FROM {_quote(table)} WHERE username = ? AND {value} IS NOT NULL ORDER BY {time}",
+            [username], parse_dates=[time_column])
+        return frame.astype({"mittelwert": "float64"})
+
+    def cohort_report(self, table, time_column="datum_zeit", value_column="blutzuckerwert"):
+        """
+        Kennzahlen pro Benutzer über alle Benutzer mit einer einzigen Abfrage, im Format von
+        ``CohortAnalytics.run``.
+
+        Returns:
+            pd.DataFrame: Eine Zeile pro Benutzer (Index: Benutzername).
+        """
+        columns = ["anzahl", "mittelwert", "standardabweichung", "zeit_im_zielbereich", "hypo_anteil",
+                   "hba1c", "letzter_wert", "letzte_hypoglykaemie"]
+        if not self.columns(table):
+            return pd.DataFrame(columns=columns).rename_axis("benutzer")
+        low, high = GlucoseStatistics.TARGET_RANGE
+        time, value = _quote(time_column), _quote(value_column)
+        sums = self.query(
+            f"SELECT username AS benutzer, COUNT({value}) AS n, SUM({value}) AS summe, "
+            f"SUM({value} * {value}) AS quadrate, SUM({value} BETWEEN ? AND ?) AS im_bereich, "
+            f"SUM({value} < ?) AS hypo, MAX({time}) AS letzter_wert, "
+            f"MAX(CASE WHEN {value} < ? THEN {time} END) AS letzte_hypoglykaemie "
+            f"FROM {_quote(table)} WHERE {value} IS NOT NULL AND {time} IS NOT NULL "
+            f"GROUP BY username ORDER BY username",
+            [low, high, low, low]).set_index("benutzer")
+        n = sums["n"].astype(float)
+        mean = sums["summe"] / n
+        variance = ((sums["quadrate"] - sums["summe"] ** 2 / n) / (n - 1)).where(n > 1, 0.0)
+
+        def iso(values):
+            return pd.to_datetime(values, format="ISO8601").map(lambda t: None if pd.isna(t) else t.isoformat())
+
+        return pd.DataFrame({
+            "anzahl": sums["n"].astype("int64"),
+            "mittelwert": mean,
+            "standardabweichung": np.sqrt(variance.clip(lower=0.0)),
+            "zeit_im_zielbereich": sums["im_bereich"] / n,
+            "hypo_anteil": sums["hypo"] / n,
+            "hba1c": GlucoseStatistics.hba1c(mean),
+            "letzter_wert": iso(sums["letzter_wert"]),
+            "letzte_hypoglykaemie": iso(sums["letzte_hypoglykaemie"]),
+        }, index=sums.index)
+
+    @staticmethod
+    def _filters(username, start, end, time_column):
+        where, params = "", []
+        if username is not None:
+            where += " AND username = ?"
+            params.append(username)
+        if start is not None:
+            where += f" AND {_quote(time_column)} >= ?"
+            params.append(_sql_time(start))
+        if end is not None:
+            where += f" AND {_quote(time_column)} < ?"
+            params.append(_sql_time(end))
+        return where, params
+
+
+class SqliteTableStore:
+    """
+    Die Datensätze eines Benutzers in einer Tabelle von ``SqliteDatabase``.
+
+    Bietet dieselben Methoden wie ``PartitionedStore`` (``load`` mit Zeitfenster, ``write``,
+    ``append``, ``earliest``, ``load_index``, ``iter_chunks``, ``version``), sodass der
+    DataManager sie an dessen Stelle verwenden kann. Die Monate dienen weiterhin als Einheit
+    für ``write`` und Zeitfenster, werden aber nicht mehr als einzelne Dateien gespeichert.
+    """
+
+    def __init__(self, database, table, username, time_column="datum_zeit"):
+        """
+        Args:
+            database: Die SqliteDatabase.
+            table: Der Tabellenname, z. B. ``data``.
+            username: Der Benutzer, dessen Datensätze gelesen und geschrieben werden.
+            time_column: Die Zeitspalte für Zeitfenster und Index.
+        """
+        _quote(table)
+        self.database = database
+        self.table = table
+        self.username = username
+        self.time_column = time_column
+
+    @staticmethod
+    def partition_start(timestamp):
+        return pd.Timestamp(timestamp).to_period("M").start_time
+
+    def exists(self):
+        """
+        Returns:
+            bool: True, wenn der Benutzer Datensätze in der Tabelle hat.
+        """
+        if not self.database.columns(self.table):
+            return False
+        return self.database.connection().execute(
+            f"SELECT 1 FROM {_quote(self.table)} WHERE username = ? LIMIT 1", [self.username]).fetchone() is not None
+
+    def load_index(self):
+        """
+        Returns:
+            dict: Monat (``YYYY-MM``) -> {"start", "end", "rows"} wie bei ``PartitionedStore``.
+        """
+        if not self.database.columns(self.table):
+            return {}
+        time = _quote(self.time_column)
+        rows = self.database.connection().execute(
+            f"SELECT substr({time}, 1, 7), MIN({time}), MAX({time}), COUNT(*) FROM {_quote(self.table)} "
+            f"WHERE username = ? GROUP BY substr({time}, 1, 7)", [self.username]).fetchall()
+        return {key: {"start": pd.Timestamp(start).isoformat(), "end": pd.Timestamp(end).isoformat(), "rows": count}
+                for key, start, end, count in rows if key is not None}
+
+    def earliest(self):
+        """
+        Returns:
+            pd.Timestamp: Der früheste gespeicherte Zeitpunkt oder None.
+        """
+        if not self.database.columns(self.table):
+            return None
+        value = self.database.connection().execute(
+            f"SELECT MIN({_quote(self.time_column)}) FROM {_quote(self.table)} WHERE username = ?",
+            [self.username]).fetchone()[0]
+        return None if value is None else pd.Timestamp(value)
+
+    def version(self):
+        """
+        Returns:
+            str: Die Version der Datensätze des Benutzers; sie ändert sich mit jedem Schreibvorgang.
+        """
+        row = self.database.connection().execute(
+            "SELECT version FROM versions WHERE tbl = ? AND username = ?", [self.table, self.username]).fetchone()
+        return f"sqlite:{row[0] if row else 0}"
+
+    def _select(self, start=None, end=None, columns=None):
+        if columns is None:
+            columns = self.database.columns(self.table)
+        # Wie bei den Partitionen werden immer ganze Monate gelesen
+        if start is not None:
+            start = self.partition_start(start)
+        if end is not None:
+            end = self.partition_start(end) + pd.offsets.MonthBegin(1)
+        where, params = SqliteDatabase._filters(self.username, start, end, self.time_column)
+        sql = (f"SELECT {', '.join(_quote(column) for column in columns)} FROM {_quote(self.table)} "
+               f"WHERE 1 = 1{where} ORDER BY {_quote(self.time_column)}, rowid")
+        return sql, params
+
+    def _typed(self, frame, schema=None):
+        if schema is not None:
+            return get_schema(schema).coerce(frame, strict=False)
+        if self.time_column in frame.columns:
+            frame[self.time_column] = pd.to_datetime(frame[self.time_column], format="ISO8601")
+        return frame
+
+    def load(self, start=None, end=None, initial_value=None, columns=None, schema=None, **load_args):
+        """
+        Lädt die Datensätze der Monate, die das Zeitfenster überlappen.
+
+        Returns:
+            pd.DataFrame: Die typisierten Datensätze in zeitlicher Reihenfolge, oder
+            ``initial_value``, wenn keine vorhanden sind.
+        """
+        if not self.database.columns(self.table):
+            return initial_value
+        sql, params = self._select(start, end, columns)
+        with METRICS.timer("sqlite_seconds", op="load"):
+            frame = pd.read_sql_query(sql, self.database.connection(), params=params)
+        if frame.empty:
+            return initial_value
+        return self._typed(frame, schema)
+
+    def iter_chunks(self, start=None, end=None, chunksize=10_000, columns=None, schema=None, **load_args):
+        """
+        Liest die Datensätze stückweise über einen Datenbank-Cursor.
+
+        Yields:
+            pd.DataFrame: Die typisierten Datensätze in zeitlicher Reihenfolge.
+        """
+        if not self.database.columns(self.table):
+            return
+        sql, params = self._select(start, end, columns)
+        for frame in pd.read_sql_query(sql, self.database.connection(), params=params, chunksize=chunksize):
+            yield self._typed(frame, schema)
+
+    def _insert(self, con, frame):
+        self.database.ensure_table(con, self.table, frame, self.time_column)
+        rows = frame.copy()
+        for column in rows.columns:
+            if pd.api.types.is_datetime64_any_dtype(rows[column]):
+                rows[column] = rows[column].dt.strftime(TIME_FORMAT)
+        rows = rows.astype(object)
+        rows = rows.where(rows.notna(), None)
+        columns = ", ".join(["username"] + [_quote(column) for column in rows.columns])
+        placeholders = ", ".join(["?"] * (len(rows.columns) + 1))
+        con.executemany(f"INSERT INTO {_quote(self.table)} ({columns}) VALUES ({placeholders})",
+                        ((self.username, *row) for row in rows.itertuples(index=False, name=None)))
+
+    def _bump_version(self, con):
+        con.execute("INSERT INTO versions (tbl, username, version) VALUES (?, ?, 1) "
+                    "ON CONFLICT (tbl, username) DO UPDATE SET version = version + 1", [self.table, self.username])
+
+    @METRICS.timed("sqlite_seconds", op="write")
+    def write(self, frame):
+        """
+        Ersetzt in einer Transaktion alle Datensätze der Monate, in die ``frame`` fällt, durch
+        dessen Inhalt. Andere Monate bleiben unverändert.
+        """
+        if frame is None or frame.empty:
+            return
+        months = pd.to_datetime(frame[self.time_column]).dt.to_period("M").dropna().unique()
+        with self.database.transaction() as con:
+            if self.database.columns(self.table):
+                for month in months:
+                    con.execute(f"DELETE FROM {_quote(self.table)} WHERE username = ? AND "
+                                f"{_quote(self.time_column)} >= ? AND {_quote(self.time_column)} < ?",
+                                [self.username, _sql_time(month.start_time), _sql_time((month + 1).start_time)])
+            self._insert(con, frame)
+            self._bump_version(con)
+
+    @METRICS.timed("sqlite_seconds", op="bulk_insert")
+    def bulk_insert(self, chunks):
+        """
+        Fügt viele Datensätze stückweise in einer einzigen Transaktion ein, z. B. bei der
+        Übernahme einer Dateiablage; nur das aktuelle Stück wird im Speicher gehalten.
+
+        Args:
+            chunks: Iterierbare DataFrames mit den neuen Datensätzen.
+
+        Returns:
+            int: Die Anzahl eingefügter Datensätze.
+        """
+        rows = 0
+        with self.database.transaction() as con:
+            for chunk in chunks:
+                if chunk is not None and not chunk.empty:
+                    self._insert(con, chunk)
+                    rows += len(chunk)
+            self._bump_version(con)
+        return rows
+
+    @METRICS.timed("sqlite_seconds", op="append")
+    def append(self, frame, append_id=None):
+        """
+        Fügt neue Datensätze in einer Transaktion ein.
+
+        Args:
+            frame: Die neuen Datensätze.
+            append_id: Optionale eindeutige ID des Auftrags; ein erneutes ``append`` mit derselben
+                ID wird übersprungen.
+        """
+        if frame is None or frame.empty:
+            return
+        with self.database.transaction() as con:
+            if append_id is not None:
+                inserted = con.execute("INSERT OR IGNORE INTO appends (tbl, username, append_id) VALUES (?, ?, ?)",
+                                       [self.table, self.username, append_id]).rowcount
+                if not inserted:
+                    return
+            self._insert(con, frame)
+            self._bump_version(con)
+
+
+class SqliteCredentialStore:
+    """
+    Anmeldedaten in der Tabelle ``credentials`` von ``SqliteDatabase``, mit denselben Methoden
+    wie ``ShardedCredentialStore``. Der Datensatz im Format von ``stauth.Authenticate`` wird
+    als JSON abgelegt, die E-Mail-Adresse zusätzlich als eigene Spalte.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def exists(self):
+        """
+        Returns:
+            bool: True, wenn bereits Benutzer angelegt sind.
+        """
+        return self.database.connection().execute("SELECT 1 FROM credentials LIMIT 1").fetchone() is not None
+
+    @METRICS.timed("credentials_seconds", op="load_index")
+    def load_index(self):
+        """
+        Returns:
+            dict: Benutzername -> {"email": ...}.
+        """
+        rows = self.database.connection().execute("SELECT username, email FROM credentials").fetchall()
+        return {username: {"email": email} for username, email in rows}
+
+    @METRICS.timed("credentials_seconds", op="load_user")
+    def load_user(self, username):
+        """
+        Returns:
+            dict: Der Datensatz oder None, wenn der Benutzer nicht existiert.
+        """
+        row = self.database.connection().execute(
+            "SELECT record FROM credentials WHERE username = ?", [username]).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    @METRICS.timed("credentials_seconds", op="save_user")
+    def save_user(self, username, record, create=False):
+        """
+        Speichert den Datensatz eines Benutzers.
+
+        Raises:
+            CredentialConflictError: Wenn ``create`` gesetzt ist und der Benutzer bereits existiert.
+        """
+        from utils.credential_store import CredentialConflictError
+
+        verb = "INSERT OR IGNORE" if create else "INSERT OR REPLACE"
+        with self.database.transaction() as con:
+            inserted = con.execute(f"{verb} INTO credentials (username, email, record) VALUES (?, ?, ?)",
+                                   [username, record.get("email"), json.dumps(record)]).rowcount
+        if not inserted:
+            raise CredentialConflictError(f"Benutzer {username} existiert bereits")
+
+    def rebuild_index(self):
+        """
+        Nichts zu tun: der Index ist die Tabelle selbst.
+        """
+
+    def import_credentials(self, credentials):
+        """
+        Übernimmt alle Benutzer aus einer bisherigen ``credentials.yaml``.
+
+        Args:
+            credentials: Der Inhalt der Datei ({"usernames": {...}}).
+        """
+        users = credentials.get("usernames") or {}
+        with self.database.transaction() as con:
+            # Gleichzeitige Übernahmen anderer Sessions überschreiben keine neueren Datensätze
+            con.executemany("INSERT OR IGNORE INTO credentials (username, email, record) VALUES (?, ?, ?)",
+                            [(username, record.get("email"), json.dumps(record)) for username, record in users.items()])
+
+
+class SqliteCohortAnalytics:
+    """
+    Gegenstück zu ``CohortAnalytics`` für die Datenbank: eine einzige Abfrage ersetzt das
+    Laden der Dateien aller Benutzer.
+    """
+
+    def __init__(self, database, file_name="data"):
+        self.database = database
+        self.table = table_name(file_name)
+        self.reprocessed = []
+        self.errors = {}
+
+    def run(self):
+        """
+        Returns:
+            pd.DataFrame: Eine Zeile pro Benutzer mit den Kennzahlen aus ``cohort.summarize``.
+        """
+        return self.database.cohort_report(self.table)
+
+
+def migrate_to_sqlite(data_handler, database, file_name="data", credentials_folder="credentials",
+                      credentials_file="credentials.yaml", schema="glucose", chunksize=10_000):
+    """
+    Übernimmt die Daten aller Benutzer (``user_data_*``) und die Anmeldedaten aus der
+    Dateiablage in die Datenbank.
+
+    Pro Benutzer wird die erste vorhandene Datendatei aus ``file_name``, ``data.parquet`` und
+    ``data.csv`` stückweise in einer Transaktion übernommen; Benutzer, die bereits Datensätze in
+    der Datenbank haben, werden übersprungen. Die Dateien bleiben als Sicherung erhalten. Die
+    Anmeldedaten stammen aus dem ``ShardedCredentialStore`` oder, falls dieser fehlt, aus
+    ``credentials_file``; sie werden nur übernommen, solange die Datenbank noch keine enthält.
+
+    Args:
+        data_handler: DataHandler auf dem Root-Verzeichnis der App.
+        database: Die Ziel-Datenbank.
+
+    Returns:
+        dict: Anzahl übernommener Benutzer ("benutzer"), Datensätze ("datensaetze") und
+        Anmeldedaten ("anmeldedaten").
+    """
+    from utils.credential_store import ShardedCredentialStore
+    from utils.partitioned_store import PartitionedStore
+    from utils.segment_store import SegmentStore
+
+    result = {"benutzer": 0, "datensaetze": 0, "anmeldedaten": 0}
+    table = table_name(file_name)
+    for folder in data_handler.list_dirs(""):
+        if not folder.startswith(USER_PREFIX):
+            continue
+        target = database.table(table, folder[len(USER_PREFIX):])
+        if target.exists():
+            continue
+        for name in dict.fromkeys([file_name, "data.parquet", "data.csv"]):
+            path = posixpath.join(folder, name)
+            if posixpath.splitext(name)[-1] == "":
+                store = PartitionedStore(data_handler, path)
+                if store.exists():
+                    chunks = store.iter_chunks(chunksize=chunksize, schema=schema)
+                    break
+            else:
+                store = SegmentStore(data_handler, path)
+                if data_handler.exists(path) or data_handler.list_files(store.segment_dir):
+                    chunks = store.iter_chunks(chunksize, schema=schema)
+                    break
+        else:
+            continue
+        rows = target.bulk_insert(chunks)
+        logger.info(f"{folder}: {rows} Datensätze in die Datenbank übernommen")
+        result["benutzer"] += 1
+        result["datensaetze"] += rows
+
+    credentials = SqliteCredentialStore(database)
+    if not credentials.exists():
+        sharded = ShardedCredentialStore(data_handler, credentials_folder)
+        if sharded.exists():
+            users = {username: sharded.load_user(username) for username in sharded.load_index()}
+            users = {username: record for username, record in users.items() if record is not None}
+        else:
+            users = (data_handler.load(credentials_file, initial_value={}) or {}).get("usernames") or {}
+        credentials.import_credentials({"usernames": users})
+        result["anmeldedaten"] = len(users)
+    return result
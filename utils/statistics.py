@@ -0,0 +1,289 @@
+import math
+import pandas as pd
+
+ALLE = "alle"
+
+
+class GlucoseStatistics:
+    """
+    Laufend nachgeführte Kennzahlen der Blutzuckerwerte.
+
+    Für jede Gruppe (gesamt, pro Tag, pro Kalenderwoche, jeweils für alle Werte und pro
+    Zeitpunkt) werden Anzahl, Mittelwert, Summe der quadrierten Abweichungen vom Mittelwert,
+    Minimum, Maximum und die Anzahl Werte im Zielbereich gespeichert. Ein neuer Wert
+    aktualisiert diese Akkumulatoren in O(1) nach Welford, Teilstatistiken werden nach Chan
+    zusammengeführt; so bleibt die Standardabweichung auch nach Jahren von Werten genau.
+    Mittelwert, Standardabweichung, Zeit im Zielbereich und geschätzter HbA1c werden
+    daraus abgeleitet, ohne die Historie erneut zu lesen. ``watermark`` hält den spätesten
+    erfassten Zeitpunkt fest, damit eine veraltete Statistik nur um die neueren Werte
+    ergänzt werden muss. Mit ``retention`` werden nur die neuesten Tage und Wochen
+    behalten, damit eine laufend gespeicherte Statistik nicht unbegrenzt wächst.
+    """
+
+    TARGET_RANGE = (70, 180)
+    FORMAT = 2  # Version von ``to_dict``; ältere Stände werden neu aufgebaut
+
+    def __init__(self, groups=None, rows=0, watermark=None, retention=None):
+        """
+        Initialisiert die Statistik.
+
+        Args:
+            groups: Bereits vorhandene Akkumulatoren, z. B. aus ``from_dict``.
+            rows: Anzahl der bisher verarbeiteten Datensätze, auch solcher ohne gültigen Wert.
+            watermark: Der späteste bisher erfasste Zeitpunkt.
+            retention: Scope -> Anzahl der neuesten Perioden, die behalten werden, z. B.
+                ``{"tag": 31, "woche": 53}``; None behält alle.
+        """
+        self.groups = groups if groups is not None else {}
+        self.rows = rows
+        self.watermark = watermark
+        self.retention = retention or {}
+
+    @classmethod
+    def in_target_range(cls, values):
+        """
+        Args:
+            values: Ein Wert oder ein Array bzw. eine Series von Werten in mg/dL.
+
+        Returns:
+            Für jeden Wert True, wenn er im Zielbereich ``TARGET_RANGE`` liegt.
+        """
+        low, high = cls.TARGET_RANGE
+        return (values >= low) & (values <= high)
+
+    @staticmethod
+    def hba1c(mean):
+        """
+        Schätzt den HbA1c aus dem mittleren Blutzucker nach der ADAG-Studie:
+        eAG (mg/dL) = 28.7 * HbA1c - 46.7.
+
+        Args:
+            mean: Der mittlere Blutzucker in mg/dL, als Zahl oder Series.
+
+        Returns:
+            Der geschätzte HbA1c in Prozent.
+        """
+        return (mean + 46.7) / 28.7
+
+    @staticmethod
+    def _group_key(scope, period, zeitpunkt):
+        return f"{scope}|{period}|{zeitpunkt}"
+
+    @staticmethod
+    def _periods(timestamp):
+        timestamp = pd.Timestamp(timestamp)
+        iso = timestamp.isocalendar()
+        return [("gesamt", ""),
+                ("tag", timestamp.strftime("%Y-%m-%d")),
+                ("woche", f"{iso[0]}-W{iso[1]:02d}")]
+
+    def update(self, record):
+        """
+        Nimmt einen neuen Datensatz in alle betroffenen Gruppen auf.
+
+        Args:
+            record: Dictionary mit ``datum_zeit``, ``blutzuckerwert`` und ``zeitpunkt``.
+        """
+        self.rows += 1
+        timestamp = record.get("datum_zeit")
+        if timestamp is not None and not pd.isna(timestamp):
+            self._advance(pd.Timestamp(timestamp))
+        value = record.get("blutzuckerwert")
+        if value is None or pd.isna(value):
+            return
+        value = float(value)
+        in_range = int(self.in_target_range(value))
+        for scope, period in self._periods(record["datum_zeit"]):
+            created = False
+            for zeitpunkt in (ALLE, record.get("zeitpunkt")):
+                if zeitpunkt is None or pd.isna(zeitpunkt):
+                    continue
+                key = self._group_key(scope, period, zeitpunkt)
+                acc = self.groups.get(key)
+                if acc is None:
+                    self.groups[key] = [1, value, 0.0, value, value, in_range]
+                    created = True
+                else:
+                    acc[0] += 1
+                    delta = value - acc[1]
+                    acc[1] += delta / acc[0]
+                    acc[2] += delta * (value - acc[1])
+                    acc[3] = min(acc[3], value)
+                    acc[4] = max(acc[4], value)
+                    acc[5] += in_range
+            if created:
+                self._prune(scope)
+
+    @classmethod
+    def from_frame(cls, data_df):
+        """
+        Berechnet alle Akkumulatoren vektorisiert aus einem vollständigen DataFrame.
+
+        Args:
+            data_df: DataFrame mit ``datum_zeit``, ``blutzuckerwert`` und ``zeitpunkt``.
+
+        Returns:
+            GlucoseStatistics: Die neu aufgebaute Statistik.
+        """
+        stats = cls()
+        if data_df is None or data_df.empty:
+            return stats
+        stats.rows = len(data_df)
+        latest = pd.to_datetime(data_df["datum_zeit"]).max()
+        if not pd.isna(latest):
+            stats.watermark = latest
+
+        frame = pd.DataFrame({
+            "datum_zeit": pd.to_datetime(data_df["datum_zeit"]),
+            "wert": pd.to_numeric(data_df["blutzuckerwert"], errors="coerce").astype(float),
+            "zeitpunkt": data_df["zeitpunkt"].astype(object),
+        }).dropna(subset=["wert", "datum_zeit"])
+        frame["im_bereich"] = cls.in_target_range(frame["wert"]).astype(int)
+        iso = frame["datum_zeit"].dt.isocalendar()
+        periods = {
+            "gesamt": pd.Series("", index=frame.index),
+            "tag": frame["datum_zeit"].dt.strftime("%Y-%m-%d"),
+            "woche": iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2),
+        }
+        for scope, period in periods.items():
+            for by_zeitpunkt in (False, True):
+                keys = [period.rename("periode")]
+                if by_zeitpunkt:
+                    keys.append(frame["zeitpunkt"])
+                agg = frame.groupby(keys, dropna=True, observed=True).agg(
+                    n=("wert", "size"), mittelwert=("wert", "mean"), varianz=("wert", "var"),
+                    minimum=("wert", "min"), maximum=("wert", "max"), im_bereich=("im_bereich", "sum"))
+                # Quadrierte Abweichungen vom Gruppenmittel statt einer Quadratsumme der Rohwerte
+                agg["abweichungen"] = (agg["varianz"] * (agg["n"] - 1)).fillna(0.0)
+                for group, row in agg.iterrows():
+                    if by_zeitpunkt:
+                        periode, zeitpunkt = group
+                    else:
+                        periode, zeitpunkt = group, ALLE
+                    stats.groups[cls._group_key(scope, periode, zeitpunkt)] = [
+                        int(row["n"]), float(row["mittelwert"]), float(row["abweichungen"]),
+                        float(row["minimum"]), float(row["maximum"]), int(row["im_bereich"])]
+        return stats
+
+    def merge(self, other):
+        """
+        Nimmt die Akkumulatoren einer weiteren Statistik auf, z. B. eines weiteren Teilstücks
+        einer stückweise gelesenen Historie.
+
+        Args:
+            other: Die hinzuzufügende GlucoseStatistics.
+
+        Returns:
+            GlucoseStatistics: Diese Statistik.
+        """
+        self.rows += other.rows
+        if other.watermark is not None:
+            self._advance(other.watermark)
+        for key, other_acc in other.groups.items():
+            acc = self.groups.get(key)
+            if acc is None:
+                self.groups[key] = list(other_acc)
+            else:
+                n = acc[0] + other_acc[0]
+                delta = other_acc[1] - acc[1]
+                acc[1] += delta * other_acc[0] / n
+                acc[2] += other_acc[2] + delta * delta * acc[0] * other_acc[0] / n
+                acc[0] = n
+                acc[3] = min(acc[3], other_acc[3])
+                acc[4] = max(acc[4], other_acc[4])
+                acc[5] += other_acc[5]
+        for scope in self.retention:
+            self._prune(scope)
+        return self
+
+    def _advance(self, timestamp):
+        if self.watermark is None or timestamp > self.watermark:
+            self.watermark = timestamp
+
+    def _prune(self, scope):
+        # Nur die neuesten Perioden behalten; die Schlüssel sortieren chronologisch
+        limit = self.retention.get(scope)
+        if limit is None:
+            return
+        periods = self.periods(scope)
+        if len(periods) <= limit:
+            return
+        stale = set(periods[:-limit])
+        for key in [key for key in self.groups if key.split("|")[0] == scope and key.split("|")[1] in stale]:
+            del self.groups[key]
+
+    @property
+    def count(self):
+        """
+        Returns:
+            int: Anzahl aller erfassten Werte.
+        """
+        acc = self.groups.get(self._group_key("gesamt", "", ALLE))
+        return acc[0] if acc else 0
+
+    def summary(self, scope="gesamt", period="", zeitpunkt=ALLE):
+        """
+        Leitet die Kennzahlen einer Gruppe aus ihren Akkumulatoren ab.
+
+        Args:
+            scope: "gesamt", "tag" oder "woche".
+            period: Datum (``YYYY-MM-DD``) bzw. Kalenderwoche (``YYYY-Www``), leer für gesamt.
+            zeitpunkt: Ein Messzeitpunkt oder "alle".
+
+        Returns:
+            dict: Anzahl, Mittelwert, Standardabweichung, Minimum, Maximum, Zeit im
+            Zielbereich (Anteil) und geschätzter HbA1c (%), oder None ohne Werte.
+        """
+        acc = self.groups.get(self._group_key(scope, period, zeitpunkt))
+        if not acc:
+            return None
+        n, mean, deviations, minimum, maximum, in_range = acc
+        variance = deviations / (n - 1) if n > 1 else 0.0
+        return {
+            "anzahl": n,
+            "mittelwert": mean,
+            "standardabweichung": math.sqrt(max(variance, 0.0)),
+            "minimum": minimum,
+            "maximum": maximum,
+            "zeit_im_zielbereich": in_range / n,
+            "hba1c": self.hba1c(mean),
+        }
+
+    def periods(self, scope):
+        """
+        Returns:
+            list: Alle vorhandenen Perioden eines Scopes, aufsteigend sortiert.
+        """
+        prefix = f"{scope}|"
+        return sorted({key.split("|")[1] for key in self.groups if key.startswith(prefix)})
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: Serialisierbare Darstellung für die Ablage als JSON.
+        """
+        return {"format": self.FORMAT, "target_range": list(self.TARGET_RANGE), "rows": self.rows,
+                "watermark": None if self.watermark is None else self.watermark.isoformat(),
+                "groups": self.groups}
+
+    @classmethod
+    def from_dict(cls, data, retention=None):
+        """
+        Stellt die Statistik aus ``to_dict`` wieder her.
+
+        Args:
+            data: Das Ergebnis von ``to_dict``.
+            retention: Siehe ``__init__``.
+
+        Returns:
+            GlucoseStatistics: Die Statistik, oder None für einen Stand in einem älteren
+            Format, der neu aufgebaut werden muss.
+        """
+        if data.get("format") != cls.FORMAT:
+            return None
+        watermark = data.get("watermark")
+        stats = cls(groups=data.get("groups", {}), rows=data.get("rows", 0),
+                    watermark=None if watermark is None else pd.Timestamp(watermark), retention=retention)
+        for scope in stats.retention:
+            stats._prune(scope)
+        return stats
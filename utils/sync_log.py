@@ -0,0 +1,282 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+import pandas as pd
+from utils.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# HTTP-Status, bei denen ein späterer Versuch gelingen kann
+RETRYABLE_STATUS = {408, 423, 425, 429}
+
+
+def is_retryable(error):
+    """
+    Unterscheidet vorübergehende Fehler (Netzwerk, Dateisystem, Server überlastet) von
+    dauerhaften (z. B. ungültige Daten oder ein nicht auflösbarer Schreibkonflikt).
+
+    Args:
+        error: Die beim Einspielen aufgetretene Exception.
+
+    Returns:
+        bool: True, wenn das Einspielen später erneut versucht werden soll.
+    """
+    if isinstance(error, OSError):  # auch ConnectionError und TimeoutError
+        return True
+    try:
+        import httpx
+        if isinstance(error, httpx.TransportError):
+            return True
+    except ImportError:
+        pass
+    try:
+        from webdav4.client import BadGatewayError, InsufficientStorage, ResourceLocked
+        if isinstance(error, (BadGatewayError, InsufficientStorage, ResourceLocked)):
+            return True
+    except ImportError:
+        pass
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status is not None and (status >= 500 or status in RETRYABLE_STATUS)
+
+
+class SyncLog:
+    """
+    Lokales Write-Ahead-Log mit Synchronisation im Hintergrund.
+
+    Jeder Schreibauftrag wird zuerst als Eintrag im lokalen Verzeichnis abgelegt
+    (``<zeit>_<id>.json`` und bei Tabellen zusätzlich ``<zeit>_<id>.parquet``) und mit
+    ``fsync`` festgeschrieben; das dauert nur Millisekunden und gelingt auch ohne
+    Verbindung zum Server. Ein Worker-Thread spielt die Einträge in Reihenfolge über
+    ``apply`` in den entfernten Speicher ein und löscht sie erst danach. Schlägt das
+    Einspielen vorübergehend fehl (siehe ``is_retryable``), wird es mit exponentiell
+    wachsender Wartezeit wiederholt. Dauerhaft fehlschlagende Einträge werden mit der
+    Fehlermeldung ins Unterverzeichnis ``dead/`` verschoben, damit sie die Einträge
+    anderer Benutzer nicht blockieren. Einträge aus einem früheren Prozess werden beim
+    Erstellen wieder aufgenommen.
+
+    ``apply`` erhält den Eintrag (mit eindeutiger ``id``) und dessen Inhalt und muss
+    idempotent sein, da ein Eintrag nach einem Absturz erneut eingespielt werden kann.
+    """
+
+    DEAD_LETTER_DIR = "dead"
+
+    def __init__(self, directory, apply, retry_initial=1.0, retry_max=60.0, retryable=is_retryable):
+        """
+        Initialisiert das Log und nimmt vorhandene Einträge wieder auf.
+
+        Args:
+            directory: Lokales Verzeichnis des Logs.
+            apply: Aufruf ``apply(entry, content)``, der einen Eintrag einspielt.
+            retry_initial: Wartezeit in Sekunden nach dem ersten Fehlschlag.
+            retry_max: Maximale Wartezeit in Sekunden zwischen zwei Versuchen.
+            retryable: Aufruf ``retryable(error)``, der vorübergehende Fehler erkennt.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.apply = apply
+        self.retryable = retryable
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self.last_error = None
+        self.failures = 0
+        self._attempts = 0
+        self._retry_now = False
+        self._condition = threading.Condition()
+        self._worker = None
+        self._entries = self._recover()
+        if self._entries:
+            logger.info(f"Write-Ahead-Log: {len(self._entries)} offene Einträge werden synchronisiert")
+            self._start_worker()
+        atexit.register(self.flush, 5.0)
+
+    def _path(self, entry, suffix):
+        return os.path.join(self.directory, entry["name"] + suffix)
+
+    def _recover(self):
+        names = sorted(os.listdir(self.directory))
+        entries = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+            elif name.endswith(".json"):
+                with open(path, "r", encoding="utf-8") as f:
+                    entries.append(json.load(f))
+        # Nutzdaten ohne festgeschriebenen Eintrag stammen von abgebrochenen Aufträgen
+        committed = {entry["name"] for entry in entries}
+        for name in names:
+            if name.endswith(".parquet") and name[:-len(".parquet")] not in committed:
+                os.remove(os.path.join(self.directory, name))
+        return entries
+
+    def _write_durable(self, path, write):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _sync_directory(self):
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def append(self, op, target, content, **options):
+        """
+        Schreibt einen Auftrag dauerhaft ins Log und weckt den Worker.
+
+        Args:
+            op: Art des Auftrags (wird von ``apply`` ausgewertet).
+            target: Der Zielpfad im entfernten Speicher.
+            content: Ein DataFrame oder JSON-serialisierbare Daten.
+            **options: Weitere JSON-serialisierbare Angaben für ``apply``.
+
+        Returns:
+            str: Die eindeutige ID des Eintrags.
+        """
+        entry_id = uuid.uuid4().hex
+        created_ns = time.time_ns()
+        entry = {"id": entry_id, "name": f"{created_ns:020d}_{entry_id}", "created_ns": created_ns,
+                 "op": op, "target": target, "options": options}
+        if isinstance(content, pd.DataFrame):
+            entry["payload"] = "parquet"
+            self._write_durable(self._path(entry, ".parquet"),
+                                lambda f: content.to_parquet(f, index=False))
+        else:
+            entry["payload"] = "json"
+            entry["content"] = json.loads(json.dumps(content, default=str))  # Schnappschuss
+        data = json.dumps(entry, default=str).encode("utf-8")
+        self._write_durable(self._path(entry, ".json"), lambda f: f.write(data))
+        self._sync_directory()
+
+        with self._condition:
+            self._entries.append(entry)
+            self._start_worker()
+            self._condition.notify_all()
+        return entry_id
+
+    def content(self, entry):
+        """
+        Returns:
+            Der Inhalt eines Eintrags (DataFrame oder JSON-Daten), None wenn der Eintrag
+            inzwischen eingespielt und gelöscht wurde.
+        """
+        if entry["payload"] == "parquet":
+            try:
+                return pd.read_parquet(self._path(entry, ".parquet"))
+            except FileNotFoundError:
+                return None
+        return entry["content"]
+
+    def pending(self, target=None):
+        """
+        Args:
+            target: Nur Einträge mit diesem Zielpfad, None für alle.
+
+        Returns:
+            list: Die noch nicht eingespielten Einträge in Schreibreihenfolge.
+        """
+        with self._condition:
+            return [entry for entry in self._entries if target is None or entry["target"] == target]
+
+    def flush(self, timeout=None):
+        """
+        Spielt offene Einträge sofort ein und wartet, bis das Log leer ist oder der
+        nächste Versuch fehlschlägt. Die Einträge bleiben in jedem Fall im Log erhalten.
+
+        Args:
+            timeout: Maximale Wartezeit in Sekunden, None wartet unbegrenzt.
+
+        Returns:
+            bool: True, wenn keine Einträge mehr offen sind.
+        """
+        with self._condition:
+            if not self._entries:
+                return True
+            attempts = self._attempts
+            self._retry_now = True
+            self._start_worker()
+            self._condition.notify_all()
+            self._condition.wait_for(
+                lambda: not self._entries or (self._attempts > attempts and self.failures > 0),
+                timeout=timeout)
+            return not self._entries
+
+    def _start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="sync-log", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._entries:
+                    self._worker = None
+                    return
+                entry = self._entries[0]
+
+            try:
+                with METRICS.timer("sync_replay_seconds", op=entry["op"]):
+                    self.apply(entry, self.content(entry))
+            except Exception as e:
+                if not self.retryable(e):
+                    self._dead_letter(entry, e)
+                    continue
+                with self._condition:
+                    self._attempts += 1
+                    self.failures += 1
+                    self.last_error = e
+                    # Exponent begrenzen, sonst OverflowError nach rund 1000 Fehlschlägen
+                    delay = min(self.retry_max, self.retry_initial * 2 ** min(self.failures - 1, 16))
+                    logger.warning(f"Synchronisation von {entry['target']} fehlgeschlagen, "
+                                   f"neuer Versuch in {delay:g} s: {e}")
+                    self._condition.notify_all()
+                    self._condition.wait_for(lambda: self._retry_now, timeout=delay)
+                    self._retry_now = False
+                continue
+
+            # Erst nach erfolgreichem Einspielen aus dem Log entfernen
+            for suffix in (".json", ".parquet") if entry["payload"] == "parquet" else (".json",):
+                try:
+                    os.remove(self._path(entry, suffix))
+                except FileNotFoundError:
+                    pass
+            self._finish(None)
+
+    def _finish(self, error):
+        with self._condition:
+            self._entries.pop(0)
+            self._attempts += 1
+            self.failures = 0
+            self.last_error = error
+            self._condition.notify_all()
+
+    def _dead_letter(self, entry, error):
+        """
+        Verschiebt einen dauerhaft fehlschlagenden Eintrag samt Fehlermeldung nach ``dead/``.
+        """
+        dead_dir = os.path.join(self.directory, self.DEAD_LETTER_DIR)
+        os.makedirs(dead_dir, exist_ok=True)
+        if entry["payload"] == "parquet":
+            try:
+                os.replace(self._path(entry, ".parquet"), os.path.join(dead_dir, entry["name"] + ".parquet"))
+            except FileNotFoundError:
+                pass
+        data = json.dumps(dict(entry, error=repr(error)), default=str).encode("utf-8")
+        self._write_durable(os.path.join(dead_dir, entry["name"] + ".json"), lambda f: f.write(data))
+        os.remove(self._path(entry, ".json"))
+        self._sync_directory()
+        METRICS.inc("sync_log_dead_letters", op=entry["op"])
+        logger.error(f"Synchronisation von {entry['target']} dauerhaft fehlgeschlagen, "
+                     f"Eintrag nach {dead_dir} verschoben: {error!r}")
+        self._finish(error)
@@ -0,0 +1,99 @@
+import math
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+SPALTEN = {
+    "datum_zeit": "Datum & Uhrzeit",
+    "blutzuckerwert": "Blutzuckerwert (mg/dL)",
+    "zeitpunkt": "Zeitpunkt",
+}
+
+SORT_STATE_KEY = "tabelle_reihenfolge"  # Sortierreihenfolge der Tabelle dieser Session
+
+
+def table_projection(data_df):
+    """
+    Liefert die Tabelle mit Anzeigenamen. Dank Copy-on-Write werden dabei keine Spalten kopiert.
+
+    Args:
+        data_df: Der DataFrame mit den gespeicherten Werten.
+
+    Returns:
+        pd.DataFrame: Die Spalten aus ``SPALTEN`` mit Anzeigenamen.
+    """
+    return data_df[list(SPALTEN)].rename(columns=SPALTEN)
+
+
+def sort_order(view, sort_by, ascending, version):
+    """
+    Liefert die Reihenfolge der Zeilen nach einer Spalte. Pro Session wird nur die zuletzt
+    verwendete Reihenfolge gemerkt; sie gilt, solange sich Datenversion und Sortierung nicht
+    ändern, sodass nicht jeder Rerun die ganze Tabelle sortiert.
+
+    Args:
+        view: Ergebnis von ``table_projection``.
+        sort_by: Anzeigename der Sortierspalte, None für die gespeicherte Reihenfolge.
+        ascending: Aufsteigend sortieren.
+        version: Die Datenversion (siehe ``DataManager.data_version``).
+
+    Returns:
+        np.ndarray: Zeilenpositionen in sortierter Reihenfolge.
+    """
+    if sort_by is None:
+        return np.arange(len(view))
+    key = (version, len(view), sort_by, ascending)
+    cached = st.session_state.get(SORT_STATE_KEY)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    order = view[sort_by].reset_index(drop=True).sort_values(ascending=ascending, kind="stable").index.to_numpy()
+    st.session_state[SORT_STATE_KEY] = (key, order)
+    return order
+
+
+def filter_and_sort(view, start=None, end=None, zeitpunkte=None, order=None):
+    """
+    Filtert die Tabelle nach Zeitraum und Zeitpunkt in der gegebenen Reihenfolge.
+
+    Args:
+        view: Ergebnis von ``table_projection``.
+        start: Frühester Zeitpunkt (inklusiv), None für unbeschränkt.
+        end: Spätester Zeitpunkt (exklusiv), None für unbeschränkt.
+        zeitpunkte: Zulässige Werte der Spalte "Zeitpunkt", None für alle.
+        order: Zeilenpositionen aus ``sort_order``, None für die gespeicherte Reihenfolge.
+
+    Returns:
+        np.ndarray: Die Positionen der verbleibenden Zeilen in Anzeigereihenfolge; Zeilen
+        werden erst von ``paginate`` für die angezeigte Seite kopiert.
+    """
+    positions = np.arange(len(view)) if order is None else order
+    zeit = view[SPALTEN["datum_zeit"]]
+    mask = np.ones(len(view), dtype=bool)
+    if start is not None:
+        mask &= (zeit >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (zeit < pd.Timestamp(end)).to_numpy()
+    if zeitpunkte is not None:
+        mask &= view[SPALTEN["zeitpunkt"]].isin(zeitpunkte).to_numpy()
+    if not mask.all():
+        positions = positions[mask[positions]]
+    return positions
+
+
+def paginate(view, positions, page, page_size):
+    """
+    Schneidet eine Seite aus der Tabelle.
+
+    Args:
+        view: Ergebnis von ``table_projection``.
+        positions: Die Zeilenpositionen aus ``filter_and_sort``.
+        page: Die Seitennummer, beginnend bei 1; wird auf den gültigen Bereich begrenzt.
+        page_size: Anzahl Zeilen pro Seite.
+
+    Returns:
+        tuple: (Zeilen der Seite, Anzahl Seiten)
+    """
+    page_count = max(1, math.ceil(len(positions) / page_size))
+    page = min(max(1, page), page_count)
+    offset = (page - 1) * page_size
+    return view.iloc[positions[offset:offset + page_size]], page_count
@@ -0,0 +1,160 @@
+import time
+import atexit
+import weakref
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Alle Warteschlangen des Prozesses; ein einziger atexit-Hook speichert sie beim Beenden,
+# statt dass jede Session einen eigenen Hook (und damit eine Referenz) hinterlässt
+_queues = weakref.WeakSet()
+
+EXIT_FLUSH_TIMEOUT = 30  # Sekunden, die beim Beenden insgesamt auf offene Speicherungen gewartet wird
+
+
+@atexit.register
+def _flush_all():
+    # Ein hängender Server darf das Beenden des Prozesses nicht beliebig verzögern
+    deadline = time.monotonic() + EXIT_FLUSH_TIMEOUT
+    for queue in list(_queues):
+        if not queue.flush(timeout=max(0.0, deadline - time.monotonic())):
+            logger.error(f"Beim Beenden nicht gespeichert: {queue.pending + list(queue.errors)}")
+
+
+class WriteBehindQueue:
+    """
+    Verzögerte Speicherung im Hintergrund.
+
+    Schreibaufträge werden pro Schlüssel (z. B. Dateipfad) gesammelt; ein neuer Auftrag
+    für denselben Schlüssel ersetzt den noch nicht ausgeführten älteren. Ein Worker-Thread
+    führt die Aufträge nach ``flush_interval`` Sekunden, bei ``flush()`` oder beim
+    Beenden des Prozesses aus. Fehlgeschlagene Aufträge bleiben mit ihrem Fehler in
+    ``errors`` vermerkt und werden bei ``retry()`` bzw. ``flush()`` erneut ausgeführt,
+    sofern sie nicht durch einen neueren Auftrag für denselben Schlüssel ersetzt wurden.
+    """
+
+    def __init__(self, flush_interval=2.0):
+        """
+        Initialisiert die Warteschlange.
+
+        Args:
+            flush_interval: Wartezeit in Sekunden, während der Aufträge zusammengefasst werden.
+        """
+        self.flush_interval = flush_interval
+        self.errors = {}
+        self._failed = {}
+        self._jobs = {}
+        self._in_flight = None
+        self._flush_requested = False
+        self._condition = threading.Condition()
+        self._worker = None
+        _queues.add(self)
+
+    def submit(self, key, job):
+        """
+        Reiht einen Schreibauftrag ein.
+
+        Args:
+            key: Schlüssel, unter dem Aufträge zusammengefasst werden.
+            job: Aufruf ohne Argumente, der die eigentliche Speicherung ausführt.
+        """
+        with self._condition:
+            self._jobs[key] = job
+            self.errors.pop(key, None)
+            self._failed.pop(key, None)
+            self._start_worker()
+
+    def retry(self):
+        """
+        Reiht alle fehlgeschlagenen Aufträge erneut ein.
+
+        Returns:
+            int: Die Anzahl erneut eingereihter Aufträge.
+        """
+        with self._condition:
+            failed, self._failed = self._failed, {}
+            self.errors.clear()
+            for key, job in failed.items():
+                self._jobs.setdefault(key, job)
+            if failed:
+                self._start_worker()
+            return len(failed)
+
+    def _start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._worker.start()
+        self._condition.notify_all()
+
+    @property
+    def pending(self):
+        """
+        Returns:
+            list: Die Schlüssel aller noch nicht gespeicherten Aufträge.
+        """
+        with self._condition:
+            keys = list(self._jobs)
+            if self._in_flight is not None and self._in_flight not in self._jobs:
+                keys.insert(0, self._in_flight)
+            return keys
+
+    @property
+    def has_pending(self):
+        """
+        Returns:
+            bool: True, solange noch Aufträge offen sind.
+        """
+        return bool(self.pending)
+
+    def flush(self, timeout=None):
+        """
+        Führt alle offenen und fehlgeschlagenen Aufträge sofort aus und wartet auf deren
+        Abschluss.
+
+        Args:
+            timeout: Maximale Wartezeit in Sekunden, None wartet unbegrenzt.
+
+        Returns:
+            bool: True, wenn keine Aufträge mehr offen sind und keiner fehlgeschlagen ist.
+        """
+        self.retry()
+        with self._condition:
+            if self._jobs or self._in_flight is not None:
+                self._flush_requested = True
+                self._condition.notify_all()
+                if not self._condition.wait_for(
+                        lambda: not self._jobs and self._in_flight is None, timeout=timeout):
+                    return False
+            return not self.errors
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._jobs:
+                    self._worker = None
+                    return
+                self._condition.wait_for(lambda: self._flush_requested, timeout=self.flush_interval)
+                self._flush_requested = False
+
+            while True:
+                with self._condition:
+                    if not self._jobs:
+                        break
+                    key = next(iter(self._jobs))
+                    job = self._jobs.pop(key)
+                    self._in_flight = key
+
+                try:
+                    job()
+                except Exception as e:
+                    logger.error(f"Verzögertes Speichern von {key} fehlgeschlagen: {e}")
+                    with self._condition:
+                        # Ein inzwischen eingereihter neuerer Auftrag ersetzt den fehlgeschlagenen
+                        if key not in self._jobs:
+                            self.errors[key] = e
+                            self._failed[key] = job
+
+                with self._condition:
+                    self._in_flight = None
+                    self._condition.notify_all()